@@ -1,9 +1,11 @@
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config, pool
 
 from alembic import context
-from app import Base
+from database import sync_database_url
+from main import Base
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -14,6 +16,13 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# DATABASE_URL, when set, takes precedence over sqlalchemy.url of alembic.ini
+if os.environ.get("DATABASE_URL"):
+    config.set_main_option(
+        "sqlalchemy.url",
+        sync_database_url().render_as_string(hide_password=False).replace("%", "%%"),
+    )
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
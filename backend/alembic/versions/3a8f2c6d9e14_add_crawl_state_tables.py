@@ -0,0 +1,47 @@
+"""add crawled_urls and http_validators
+
+Revision ID: 3a8f2c6d9e14
+Revises: e1d93b5a7c02
+Create Date: 2026-10-16 14:02:57.117630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a8f2c6d9e14'
+down_revision: Union[str, None] = 'e1d93b5a7c02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the app may already have created the tables through create_all
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'crawled_urls' not in tables:
+        op.create_table(
+            'crawled_urls',
+            sa.Column('url', sa.String(), nullable=False),
+            sa.Column('fingerprint', sa.String(length=64), nullable=False),
+            sa.Column('relevance', sa.String(length=16), nullable=True),
+            sa.Column('seen_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('url'),
+        )
+        op.create_index('ix_crawled_urls_fingerprint', 'crawled_urls', ['fingerprint'], unique=False)
+    if 'http_validators' not in tables:
+        op.create_table(
+            'http_validators',
+            sa.Column('key', sa.String(), nullable=False),
+            sa.Column('etag', sa.String(), nullable=True),
+            sa.Column('last_modified', sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint('key'),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('http_validators')
+    op.drop_index('ix_crawled_urls_fingerprint', table_name='crawled_urls')
+    op.drop_table('crawled_urls')
@@ -0,0 +1,37 @@
+"""add upvote_count to news_articles
+
+Revision ID: 4f8a2e6c1d93
+Revises: b6e1f4a2d837
+Create Date: 2026-10-16 19:02:37.114205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f8a2e6c1d93'
+down_revision: Union[str, None] = 'b6e1f4a2d837'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('news_articles')}
+    if 'upvote_count' not in columns:
+        with op.batch_alter_table('news_articles') as batch_op:
+            batch_op.add_column(
+                sa.Column('upvote_count', sa.Integer(), nullable=False, server_default='0')
+            )
+    op.execute(
+        'UPDATE news_articles SET upvote_count = ('
+        'SELECT COUNT(*) FROM user_news_upvotes '
+        'WHERE user_news_upvotes.news_articles_id = news_articles.id)'
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('news_articles') as batch_op:
+        batch_op.drop_column('upvote_count')
@@ -0,0 +1,32 @@
+"""add news_articles (time, id) index
+
+Revision ID: 5b2f0d8c41a7
+Revises: 
+Create Date: 2026-10-16 10:12:41.203518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2f0d8c41a7'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_news_articles_time_id',
+        'news_articles',
+        ['time', 'id'],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_news_articles_time_id', table_name='news_articles')
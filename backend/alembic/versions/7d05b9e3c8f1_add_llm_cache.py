@@ -0,0 +1,39 @@
+"""add llm_cache
+
+Revision ID: 7d05b9e3c8f1
+Revises: 3a8f2c6d9e14
+Create Date: 2026-10-16 15:20:04.731295
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d05b9e3c8f1'
+down_revision: Union[str, None] = '3a8f2c6d9e14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the app may already have created the table through create_all
+    if 'llm_cache' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'llm_cache',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('model', sa.String(length=50), nullable=False),
+        sa.Column('response', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_used_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index('ix_llm_cache_last_used_at', 'llm_cache', ['last_used_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_llm_cache_last_used_at', table_name='llm_cache')
+    op.drop_table('llm_cache')
@@ -0,0 +1,41 @@
+"""add necessities_prices store
+
+Revision ID: 9c4e7a1f3b26
+Revises: 5b2f0d8c41a7
+Create Date: 2026-10-16 11:03:18.554107
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4e7a1f3b26'
+down_revision: Union[str, None] = '5b2f0d8c41a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the app may already have created the table through create_all
+    if 'necessities_prices' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'necessities_prices',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('record', sa.Text(), nullable=False),
+        sa.Column('fetched_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_necessities_prices_category_name', 'necessities_prices', ['category', 'name'], unique=False)
+    op.create_index('ix_necessities_prices_name', 'necessities_prices', ['name'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_necessities_prices_name', table_name='necessities_prices')
+    op.drop_index('ix_necessities_prices_category_name', table_name='necessities_prices')
+    op.drop_table('necessities_prices')
@@ -0,0 +1,66 @@
+"""add news_articles_fts full text index
+
+Revision ID: b6e1f4a2d837
+Revises: 7d05b9e3c8f1
+Create Date: 2026-10-16 17:41:09.602715
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1f4a2d837'
+down_revision: Union[str, None] = '7d05b9e3c8f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# the table and tokenizer of news_search as of this revision, copied so
+# later changes to news_search do not change what this migration writes
+FTS_TABLE = 'news_articles_fts'
+FTS_COLUMNS = ('title', 'content', 'summary', 'reason')
+_CJK = "㐀-䶿一-鿿豈-﫿"
+_RUNS = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_RUN = re.compile(rf"[{_CJK}]+")
+
+
+def tokenize(value):
+    """cjk runs as overlapping bigrams plus single characters, other text as lowercase words"""
+    tokens = []
+    for run in _RUNS.findall(value or ""):
+        if _CJK_RUN.fullmatch(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.extend(run)
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    op.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5({', '.join(FTS_COLUMNS)}, tokenize='unicode61')"
+    )
+    op.execute(f'DELETE FROM {FTS_TABLE}')
+    insert = sa.text(
+        f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+        f"VALUES (:id, :title, :content, :summary, :reason)"
+    )
+    rows = bind.execute(
+        sa.text('SELECT id, title, content, summary, reason FROM news_articles')
+    ).all()
+    for row in rows:
+        bind.execute(insert, {
+            'id': row.id,
+            **{c: ' '.join(tokenize(getattr(row, c))) for c in FTS_COLUMNS},
+        })
+
+
+def downgrade() -> None:
+    op.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
@@ -0,0 +1,34 @@
+"""add cache_versions
+
+Revision ID: c2a7e9d4f618
+Revises: 4f8a2e6c1d93
+Create Date: 2026-10-16 21:14:52.307716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2a7e9d4f618'
+down_revision: Union[str, None] = '4f8a2e6c1d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the app may already have created the table through create_all
+    if 'cache_versions' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'cache_versions',
+        sa.Column('namespace', sa.String(length=32), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('namespace'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('cache_versions')
@@ -0,0 +1,84 @@
+"""add published_at to news_articles
+
+Revision ID: d8b3f1a6c259
+Revises: c2a7e9d4f618
+Create Date: 2026-10-16 22:37:08.551903
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8b3f1a6c259'
+down_revision: Union[str, None] = 'c2a7e9d4f618'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# copied from article_extractor as of this revision, so later changes to
+# the parser do not change what this migration writes
+NEWS_TIME_UTC_OFFSET = timedelta(hours=8)
+NEWS_TIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+)
+
+
+def parse_news_time(value):
+    """:return: naive utc datetime of a udn.com display time, or None"""
+    value = " ".join((value or "").split())
+    for time_format in NEWS_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, time_format) - NEWS_TIME_UTC_OFFSET
+        except ValueError:
+            continue
+    return None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('news_articles')}
+    if 'published_at' not in columns:
+        op.add_column('news_articles', sa.Column('published_at', sa.DateTime(), nullable=True))
+    news_articles = sa.table(
+        'news_articles',
+        sa.column('id', sa.Integer()),
+        sa.column('time', sa.String()),
+        sa.column('published_at', sa.DateTime()),
+    )
+    rows = bind.execute(
+        sa.select(news_articles.c.id, news_articles.c.time)
+        .where(news_articles.c.published_at.is_(None))
+    ).all()
+    # an unreadable display time gets the time it was first seen, as
+    # main.add_news_batch does when it stores an article
+    now = datetime.utcnow()
+    for article_id, time in rows:
+        bind.execute(
+            news_articles.update()
+            .where(news_articles.c.id == article_id)
+            .values(published_at=parse_news_time(time) or now)
+        )
+    indexes = {i['name'] for i in sa.inspect(bind).get_indexes('news_articles')}
+    with op.batch_alter_table('news_articles') as batch_op:
+        batch_op.alter_column('published_at', existing_type=sa.DateTime(), nullable=False)
+        if 'ix_news_articles_time_id' in indexes:
+            batch_op.drop_index('ix_news_articles_time_id')
+        if 'ix_news_articles_published_at_id' not in indexes:
+            batch_op.create_index(
+                'ix_news_articles_published_at_id', ['published_at', 'id'], unique=False
+            )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('news_articles') as batch_op:
+        batch_op.drop_index('ix_news_articles_published_at_id')
+        batch_op.create_index('ix_news_articles_time_id', ['time', 'id'], unique=False)
+        batch_op.drop_column('published_at')
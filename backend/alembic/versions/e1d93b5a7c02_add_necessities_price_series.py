@@ -0,0 +1,39 @@
+"""add packed series columns to necessities_prices
+
+Revision ID: e1d93b5a7c02
+Revises: 9c4e7a1f3b26
+Create Date: 2026-10-16 12:26:45.918342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1d93b5a7c02'
+down_revision: Union[str, None] = '9c4e7a1f3b26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('necessities_prices')}
+    if 'series' in columns:
+        return
+    with op.batch_alter_table('necessities_prices') as batch_op:
+        batch_op.add_column(sa.Column('number', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('series', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('series_start', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_necessities_prices_number', ['number'], unique=False)
+    # rows stored before this revision have no decoded series, refetch them
+    op.execute('DELETE FROM necessities_prices')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('necessities_prices') as batch_op:
+        batch_op.drop_index('ix_necessities_prices_number')
+        batch_op.drop_column('series_start')
+        batch_op.drop_column('series')
+        batch_op.drop_column('number')
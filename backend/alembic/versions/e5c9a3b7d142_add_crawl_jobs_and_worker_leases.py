@@ -0,0 +1,62 @@
+"""add crawl_jobs and worker_leases
+
+Revision ID: e5c9a3b7d142
+Revises: d8b3f1a6c259
+Create Date: 2026-10-16 23:48:19.620374
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c9a3b7d142'
+down_revision: Union[str, None] = 'd8b3f1a6c259'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the app may already have created the tables through create_all
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'worker_leases' not in tables:
+        op.create_table(
+            'worker_leases',
+            sa.Column('name', sa.String(length=32), nullable=False),
+            sa.Column('owner', sa.String(length=100), nullable=False),
+            sa.Column('expires_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('name'),
+        )
+    if 'crawl_jobs' not in tables:
+        op.create_table(
+            'crawl_jobs',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('kind', sa.String(length=16), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('priority', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=16), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('owner', sa.String(length=100), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.Column('result', sa.Text(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index(
+            'ix_crawl_jobs_status_priority_id', 'crawl_jobs',
+            ['status', 'priority', 'id'], unique=False,
+        )
+        op.create_index(
+            'ix_crawl_jobs_kind_created_at', 'crawl_jobs',
+            ['kind', 'created_at'], unique=False,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_crawl_jobs_kind_created_at', table_name='crawl_jobs')
+    op.drop_index('ix_crawl_jobs_status_priority_id', table_name='crawl_jobs')
+    op.drop_table('crawl_jobs')
+    op.drop_table('worker_leases')
@@ -0,0 +1,73 @@
+"""normalize news_articles urls
+
+Revision ID: f3b8d2a6c517
+Revises: e5c9a3b7d142
+Create Date: 2026-10-17 09:12:44.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d2a6c517'
+down_revision: Union[str, None] = 'e5c9a3b7d142'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# copied from main as of this revision
+def normalize_news_url(url):
+    return url.split("#", 1)[0].split("?", 1)[0].rstrip("/")
+
+
+def upgrade() -> None:
+    """
+    store every article under its normalized url, as ingest now does. an
+    article stored under several forms of one url keeps its oldest row,
+    the upvotes of the others are moved to it.
+    """
+    bind = op.get_bind()
+    has_fts = 'news_articles_fts' in sa.inspect(bind).get_table_names()
+    groups = {}
+    for article_id, url in bind.execute(sa.text('SELECT id, url FROM news_articles ORDER BY id')):
+        groups.setdefault(normalize_news_url(url), []).append((article_id, url))
+    for normalized, rows in groups.items():
+        if len(rows) == 1 and rows[0][1] == normalized:
+            continue
+        # the row already at the normalized url, else the oldest
+        keep = next((i for i, url in rows if url == normalized), rows[0][0])
+        for article_id, _ in rows:
+            if article_id == keep:
+                continue
+            voters = bind.execute(
+                sa.text(
+                    'SELECT user_id FROM user_news_upvotes WHERE news_articles_id = :dup '
+                    'AND user_id NOT IN (SELECT user_id FROM user_news_upvotes WHERE news_articles_id = :keep)'
+                ),
+                {'dup': article_id, 'keep': keep},
+            ).scalars().all()
+            for user_id in voters:
+                bind.execute(
+                    sa.text('INSERT INTO user_news_upvotes (user_id, news_articles_id) VALUES (:u, :keep)'),
+                    {'u': user_id, 'keep': keep},
+                )
+            bind.execute(sa.text('DELETE FROM user_news_upvotes WHERE news_articles_id = :dup'), {'dup': article_id})
+            if has_fts:
+                bind.execute(sa.text('DELETE FROM news_articles_fts WHERE rowid = :dup'), {'dup': article_id})
+            bind.execute(sa.text('DELETE FROM news_articles WHERE id = :dup'), {'dup': article_id})
+        bind.execute(
+            sa.text(
+                'UPDATE news_articles SET url = :url, upvote_count = ('
+                'SELECT COUNT(*) FROM user_news_upvotes WHERE news_articles_id = :keep) '
+                'WHERE id = :keep'
+            ),
+            {'url': normalized, 'keep': keep},
+        )
+
+
+def downgrade() -> None:
+    # the original query strings and fragments are not kept
+    pass
@@ -0,0 +1,146 @@
+"""
+extract the fields the crawler needs from an udn.com article page
+
+instead of building a BeautifulSoup tree of the whole page, the page is
+streamed through html.parser and only the text of the title, the time
+and the <p> tags inside the editor section is kept. parsing stops as soon
+as all three have been read, so the comments, related news and footer
+after the article are never tokenized.
+"""
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+
+TITLE_CLASS = "article-content__title"
+TIME_CLASS = "article-content__time"
+EDITOR_CLASS = "article-content__editor"
+
+# udn.com shows times in taiwan time, utc+8 without daylight saving
+NEWS_TIME_UTC_OFFSET = timedelta(hours=8)
+NEWS_TIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+)
+
+
+class _Done(Exception):
+    pass
+
+
+class _ArticleParser(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.time = None
+        self.paragraphs = None
+        # (field, tag, nesting depth of that tag, text parts) while capturing
+        self._capture = None
+        self._editor_depth = 0
+        # text parts of the <p> tags open inside the editor, by position
+        self._open_paragraphs = []
+        self._paragraph_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._capture is not None:
+            if tag == self._capture[1]:
+                self._capture[2] += 1
+            return
+        if self._editor_depth:
+            if tag == "section":
+                self._editor_depth += 1
+            elif tag == "p":
+                self.paragraphs.append(None)
+                self._open_paragraphs.append((len(self.paragraphs) - 1, []))
+            return
+        if tag not in ("h1", "time", "section"):
+            return
+        classes = (dict(attrs).get("class") or "").split()
+        if tag == "h1" and self.title is None and TITLE_CLASS in classes:
+            self._capture = ["title", tag, 1, []]
+        elif tag == "time" and self.time is None and TIME_CLASS in classes:
+            self._capture = ["time", tag, 1, []]
+        elif tag == "section" and self.paragraphs is None and EDITOR_CLASS in classes:
+            self.paragraphs = []
+            self._editor_depth = 1
+
+    def handle_endtag(self, tag):
+        if self._capture is not None:
+            if tag == self._capture[1]:
+                self._capture[2] -= 1
+                if self._capture[2] == 0:
+                    field, _, _, parts = self._capture
+                    setattr(self, field, "".join(parts))
+                    self._capture = None
+                    self._stop_when_done()
+            return
+        if not self._editor_depth:
+            return
+        if tag == "p" and self._open_paragraphs:
+            position, parts = self._open_paragraphs.pop()
+            self.paragraphs[position] = "".join(parts)
+        elif tag == "section":
+            self._editor_depth -= 1
+            if self._editor_depth == 0:
+                self._close_open_paragraphs()
+                self._stop_when_done()
+
+    def handle_data(self, data):
+        if self._capture is not None:
+            self._capture[3].append(data)
+        for _, parts in self._open_paragraphs:
+            parts.append(data)
+
+    def _close_open_paragraphs(self):
+        while self._open_paragraphs:
+            position, parts = self._open_paragraphs.pop()
+            self.paragraphs[position] = "".join(parts)
+
+    def _stop_when_done(self):
+        if self.title is not None and self.time is not None and self.paragraphs is not None:
+            raise _Done()
+
+
+def extract_article(html):
+    """
+    read title, time and paragraphs of an udn.com article page
+
+    :param html: page source
+    :return: {"title", "time", "content": [paragraph, ...]}, or None if the
+        page has no article title. content is empty when the editor
+        section is missing, and time is None when there is no time tag.
+    """
+    parser = _ArticleParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except _Done:
+        pass
+    parser._close_open_paragraphs()
+    if parser.title is None:
+        return None
+    return {
+        "title": parser.title,
+        "time": parser.time,
+        "content": [
+            p for p in parser.paragraphs or []
+            if p.strip() != "" and "▪" not in p
+        ],
+    }
+
+
+def parse_news_time(value):
+    """
+    :param value: time as displayed on udn.com, e.g. '2024-07-01 11:07'
+    :return: naive utc datetime, or None when the format is unknown
+    """
+    value = " ".join((value or "").split())
+    for time_format in NEWS_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, time_format) - NEWS_TIME_UTC_OFFSET
+        except ValueError:
+            continue
+    return None
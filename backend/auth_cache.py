@@ -0,0 +1,94 @@
+"""
+in-process cache of verified access tokens and the users they resolve to
+
+every authenticated request used to decode its jwt and load the user row.
+a token that verified once stays valid until its exp claim, so it is kept
+here with the id and username it resolved to. entries also expire after a
+short ttl and the least recently used are dropped past a maximum size.
+whenever a users row is inserted, updated or deleted the entries of that
+user are dropped, see main.py for the orm events.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+AuthenticatedUser = namedtuple("AuthenticatedUser", ["id", "username"])
+
+
+class AuthCache:
+
+    def __init__(self, ttl=300.0, max_entries=4096, clock=time.time):
+        """
+        :param ttl: seconds an entry is trusted at most
+        :param max_entries: entries kept in each of the token and user maps
+        :param clock: returns the current unix time
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+        # token -> (AuthenticatedUser, expires at)
+        self._tokens = OrderedDict()
+        # username -> (AuthenticatedUser, expires at)
+        self._users = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, entries, key):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= self.clock():
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return entry[0]
+
+    def _put(self, entries, key, user, expires_at):
+        entries[key] = (user, expires_at)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def get_token(self, token):
+        with self._lock:
+            user = self._get(self._tokens, token)
+            if user is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return user
+
+    def put_token(self, token, user, expires_at=None):
+        """
+        :param token:
+        :param user: AuthenticatedUser the token resolved to
+        :param expires_at: exp claim of the token, unix time
+        """
+        limit = self.clock() + self.ttl
+        with self._lock:
+            self._put(self._tokens, token, user, min(limit, expires_at or limit))
+
+    def get_user(self, username):
+        with self._lock:
+            return self._get(self._users, username)
+
+    def put_user(self, user):
+        with self._lock:
+            self._put(self._users, user.username, user, self.clock() + self.ttl)
+
+    def invalidate_user(self, username=None, user_id=None):
+        """drop every entry resolving to that username or id"""
+        with self._lock:
+            for entries in (self._tokens, self._users):
+                stale = [
+                    key for key, (user, _) in entries.items()
+                    if user.username == username or user.id == user_id
+                ]
+                for key in stale:
+                    del entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
@@ -0,0 +1,88 @@
+"""
+compare article extraction on saved udn.com-like pages: a full
+BeautifulSoup tree (what get_new and search_news used to build) against
+the streaming article_extractor.
+
+usage, from backend/:
+    python benchmarks/bench_article_extractor.py [--repeat 20]
+"""
+import argparse
+import pathlib
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from article_extractor import extract_article  # noqa: E402
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+
+
+def extract_with_full_tree(html):
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.find("h1", class_="article-content__title")
+    if title is None:
+        return None
+    time_tag = soup.find("time", class_="article-content__time")
+    content_section = soup.find("section", class_="article-content__editor")
+    paragraphs = []
+    if content_section is not None:
+        paragraphs = [
+            p.text
+            for p in content_section.find_all("p")
+            if p.text.strip() != "" and "▪" not in p.text
+        ]
+    return {
+        "title": title.text,
+        "time": time_tag.text if time_tag is not None else None,
+        "content": paragraphs,
+    }
+
+
+def cpu_ms(extract, html, repeat):
+    started = time.process_time()
+    for _ in range(repeat):
+        extract(html)
+    return (time.process_time() - started) / repeat * 1000
+
+
+def peak_kib(extract, html):
+    tracemalloc.start()
+    extract(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'page':32} {'KiB':>6} {'bs4 ms':>8} {'new ms':>8} {'bs4 peak KiB':>13} {'new peak KiB':>13}")
+    totals = [0.0, 0.0, 0.0, 0.0]
+    pages = sorted(FIXTURES.glob("*.html"))
+    for page in pages:
+        html = page.read_text(encoding="utf-8")
+        assert extract_article(html) == extract_with_full_tree(html), page.name
+        row = (
+            cpu_ms(extract_with_full_tree, html, args.repeat),
+            cpu_ms(extract_article, html, args.repeat),
+            peak_kib(extract_with_full_tree, html),
+            peak_kib(extract_article, html),
+        )
+        totals = [t + r for t, r in zip(totals, row)]
+        print(f"{page.name:32} {len(html.encode()) / 1024:6.0f} {row[0]:8.2f} {row[1]:8.2f} {row[2]:13.0f} {row[3]:13.0f}")
+    n = len(pages)
+    print(
+        f"{'mean':32} {'':6} {totals[0] / n:8.2f} {totals[1] / n:8.2f} "
+        f"{totals[2] / n:13.0f} {totals[3] / n:13.0f}"
+    )
+    print(f"cpu x{totals[0] / totals[1]:.1f} faster, peak memory x{totals[2] / totals[3]:.1f} smaller")
+
+
+if __name__ == "__main__":
+    main()
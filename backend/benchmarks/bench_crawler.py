@@ -0,0 +1,112 @@
+"""
+crawler throughput against the local udn.com and openai stubs, through
+main.get_new as the crawl worker runs it: a backfill of every listing
+page, an incremental crawl finding nothing new and one after new items
+were published.
+
+the per-host rate limit of the crawler is raised so the pipeline, not the
+limiter, is measured; --rate 20 --burst 10 gives the production limit.
+--llm-latency adds the time of a real completion to each stub answer.
+results are written as json to benchmarks/results/.
+
+usage, from backend/:
+    python benchmarks/bench_crawler.py [--items-per-page 20] [--new-items 40] [--llm-latency 0]
+"""
+import argparse
+import functools
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from results import run_info, write_results  # noqa: E402
+from stubs import StubServers  # noqa: E402
+
+STAGES = ("unseen", "relevant", "fetched", "parsed", "summarized", "stored")
+
+
+def histogram_totals(histogram):
+    """:return: {first label value: (observations, seconds)}"""
+    totals = {}
+    for key, (counts, seconds) in histogram.snapshot().items():
+        count, total = totals.get(key[0], (0, 0.0))
+        totals[key[0]] = (count + sum(counts), total + seconds)
+    return totals
+
+
+def crawl(main, metrics, stubs, is_initial):
+    metrics.REGISTRY.reset()
+    stub_requests = sum(stubs.requests.values())
+    started = time.perf_counter()
+    stored = main.get_new(is_initial=is_initial)
+    seconds = time.perf_counter() - started
+    outbound = histogram_totals(metrics.OUTBOUND_REQUEST_SECONDS)
+    llm = histogram_totals(metrics.LLM_REQUEST_SECONDS)
+    queries = histogram_totals(metrics.DB_QUERY_SECONDS)
+    return {
+        "seconds": round(seconds, 3),
+        "stored": stored._asdict(),
+        "articles_per_second": round(stored.inserted / seconds, 2),
+        "stages": {stage: metrics.CRAWL_ITEMS.value(stage=stage) for stage in STAGES},
+        "stub_requests": sum(stubs.requests.values()) - stub_requests,
+        "http_requests": sum(count for count, _ in outbound.values()),
+        "http_seconds": round(sum(total for _, total in outbound.values()), 3),
+        "llm_calls": sum(count for count, _ in llm.values()),
+        "llm_seconds": round(sum(total for _, total in llm.values()), 3),
+        "db_queries": sum(count for count, _ in queries.values()),
+        "db_seconds": round(sum(total for _, total in queries.values()), 3),
+    }
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items-per-page", type=int, default=20)
+    parser.add_argument("--new-items", type=int, default=40)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per stub completion")
+    parser.add_argument("--rate", type=float, default=1000.0, help="requests per second to a host")
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--output", help="json file, results/crawler-<time>.json by default")
+    args = parser.parse_args()
+
+    results = run_info("crawler", args)
+    results["runs"] = {}
+    with StubServers(price_records=1, items_per_page=args.items_per_page, llm_latency=args.llm_latency) as stubs, \
+            tempfile.TemporaryDirectory() as tmp:
+        # main reads these on import
+        os.environ.update(stubs.env(), DATABASE_URL=f"sqlite:///{tmp}/crawl.db", SENTRY_DSN="")
+        import crawler
+        import main
+        import metrics
+
+        main.init_database()
+        main.Crawler = functools.partial(
+            crawler.Crawler, concurrency=args.concurrency, rate=args.rate, burst=args.burst
+        )
+        for name, is_initial in (
+                ("backfill", True),
+                ("incremental_unchanged", False),
+                ("incremental_new", False),
+        ):
+            if name == "incremental_new":
+                stubs.publish(args.new_items)
+            results["runs"][name] = crawl(main, metrics, stubs, is_initial)
+
+    print(f"{'run':22} {'s':>7} {'stored':>7} {'art/s':>7} {'http':>6} {'llm':>5} {'queries':>8}")
+    for name, run in results["runs"].items():
+        print(
+            f"{name:22} {run['seconds']:7.2f} {run['stored']['inserted']:7} "
+            f"{run['articles_per_second']:7.1f} {run['http_requests']:6} {run['llm_calls']:5} "
+            f"{run['db_queries']:8}"
+        )
+    print("stages of the backfill: " + ", ".join(
+        f"{stage} {count}" for stage, count in results["runs"]["backfill"]["stages"].items()
+    ))
+    print(f"\nwrote {write_results(results, args.output)}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,242 @@
+"""
+throughput and p50/p99 latency of each api endpoint against seeded news
+databases of 1k, 10k and 100k articles, with udn.com, opendata and openai
+replaced by local stubs (see stubs.py and datasets.py).
+
+the api runs under uvicorn in a subprocess, as deployed; requests come
+from a pool of keep-alive clients. the server's own /metrics give the
+database queries per request of each endpoint. results are written as
+json to benchmarks/results/, compare two runs with compare_results.py.
+the run exits with an error when any endpoint answered a request with a
+4xx or 5xx, unless --allow-errors is given.
+
+usage, from backend/:
+    python benchmarks/bench_endpoints.py [--sizes 1k 10k 100k] [--requests 300] [--concurrency 8]
+"""
+import argparse
+import os
+import pathlib
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import httpx
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from datasets import BENCH_PASSWORD, NEWEST_TIME, SIZES, WORDS, news_database  # noqa: E402
+from results import latency_summary, run_info, write_results  # noqa: E402
+from stubs import StubServers  # noqa: E402
+
+BACKEND = pathlib.Path(__file__).resolve().parents[1]
+DB_QUERIES_LINE = re.compile(r'http_request_db_queries_(sum|count)\{route="([^"]*)"\} (\S+)')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(database, stub_env):
+    port = free_port()
+    env = {
+        **os.environ,
+        **stub_env,
+        "DATABASE_URL": f"sqlite:///{database}",
+        "APP_ENV": "production",
+        "SENTRY_DSN": "",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/metrics", timeout=1)
+            return server, base_url
+        except httpx.TransportError:
+            time.sleep(0.05)
+    server.terminate()
+    raise TimeoutError("api did not start")
+
+
+def route_db_queries(client):
+    """:return: {route: [queries, requests]} from the server's metrics"""
+    routes = {}
+    for kind, route, value in DB_QUERIES_LINE.findall(client.get("/metrics").text):
+        routes.setdefault(route, [0.0, 0.0])[kind == "count"] = float(value)
+    return routes
+
+
+def prepare(client, articles):
+    """
+    :return: what the endpoint requests need: a token, a cursor deep into
+        the listing and the etag of the first page
+    """
+    token = client.post(
+        "/api/v1/users/login", data={"username": "bench0", "password": BENCH_PASSWORD}
+    ).json()["access_token"]
+    cursor = None
+    for _ in range(min(10, articles // 50 - 1)):
+        cursor = client.get(
+            "/api/v1/news/news", params={"limit": 50, **({"cursor": cursor} if cursor else {})}
+        ).headers.get("X-Next-Cursor")
+    etag = client.get("/api/v1/news/news", params={"limit": 50}).headers["ETag"]
+    return token, cursor, etag
+
+
+def endpoint_requests(token, cursor, etag, articles):
+    """
+    :return: {endpoint: i -> (method, path, httpx options)}, upvote last
+        since it invalidates the cached news
+    """
+    auth = {"Authorization": f"Bearer {token}"}
+    # a day in the middle of the articles, 17 minutes apart
+    middle = NEWEST_TIME - timedelta(hours=8, minutes=17 * articles // 2)
+    day = {"since": (middle - timedelta(hours=12)).isoformat(), "until": (middle + timedelta(hours=12)).isoformat()}
+    return {
+        "news": lambda i: ("GET", "/api/v1/news/news", {"params": {"limit": 50}}),
+        "news_not_modified": lambda i: (
+            "GET", "/api/v1/news/news", {"params": {"limit": 50}, "headers": {"If-None-Match": etag}}
+        ),
+        "news_deep_page": lambda i: ("GET", "/api/v1/news/news", {"params": {"limit": 50, "cursor": cursor}}),
+        "news_date_range": lambda i: ("GET", "/api/v1/news/news", {"params": {"limit": 200, **day}}),
+        "user_news": lambda i: ("GET", "/api/v1/news/user_news", {"params": {"limit": 50}, "headers": auth}),
+        "search_local": lambda i: ("GET", "/api/v1/news/search_local", {"params": {"q": WORDS[i % len(WORDS)]}}),
+        "search_news": lambda i: ("POST", "/api/v1/news/search_news", {"json": {"prompt": "最近的雞蛋價格"}}),
+        "news_summary": lambda i: (
+            "POST", "/api/v1/news/news_summary",
+            {"json": {"content": f"雞蛋價格上漲第{i % 50}次"}, "headers": auth},
+        ),
+        "prices": lambda i: ("GET", "/api/v1/prices/necessities-price", {}),
+        "prices_filtered": lambda i: ("GET", "/api/v1/prices/necessities-price", {"params": {"category": "鮮乳"}}),
+        "price_trends": lambda i: ("GET", "/api/v1/prices/trends", {}),
+        "price_trend": lambda i: ("GET", f"/api/v1/prices/trends/{i % 500 + 1}", {}),
+        "login": lambda i: (
+            "POST", "/api/v1/users/login",
+            {"data": {"username": f"bench{i % 200}", "password": BENCH_PASSWORD}},
+        ),
+        "upvote": lambda i: ("POST", f"/api/v1/news/{i % articles + 1}/upvote", {"headers": auth}),
+    }
+
+
+def load(base_url, make_request, requests, concurrency):
+    """
+    send requests from concurrency threads, one keep-alive client each
+
+    :return: (latencies, wall seconds, errors)
+    """
+    local = threading.local()
+    latencies, errors, clients = [], [0], []
+
+    def send(i):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = httpx.Client(base_url=base_url, timeout=60)
+            clients.append(client)
+        method, path, options = make_request(i)
+        started = time.perf_counter()
+        response = client.request(method, path, **options)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(send, range(requests)))
+    wall = time.perf_counter() - started
+    for client in clients:
+        client.close()
+    return latencies, wall, errors[0]
+
+
+def bench_size(articles, args, stubs, tmp):
+    database = news_database(articles, seed=args.seed, copy_to=tmp)
+    server, base_url = start_server(database, stubs.env())
+    result = {"articles": articles, "endpoints": {}}
+    try:
+        with httpx.Client(base_url=base_url, timeout=120) as client:
+            started = time.perf_counter()
+            client.get("/api/v1/prices/necessities-price")
+            # download and store of the whole price feed
+            result["prices_cold_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            token, cursor, etag = prepare(client, articles)
+            for endpoint, make_request in endpoint_requests(token, cursor, etag, articles).items():
+                if args.endpoints and endpoint not in args.endpoints:
+                    continue
+                # bcrypt makes each login take a fixed cpu slice
+                requests = args.requests // 10 if endpoint == "login" else args.requests
+                load(base_url, make_request, max(1, requests // 10), args.concurrency)
+                before = route_db_queries(client)
+                latencies, wall, errors = load(base_url, make_request, requests, args.concurrency)
+                after = route_db_queries(client)
+                summary = latency_summary(latencies, wall, errors)
+                if errors:
+                    # the latency of error responses says little about the endpoint
+                    print(f"warning: {endpoint} answered {errors} of {requests} requests with an error")
+                # the route the endpoint hit, /metrics itself also moved
+                route = next((
+                    r for r in after
+                    if r != "/metrics" and after[r][1] != before.get(r, [0, 0])[1]
+                ), None)
+                if route is not None:
+                    queries = after[route][0] - before.get(route, [0, 0])[0]
+                    count = after[route][1] - before.get(route, [0, 0])[1]
+                    summary["db_queries_per_request"] = round(queries / count, 2)
+                result["endpoints"][endpoint] = summary
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoints", nargs="*", help="only these endpoints")
+    parser.add_argument("--price-records", type=int, default=5000)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per stub completion")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="json file, results/endpoints-<time>.json by default")
+    parser.add_argument("--allow-errors", action="store_true", help="exit 0 even if an endpoint failed requests")
+    args = parser.parse_args()
+
+    results = run_info("endpoints", args)
+    results["datasets"] = {}
+    with StubServers(args.price_records, llm_latency=args.llm_latency, seed=args.seed) as stubs, \
+            tempfile.TemporaryDirectory() as tmp:
+        for name in args.sizes:
+            print(f"\n{name}: {SIZES[name]} articles, {args.requests} requests, {args.concurrency} clients")
+            result = results["datasets"][name] = bench_size(SIZES[name], args, stubs, tmp)
+            print(f"price feed of {args.price_records} records stored in {result['prices_cold_ms']:.0f} ms")
+            print(f"{'endpoint':18} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+            for endpoint, summary in result["endpoints"].items():
+                print(
+                    f"{endpoint:18} {summary['throughput_rps']:8.1f} {summary['p50_ms']:8.2f} "
+                    f"{summary['p99_ms']:8.2f} {summary.get('db_queries_per_request', 0):8.2f} "
+                    f"{summary['errors']:7}"
+                )
+    print(f"\nwrote {write_results(results, args.output)}")
+    failing = [
+        f"{name}/{endpoint}"
+        for name, result in results["datasets"].items()
+        for endpoint, summary in result["endpoints"].items()
+        if summary["errors"]
+    ]
+    if failing and not args.allow_errors:
+        sys.exit(f"requests failed on {', '.join(failing)}")
+
+
+if __name__ == "__main__":
+    main_()
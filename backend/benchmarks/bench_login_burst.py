@@ -0,0 +1,128 @@
+"""
+latency of the news endpoints while a burst of logins is verified.
+
+with bcrypt called inline in the async login route every verification
+holds the event loop, so news requests queue behind it. with the bounded
+password_hasher the loop stays free and only the logins wait for a
+hashing thread.
+
+usage, from backend/:
+    python benchmarks/bench_login_burst.py [--logins 20] [--reads 100]
+"""
+import argparse
+import asyncio
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import main  # noqa: E402
+from main import Base, NewsArticle, User, app, pwd_context  # noqa: E402
+from main import async_session_opener, session_opener  # noqa: E402
+
+
+class InlineHasher:
+    """what login used to do: bcrypt straight on the event loop"""
+
+    async def verify(self, password, hashed_password):
+        return pwd_context.verify(password, hashed_password)
+
+
+def seed(path, articles):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    TestingSession = sessionmaker(bind=engine)
+    with TestingSession() as db:
+        db.add(User(username="bench", hashed_password=pwd_context.hash("benchpassword")))
+        db.add_all(
+            NewsArticle(
+                url=f"https://udn.com/news/story/1/{i}",
+                title=f"title {i}",
+                time=f"2024-09-{i % 28 + 1:02d} 10:00",
+                content="content",
+                summary="summary",
+                reason="reason",
+            )
+            for i in range(articles)
+        )
+        db.commit()
+    return TestingSession
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+async def run(logins, reads):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies = []
+
+        async def read_news():
+            for _ in range(reads):
+                started = time.perf_counter()
+                response = await client.get("/api/v1/news/news", params={"limit": 20})
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200
+                await asyncio.sleep(0.005)
+
+        async def login():
+            response = await client.post(
+                "/api/v1/users/login",
+                data={"username": "bench", "password": "benchpassword"},
+            )
+            assert response.status_code in (200, 503), response.status_code
+
+        started = time.perf_counter()
+        await asyncio.gather(read_news(), *(login() for _ in range(logins)))
+        return latencies, time.perf_counter() - started
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp) / "bench.db"
+        TestingSession = seed(path, 200)
+        TestingAsyncSession = async_sessionmaker(
+            create_async_engine(f"sqlite+aiosqlite:///{path}"), expire_on_commit=False
+        )
+
+        def override_session_opener():
+            with TestingSession() as db:
+                yield db
+
+        async def override_async_session_opener():
+            async with TestingAsyncSession() as db:
+                yield db
+
+        app.dependency_overrides[session_opener] = override_session_opener
+        app.dependency_overrides[async_session_opener] = override_async_session_opener
+        bounded = main.password_hasher
+        print(f"{args.logins} logins during {args.reads} news reads, {bounded.max_workers} hashing threads")
+        print(f"{'login hashing':16} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'total s':>8}")
+        for name, hasher in (("inline", InlineHasher()), ("bounded", bounded)):
+            main.password_hasher = hasher
+            latencies, total = asyncio.run(run(args.logins, args.reads))
+            print(
+                f"{name:16} {statistics.median(latencies) * 1000:8.1f} "
+                f"{percentile(latencies, 0.99):8.1f} {max(latencies) * 1000:8.1f} {total:8.2f}"
+            )
+        main.password_hasher = bounded
+        print(bounded.stats())
+
+
+if __name__ == "__main__":
+    main_()
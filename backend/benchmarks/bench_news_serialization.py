@@ -0,0 +1,118 @@
+"""
+time and memory to load and serialize the news listing, for full ORM
+entities through FastAPI's jsonable_encoder and json (what read_news used
+to do) against column tuples serialized with orjson (read_news_page).
+
+usage, from backend/:
+    python benchmarks/bench_news_serialization.py [--articles 10000] [--repeat 5]
+"""
+import argparse
+import json
+import pathlib
+import sys
+import time
+import tracemalloc
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, StaticPool
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from main import Base, NEWS_LIST_COLUMNS, NewsArticle, json_body  # noqa: E402
+
+
+def seed(articles):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    TestingSession = sessionmaker(bind=engine)
+    with TestingSession() as db:
+        db.add_all(
+            NewsArticle(
+                url=f"https://udn.com/news/story/1/{i}",
+                title=f"雞蛋價格第 {i} 次上漲",
+                time=f"2024-09-{i % 28 + 1:02d} {i % 24:02d}:00",
+                content="蛋價上漲，消費者叫苦。" * 40,
+                summary="蛋價上漲，影響早餐店成本。",
+                reason="禽流感導致供給減少。",
+                upvote_count=i % 5,
+            )
+            for i in range(articles)
+        )
+        db.commit()
+    return TestingSession
+
+
+def entities_with_encoder(db):
+    news = db.query(NewsArticle).order_by(NewsArticle.time.desc()).all()
+    result = []
+    for n in news:
+        row = {k: v for k, v in n.__dict__.items() if k != "_sa_instance_state"}
+        result.append({**row, "upvotes": n.upvote_count, "is_upvoted": False})
+    # what fastapi's JSONResponse does with a returned list
+    return json.dumps(
+        jsonable_encoder(result), ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def tuples_with_orjson(db):
+    rows = db.query(*NEWS_LIST_COLUMNS, NewsArticle.upvote_count).order_by(
+        NewsArticle.time.desc(), NewsArticle.id.desc()
+    )
+    result = []
+    for row in rows:
+        n = row._asdict()
+        upvotes = n.pop("upvote_count")
+        result.append({**n, "upvotes": upvotes, "is_upvoted": False})
+    return json_body(result)
+
+
+def measure(TestingSession, build, repeat):
+    timings = []
+    for _ in range(repeat):
+        with TestingSession() as db:
+            started = time.perf_counter()
+            body = build(db)
+            timings.append(time.perf_counter() - started)
+    with TestingSession() as db:
+        tracemalloc.start()
+        build(db)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return min(timings), peak, len(body)
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    TestingSession = seed(args.articles)
+    print(f"{args.articles} articles, best of {args.repeat}, content excluded from the tuples")
+    print(f"{'listing':24} {'ms':>8} {'peak MiB':>9} {'body KiB':>9}")
+    for name, build in (
+        ("entities + encoder", entities_with_encoder),
+        ("tuples + orjson", tuples_with_orjson),
+    ):
+        best, peak, size = measure(TestingSession, build, args.repeat)
+        print(f"{name:24} {best * 1000:8.1f} {peak / 2 ** 20:9.1f} {size / 1024:9.0f}")
+
+    with TestingSession() as db:
+        rows = [row._asdict() for row in db.query(*NEWS_LIST_COLUMNS)]
+    print(f"\nserialization only, {len(rows)} rows")
+    for name, dump in (
+        ("jsonable_encoder + json", lambda: json.dumps(jsonable_encoder(rows), ensure_ascii=False).encode()),
+        ("orjson", lambda: orjson.dumps(rows)),
+    ):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            dump()
+        print(f"{name:24} {(time.perf_counter() - started) / args.repeat * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,117 @@
+"""
+news reads per second while the crawler is writing, for the old engine
+and the production profile of database.create_db_engine.
+
+the old engine used the default rollback journal: every commit of the
+writer takes an exclusive lock on the file and readers wait for it. with
+wal the readers keep reading the last committed snapshot while the writer
+appends, and synchronous=NORMAL drops the fsync of every commit.
+
+usage, from backend/:
+    python benchmarks/bench_sqlite_concurrency.py [--readers 8] [--seconds 5]
+"""
+import argparse
+import pathlib
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from database import create_db_engine  # noqa: E402
+from main import Base, NewsArticle, query_news_page  # noqa: E402
+
+
+def article(i):
+    return NewsArticle(
+        url=f"https://udn.com/news/story/1/{i}",
+        title=f"title {i}",
+        time=f"2024-09-{i % 28 + 1:02d} {i % 24:02d}:00",
+        content="content " * 200,
+        summary="summary",
+        reason="reason",
+    )
+
+
+def run(engine, readers, seconds, seed_articles):
+    Base.metadata.create_all(engine)
+    TestingSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with TestingSession() as db:
+        db.add_all(article(i) for i in range(seed_articles))
+        db.commit()
+
+    stop = threading.Event()
+    reads, errors, latencies, writes = [], [], [], [0]
+
+    def write():
+        # one session and commit per article, as the crawler stores them
+        i = seed_articles
+        while not stop.is_set():
+            with TestingSession() as db:
+                db.add(article(i))
+                try:
+                    db.commit()
+                    writes[0] += 1
+                except OperationalError:
+                    errors.append("write")
+            i += 1
+
+    def read():
+        count = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with TestingSession() as db:
+                    query_news_page(db, 50)
+                count += 1
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                errors.append("read")
+        reads.append(count)
+
+    threads = [threading.Thread(target=write)]
+    threads += [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return sum(reads), writes[0], latencies, errors
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--articles", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{args.readers} reader threads and one writer for {args.seconds:g} s")
+    print(f"{'engine':12} {'reads/s':>9} {'writes/s':>9} {'p50 ms':>8} {'max ms':>8} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        profiles = (
+            ("old", lambda url: create_engine(url, connect_args={"check_same_thread": False})),
+            ("production", lambda url: create_db_engine(url, env="production")),
+        )
+        for name, make_engine in profiles:
+            engine = make_engine(f"sqlite:///{pathlib.Path(tmp) / name}.db")
+            reads, writes, latencies, errors = run(
+                engine, args.readers, args.seconds, args.articles
+            )
+            print(
+                f"{name:12} {reads / args.seconds:9.0f} {writes / args.seconds:9.0f} "
+                f"{statistics.median(latencies or [0]) * 1000:8.1f} "
+                f"{max(latencies or [0]) * 1000:8.1f} {len(errors):7}"
+            )
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,117 @@
+"""
+cost of starting the backend: the modules `import main` loads, from
+python -X importtime, and the time from launching uvicorn to the first
+answered request.
+
+openai, sentry_sdk and bcrypt used to be imported, and the tables created,
+on import of main; they are now loaded by clients.py on first use and the
+tables are created in the startup hook.
+
+usage, from backend/:
+    python benchmarks/bench_startup.py [--repeat 5] [--top 15]
+"""
+import argparse
+import os
+import pathlib
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND = pathlib.Path(__file__).resolve().parents[1]
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def bench_env(tmp):
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{pathlib.Path(tmp) / 'startup.db'}",
+        # sentry would send the benchmark's traces
+        "SENTRY_DSN": "",
+    }
+
+
+def import_times(env):
+    """
+    :return: (seconds to import main, {package main imports: seconds})
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    ).stderr
+    total, packages = 0.0, {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        depth, name = len(match.group(3)) // 2, match.group(4)
+        cumulative = int(match.group(2)) / 1e6
+        if depth == 0 and name == "main":
+            total = cumulative
+        elif depth == 1:
+            # imported directly by main, the time covers everything below it
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + cumulative
+    return total, packages
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_request(env, timeout=60):
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=env,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(
+                        f"http://127.0.0.1:{port}/api/v1/news/news?limit=1", timeout=1
+                ) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("server did not answer")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = bench_env(tmp)
+        # the first run compiles bytecode and creates the database
+        time_to_first_request(env)
+        runs = [import_times(env) for _ in range(args.repeat)]
+        first_request = [time_to_first_request(env) for _ in range(args.repeat)]
+
+    totals = [total for total, _ in runs]
+    print(f"import main        median {statistics.median(totals) * 1000:8.1f} ms "
+          f"min {min(totals) * 1000:8.1f} ms")
+    print(f"first request      median {statistics.median(first_request) * 1000:8.1f} ms "
+          f"min {min(first_request) * 1000:8.1f} ms")
+
+    _, packages = min(runs, key=lambda run: run[0])
+    print("\nslowest imports of main in the fastest run")
+    for package, seconds in sorted(packages.items(), key=lambda p: -p[1])[:args.top]:
+        print(f"{package:24} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main_()
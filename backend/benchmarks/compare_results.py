@@ -0,0 +1,84 @@
+"""
+compare two result files of the same benchmark and list the measurements
+that got worse by more than the threshold. exits with 1 when any did, so
+it can gate a change.
+
+usage, from backend/:
+    python benchmarks/compare_results.py results/endpoints-a.json results/endpoints-b.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+# suffix of a measurement -> whether higher is better
+DIRECTIONS = {
+    "_rps": True,
+    "_per_second": True,
+    "_ms": False,
+    "seconds": False,
+    "db_queries": False,
+    "db_queries_per_request": False,
+}
+# keys describing the run, not measuring it
+SKIPPED = {"args", "created_at", "commit", "python", "platform", "cpus", "articles", "requests"}
+
+
+def measurements(results, prefix=()):
+    """:return: {path: (value, higher is better)} of the numeric leaves"""
+    found = {}
+    for key, value in results.items():
+        if key in SKIPPED:
+            continue
+        path = prefix + (key,)
+        if isinstance(value, dict):
+            found.update(measurements(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            direction = next((d for s, d in DIRECTIONS.items() if key.endswith(s)), None)
+            if direction is not None:
+                found[path] = (value, direction)
+    return found
+
+
+def compare(before, after, threshold):
+    """
+    :param threshold: percent change counted as a regression
+    :return: [(path, before, after, percent change, regressed)]
+    """
+    old, new = measurements(before), measurements(after)
+    rows = []
+    for path in sorted(old.keys() & new.keys()):
+        (a, higher_is_better), (b, _) = old[path], new[path]
+        if a == 0:
+            continue
+        change = (b - a) / abs(a) * 100
+        worse = -change if higher_is_better else change
+        rows.append((path, a, b, change, worse > threshold))
+    return rows
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent")
+    parser.add_argument("--all", action="store_true", help="list every measurement")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    rows = compare(before, after, args.threshold)
+    regressions = 0
+    for path, a, b, change, regressed in rows:
+        regressions += regressed
+        if regressed or args.all:
+            mark = "REGRESSED" if regressed else ""
+            print(f"{'.'.join(path):60} {a:12.3f} {b:12.3f} {change:+8.1f}% {mark}")
+    print(f"{regressions} of {len(rows)} measurements regressed by more than {args.threshold:g}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,162 @@
+"""
+seeded synthetic data for the benchmarks: news databases of a given size
+with users and upvotes, and a necessities price feed shaped like the
+opendata one.
+
+the same size and seed always give the same rows. a seeded news database
+is kept under benchmarks/.data and copied for each run, since the 100k
+one takes a while to build and index.
+"""
+import pathlib
+import random
+import shutil
+from datetime import datetime, timedelta
+
+from article_extractor import parse_news_time
+
+DATA_DIR = pathlib.Path(__file__).parent / ".data"
+SIZES = {"1k": 1000, "10k": 10000, "100k": 100000}
+
+BENCH_PASSWORD = "benchpassword"
+# display time of the newest article, udn.com shows taiwan time
+NEWEST_TIME = datetime(2024, 9, 30, 23, 0)
+
+WORDS = (
+    "雞蛋", "鮮乳", "衛生紙", "泡麵", "食用油", "醬油", "米價", "外食", "物價", "漲價",
+    "凍漲", "原物料", "通膨", "進口", "批發", "零售", "量販", "成本", "匯率", "主計總處",
+    "經濟部", "農委會", "消費者", "早餐店", "餐飲", "運費", "電價", "颱風", "菜價", "水果",
+)
+CATEGORIES = ("鮮乳", "雞蛋", "食用油", "衛生紙", "泡麵", "米", "醬油", "麵粉")
+
+
+def phrase(rng, words):
+    return "".join(rng.choice(WORDS) for _ in range(words))
+
+
+def news_rows(articles, seed):
+    """
+    :param articles: number of articles
+    :param seed:
+    :return: column dicts of news_articles, newest first
+    """
+    rng = random.Random(seed)
+    for i in range(articles):
+        time = (NEWEST_TIME - timedelta(minutes=17 * i)).strftime("%Y-%m-%d %H:%M")
+        yield {
+            "url": f"https://udn.com/news/story/{7000 + i % 100}/{8000000 + i}",
+            "title": f"{phrase(rng, 4)}第{i}則",
+            "time": time,
+            "published_at": parse_news_time(time),
+            "content": "。".join(phrase(rng, 8) for _ in range(12)) + "。",
+            "summary": phrase(rng, 10),
+            "reason": phrase(rng, 10),
+            "upvote_count": 0,
+        }
+
+
+def seed_news_database(url, articles, users=200, max_upvotes=8, seed=0, chunk=5000):
+    """
+    create the tables and fill them with articles, users and upvotes, and
+    index the articles for search
+
+    :param url: database url
+    :param articles:
+    :param users: bench0 ... all with BENCH_PASSWORD
+    :param max_upvotes: upvotes of an article, uniform from 0
+    :param seed:
+    :param chunk: rows per insert
+    :return:
+    """
+    # imported here so the stubs can use price_feed before main reads its
+    # environment
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import sessionmaker
+
+    import news_search
+    from main import Base, NewsArticle, User, pwd_context, user_news_association_table
+
+    rng = random.Random(seed + 1)
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    # one hash for every user, bcrypt would dominate the seeding otherwise
+    hashed_password = pwd_context.hash(BENCH_PASSWORD)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"id": u + 1, "username": f"bench{u}", "hashed_password": hashed_password}
+            for u in range(users)
+        ])
+        batch, upvotes = [], []
+        for article_id, row in enumerate(news_rows(articles, seed), start=1):
+            voters = rng.sample(range(1, users + 1), rng.randint(0, min(max_upvotes, users)))
+            row["id"] = article_id
+            row["upvote_count"] = len(voters)
+            batch.append(row)
+            upvotes.extend({"user_id": u, "news_articles_id": article_id} for u in voters)
+            if len(batch) >= chunk:
+                conn.execute(insert(NewsArticle.__table__), batch)
+                batch = []
+            if len(upvotes) >= chunk:
+                conn.execute(insert(user_news_association_table), upvotes)
+                upvotes = []
+        if batch:
+            conn.execute(insert(NewsArticle.__table__), batch)
+        if upvotes:
+            conn.execute(insert(user_news_association_table), upvotes)
+    with sessionmaker(bind=engine)() as db:
+        news_search.rebuild_news_search_index(db)
+        db.commit()
+    engine.dispose()
+
+
+def news_database(size, seed=0, copy_to=None):
+    """
+    path of the seeded database of size articles, built on first use
+
+    :param size: number of articles
+    :param seed:
+    :param copy_to: directory to copy the database into, for runs that write
+    :return: path of the database file
+    """
+    path = DATA_DIR / f"news-{size}-seed{seed}.db"
+    if not path.exists():
+        DATA_DIR.mkdir(exist_ok=True)
+        building = path.with_suffix(".building")
+        building.unlink(missing_ok=True)
+        seed_news_database(f"sqlite:///{building}", size, seed=seed)
+        building.rename(path)
+    if copy_to is None:
+        return path
+    copy = pathlib.Path(copy_to) / path.name
+    shutil.copyfile(path, copy)
+    return copy
+
+
+def price_feed(records, months=120, seed=0):
+    """
+    necessities price records like the opendata dataset
+
+    :param records: number of products
+    :param months: length of each monthly series
+    :param seed:
+    :return: list of records
+    """
+    rng = random.Random(seed)
+    feed = []
+    for number in range(1, records + 1):
+        price = rng.randint(20, 400)
+        values = []
+        for _ in range(months):
+            price = max(1, round(price * rng.uniform(0.97, 1.04)))
+            # opendata marks missing months with 0
+            values.append(0 if rng.random() < 0.03 else price)
+        category = rng.choice(CATEGORIES)
+        feed.append({
+            "類別": category,
+            "編號": number,
+            "產品名稱": f"{category}{phrase(rng, 2)}{number}",
+            "規格": f"{rng.randint(1, 20) * 100}g/包",
+            "統計值": ",".join(str(v) for v in values),
+            "時間起點": "2014-10-01",
+            "時間終點": "2024-09-01",
+        })
+    return feed
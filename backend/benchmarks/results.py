@@ -0,0 +1,85 @@
+"""
+percentiles and the json result files of the benchmark suite
+
+every run writes benchmarks/results/<benchmark>-<time>.json with the
+commit, the machine and the arguments it ran with, so two runs can be
+compared with compare_results.py.
+"""
+import json
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+RESULTS_DIR = pathlib.Path(__file__).parent / "results"
+
+
+def percentile(values, q):
+    """
+    :param values: sorted
+    :param q: 0 - 100
+    :return: nearest rank percentile, 0 for no values
+    """
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+def latency_summary(latencies, wall_seconds, errors=0):
+    """
+    :param latencies: seconds of each request
+    :param wall_seconds: time all the requests took together
+    :param errors: requests that failed
+    :return: json-ready dict, latencies in ms
+    """
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / wall_seconds, 2) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        "max_ms": round(latencies[-1] * 1000, 3) if count else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=pathlib.Path(__file__).parent, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_info(benchmark, args):
+    return {
+        "benchmark": benchmark,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+    }
+
+
+def write_results(results, output=None):
+    """
+    :param results: from run_info, with the measurements added
+    :param output: path, results/<benchmark>-<time>.json by default
+    :return: path written
+    """
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = RESULTS_DIR / f"{results['benchmark']}-{stamp}.json"
+    output = pathlib.Path(output)
+    output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    return output
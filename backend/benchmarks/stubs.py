@@ -0,0 +1,176 @@
+"""
+local stand-ins for udn.com, the opendata price api and openai, so the
+benchmarks do not depend on, or load, the real services.
+
+    with StubServers(price_records=5000) as stubs:
+        env = stubs.env()   # UDN_MORE_URL, NECESSITIES_PRICE_URL, OPENAI_BASE_URL
+
+udn.com serves listing pages of items_per_page items and article pages
+made from the saved pages in fixtures/, each with a paragraph of its own
+so summaries are not served from the llm cache. openai answers the
+relevance, summary and keyword prompts of main.py with canned content,
+after llm_latency seconds.
+"""
+import json
+import pathlib
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from datasets import price_feed
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+ARTICLE_PAGES = ("udn_article_1.html", "udn_article_2.html", "udn_article_3.html")
+EDITOR = re.compile(r'class="article-content__editor[^"]*"[^>]*>')
+
+
+def article_templates():
+    """:return: (html before the article text, html after it) of each fixture"""
+    templates = []
+    for name in ARTICLE_PAGES:
+        html = (FIXTURES / name).read_text(encoding="utf-8")
+        end = EDITOR.search(html).end()
+        templates.append((html[:end], html[end:]))
+    return templates
+
+
+def completion(model, content):
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def answer_prompt(system_prompt, user_content):
+    """canned answer to each system prompt of main.py"""
+    if "JSON陣列" in system_prompt:
+        items = json.loads(user_content)
+        return json.dumps({"results": [{"id": item["id"], "relevance": "high"} for item in items]})
+    if "關聯度" in system_prompt:
+        return "high"
+    if "摘要" in system_prompt:
+        return json.dumps({"影響": "民生物價上漲，消費者負擔加重。", "原因": "原物料與運費成本增加。"}, ensure_ascii=False)
+    return "雞蛋 價格"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stubs = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, body, content_type="application/json", status=200):
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.stubs.requests[url.path.split("/")[1] or "/"] += 1
+        if url.path == "/api/more":
+            params = parse_qs(url.query)
+            page = int(params["page"][0])
+            term = unquote(params["id"][0].removeprefix("search:"))
+            self.reply(json.dumps({"lists": self.stubs.listing(term, page)}))
+        elif url.path.startswith("/news/story/"):
+            self.reply(self.stubs.article(url.path), "text/html; charset=utf-8")
+        elif url.path == "/prices":
+            self.reply(self.stubs.price_body)
+        else:
+            self.reply(b"{}", status=404)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        self.stubs.requests[url.path.split("/")[1]] += 1
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if url.path.endswith("/chat/completions"):
+            time.sleep(self.stubs.llm_latency)
+            messages = body["messages"]
+            content = answer_prompt(messages[0]["content"], messages[-1]["content"])
+            self.reply(json.dumps(completion(body["model"], content)))
+        else:
+            self.reply(b"{}", status=404)
+
+
+class StubServers:
+
+    def __init__(self, price_records=5000, items_per_page=20, llm_latency=0.0, seed=0):
+        """
+        :param price_records: products in the price feed
+        :param items_per_page: items of each udn.com listing page
+        :param llm_latency: seconds each chat completion takes
+        :param seed: of the price feed
+        """
+        self.items_per_page = items_per_page
+        self.llm_latency = llm_latency
+        self.price_body = json.dumps(price_feed(price_records, seed=seed), ensure_ascii=False).encode()
+        self.templates = article_templates()
+        # items added to the top of every listing, see publish
+        self.published = 0
+        # first part of the path -> requests served
+        self.requests = Counter()
+        self._server = None
+
+    def __enter__(self):
+        handler = type("Handler", (_Handler,), {"stubs": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """environment pointing main.py at the stubs"""
+        return {
+            "UDN_MORE_URL": f"{self.base_url}/api/more",
+            "NECESSITIES_PRICE_URL": f"{self.base_url}/prices",
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+            "OPENAI_API_KEY": "stub",
+        }
+
+    def publish(self, items):
+        """put items newer than everything listed so far on top of the listings"""
+        self.published += items
+
+    def listing(self, term, page):
+        # item n is the n-th oldest, page 1 shows the newest
+        newest = self.published + 10 * self.items_per_page
+        first = newest - (page - 1) * self.items_per_page
+        return [
+            {
+                "title": f"{term} 第{n}則 物價新聞",
+                "titleLink": f"{self.base_url}/news/story/{zlib.crc32(term.encode()) % 1000}/{n}",
+                "time": "2024-09-30 12:00",
+            }
+            for n in range(first, max(first - self.items_per_page, 0), -1)
+        ]
+
+    def article(self, path):
+        n = int(path.rstrip("/").rsplit("/", 1)[1])
+        before, after = self.templates[n % len(self.templates)]
+        return f"{before}<p>本文編號 {path}，{n} 則物價新聞。</p>{after}"
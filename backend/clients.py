@@ -0,0 +1,95 @@
+"""
+shared clients of outside services, created on first use
+
+every llm call used to build a new OpenAI client, and with it a new
+connection pool and tls handshake, and the price refresh opened a new
+connection per download. the clients here are built once per process and
+reused. openai and sentry_sdk are imported only when first needed, so
+importing main (the api, the crawl worker, the tests) stays fast.
+
+configured with environment variables:
+    OPENAI_API_KEY               key of the openai client
+    OPENAI_TIMEOUT               seconds per llm call, 60 by default
+    HTTP_POOL_MAXSIZE            connections kept per host, 10 by default
+    SENTRY_DSN                   an empty value turns sentry off
+    SENTRY_TRACES_SAMPLE_RATE    share of requests traced, 0.1 by default
+    SENTRY_PROFILES_SAMPLE_RATE  share of traces profiled, 0 by default
+"""
+import os
+import threading
+
+DEFAULT_SENTRY_DSN = "https://4001ffe917ccb261aa0e0c34026dc343@o4505702629834752.ingest.us.sentry.io/4507694792704000"
+
+_lock = threading.Lock()
+# name -> client
+_clients = {}
+
+
+def env_float(name, default):
+    return float(os.environ.get(name) or default)
+
+
+def shared(name, factory):
+    """
+    :param name: key of the client
+    :param factory: builds the client, called once per process
+    :return: the client
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def reset_clients():
+    """forget the clients, e.g. in a forked process, whose pools must not be shared"""
+    with _lock:
+        _clients.clear()
+
+
+def _build_openai_client():
+    from openai import OpenAI
+    return OpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY") or "xxx",
+        timeout=env_float("OPENAI_TIMEOUT", 60),
+    )
+
+
+def openai_client():
+    return shared("openai", _build_openai_client)
+
+
+def _build_http_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=int(os.environ.get("HTTP_POOL_MAXSIZE") or 10))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def http_session():
+    """requests session with a pool of keep-alive connections"""
+    return shared("http", _build_http_session)
+
+
+def init_sentry():
+    """
+    start sentry with the configured sample rates
+
+    :return: whether sentry was started
+    """
+    dsn = os.environ.get("SENTRY_DSN", DEFAULT_SENTRY_DSN)
+    if not dsn:
+        return False
+    import sentry_sdk
+    sentry_sdk.init(
+        dsn=dsn,
+        traces_sample_rate=env_float("SENTRY_TRACES_SAMPLE_RATE", 0.1),
+        profiles_sample_rate=env_float("SENTRY_PROFILES_SAMPLE_RATE", 0),
+    )
+    return True
@@ -0,0 +1,323 @@
+"""
+crawl worker, run apart from the api server:
+
+    python crawl_worker.py [--processes 2] [--backfill] [--once]
+
+the api used to crawl inside its startup hook and run a scheduler in every
+uvicorn worker, so it started only after a whole crawl and n workers crawled
+n times. now any number of these workers may run, but only the holder of
+the "crawler" lease in worker_leases schedules and runs jobs; the others
+wait for the lease to expire.
+
+jobs are rows of crawl_jobs: the periodic crawl of the latest news and the
+price refresh, backfills of every listing page, and searches the api
+answered live (see enqueue_crawl_job in main.py). the lease holder claims
+them by priority and runs them on a pool of processes.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.exc import IntegrityError
+
+import clients
+import main
+import metrics
+from main import CrawlJob, NewsArticle, WorkerLease, enqueue_crawl_job
+
+CRAWL_LEASE = "crawler"
+LEASE_TTL = timedelta(seconds=int(os.environ.get("CRAWL_LEASE_TTL", 60)))
+POLL_INTERVAL = float(os.environ.get("CRAWL_POLL_INTERVAL", 5))
+CRAWL_PROCESSES = int(os.environ.get("CRAWL_PROCESSES", 2))
+# prometheus metrics of the worker, 0 turns them off
+CRAWL_METRICS_PORT = int(os.environ.get("CRAWL_METRICS_PORT", 9101))
+MAX_ATTEMPTS = 3
+
+# kind -> interval of the jobs the lease holder queues by itself
+PERIODIC_JOBS = {
+    "latest": timedelta(minutes=100),
+    "prices": timedelta(hours=main.NECESSITIES_PRICE_REFRESH_HOURS),
+}
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_lease(db, name, owner, ttl=LEASE_TTL):
+    """
+    take or renew the lease, it is taken over only once expired
+
+    :param db:
+    :param name:
+    :param owner: name of this worker
+    :param ttl: how long the lease holds without renewal
+    :return: whether owner holds the lease
+    """
+    now = datetime.utcnow()
+    taken = db.execute(
+        update(WorkerLease)
+        .where(
+            WorkerLease.name == name,
+            or_(WorkerLease.owner == owner, WorkerLease.expires_at < now),
+        )
+        .values(owner=owner, expires_at=now + ttl)
+    ).rowcount
+    if taken:
+        db.commit()
+        return True
+    if db.get(WorkerLease, name) is not None:
+        db.rollback()
+        return False
+    try:
+        db.add(WorkerLease(name=name, owner=owner, expires_at=now + ttl))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+def release_lease(db, name, owner):
+    db.query(WorkerLease).filter(
+        WorkerLease.name == name, WorkerLease.owner == owner
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def requeue_orphaned_jobs(db, owner):
+    """put back jobs left running by a previous lease holder"""
+    db.execute(
+        update(CrawlJob)
+        .where(CrawlJob.status == "running", CrawlJob.owner != owner)
+        .values(status="pending", owner=None)
+    )
+    db.commit()
+
+
+def schedule_periodic_jobs(db, now=None):
+    """
+    queue the periodic jobs that are due, and a backfill of an empty store
+
+    :param db:
+    :param now:
+    :return: kinds queued
+    """
+    now = now or datetime.utcnow()
+    queued = []
+    for kind, interval in PERIODIC_JOBS.items():
+        last = db.query(func.max(CrawlJob.created_at)).filter(CrawlJob.kind == kind).scalar()
+        if last is None or now - last >= interval:
+            enqueue_crawl_job(db, kind)
+            queued.append(kind)
+    backfilled = db.query(CrawlJob.id).filter(CrawlJob.kind == "backfill").first()
+    if backfilled is None and db.query(NewsArticle.id).first() is None:
+        enqueue_crawl_job(db, "backfill")
+        queued.append("backfill")
+    return queued
+
+
+def claim_crawl_jobs(db, owner, limit):
+    """
+    :param db:
+    :param owner: name of this worker
+    :param limit: jobs to claim at most
+    :return: [(job id, kind, payload)] now marked running
+    """
+    if limit <= 0:
+        return []
+    jobs = (
+        db.query(CrawlJob)
+        .filter(CrawlJob.status == "pending")
+        .order_by(CrawlJob.priority, CrawlJob.id)
+        .limit(limit)
+        .all()
+    )
+    now = datetime.utcnow()
+    for job in jobs:
+        job.status = "running"
+        job.owner = owner
+        job.started_at = now
+        job.attempts += 1
+    db.commit()
+    return [(job.id, job.kind, json.loads(job.payload)) for job in jobs]
+
+
+def finish_crawl_job(db, job_id, result=None, error=None):
+    """record the outcome, a failed job is retried up to MAX_ATTEMPTS times"""
+    job = db.get(CrawlJob, job_id)
+    if error is not None and job.attempts < MAX_ATTEMPTS:
+        job.status, job.owner = "pending", None
+    else:
+        job.status = "failed" if error is not None else "done"
+    job.finished_at = datetime.utcnow()
+    job.result = json.dumps(result if error is None else {"error": error}, ensure_ascii=False)
+    db.commit()
+
+
+def run_crawl_job(kind, payload):
+    """
+    body of a job, runs in a pool process
+
+    :return: (json summary of the job, metrics recorded while running it)
+    """
+    # a pool process runs one job at a time, what it records belongs to this job
+    metrics.REGISTRY.reset()
+    try:
+        return crawl_job_result(kind, payload), metrics.REGISTRY.snapshot()
+    except Exception as e:
+        e.metrics = metrics.REGISTRY.snapshot()
+        raise
+
+
+def crawl_job_result(kind, payload):
+    if kind == "latest":
+        return main.get_new()._asdict()
+    if kind == "backfill":
+        return main.get_new(is_initial=True)._asdict()
+    if kind == "search":
+        return main.get_new(search_term=payload["keywords"])._asdict()
+    if kind == "prices":
+        db = main.SessionLocal()
+        try:
+            return {"records": main.refresh_necessities_prices(db)}
+        finally:
+            db.close()
+    raise ValueError(f"unknown crawl job {kind}")
+
+
+def reset_engine():
+    # pooled connections inherited through fork must not be reused
+    main.engine.dispose(close=False)
+    clients.reset_clients()
+
+
+class CrawlWorker:
+
+    def __init__(self, session_factory, pool, processes, owner=None):
+        """
+        :param session_factory: returns a new session
+        :param pool: executor running run_crawl_job
+        :param processes: jobs run at once
+        :param owner: name of this worker
+        """
+        self.session_factory = session_factory
+        self.pool = pool
+        self.processes = processes
+        self.owner = owner or worker_name()
+        # future -> (job id, kind, perf_counter at start)
+        self.running = {}
+        self.leader = False
+
+    def tick(self):
+        """
+        one round: renew the lease, queue due jobs, record finished jobs and
+        start pending ones
+
+        :return: whether this worker holds the lease
+        """
+        with self.session_factory() as db:
+            leader = acquire_lease(db, CRAWL_LEASE, self.owner)
+            if leader and not self.leader:
+                requeue_orphaned_jobs(db, self.owner)
+            self.leader = leader
+            self.record_finished(db)
+            if not leader:
+                return False
+            schedule_periodic_jobs(db)
+            for job_id, kind, payload in claim_crawl_jobs(
+                    db, self.owner, self.processes - len(self.running)
+            ):
+                print(f"crawl job {job_id}: {kind} {payload}")
+                future = self.pool.submit(run_crawl_job, kind, payload)
+                self.running[future] = (job_id, kind, time.perf_counter())
+        return True
+
+    def record_finished(self, db):
+        """record the outcome and metrics of the jobs that are done"""
+        for future in [f for f in self.running if f.done()]:
+            job_id, kind, started = self.running.pop(future)
+            try:
+                (result, recorded), error = future.result(), None
+            except Exception as e:
+                print(f"crawl job {job_id} failed: {e!r}")
+                result, recorded, error = None, getattr(e, "metrics", {}), repr(e)
+            metrics.REGISTRY.merge(recorded)
+            metrics.CRAWL_JOB_SECONDS.observe(
+                time.perf_counter() - started,
+                kind=kind, status="failed" if error is not None else "done",
+            )
+            finish_crawl_job(db, job_id, result=result, error=error)
+
+    def run(self, stop, poll_interval=POLL_INTERVAL):
+        try:
+            while not stop.is_set():
+                self.tick()
+                stop.wait(poll_interval)
+        finally:
+            # let running jobs finish and be recorded before giving up the
+            # lease, without scheduling or claiming any new ones
+            for future in list(self.running):
+                future.exception()
+            with self.session_factory() as db:
+                self.record_finished(db)
+                release_lease(db, CRAWL_LEASE, self.owner)
+
+    def run_until_idle(self, poll_interval=0.5):
+        """
+        run the queued jobs, then return, for --once
+
+        :return: False when another worker holds the lease
+        """
+        while True:
+            if not self.tick():
+                return False
+            if not self.running:
+                with self.session_factory() as db:
+                    pending = db.query(CrawlJob.id).filter(CrawlJob.status == "pending").first()
+                if pending is None:
+                    break
+            time.sleep(poll_interval)
+        with self.session_factory() as db:
+            release_lease(db, CRAWL_LEASE, self.owner)
+        return True
+
+
+def main_():
+    parser = argparse.ArgumentParser(description="crawl worker")
+    parser.add_argument("--processes", type=int, default=CRAWL_PROCESSES)
+    parser.add_argument("--backfill", action="store_true", help="queue a crawl of every listing page")
+    parser.add_argument("--once", action="store_true", help="run the due and queued jobs, then exit")
+    parser.add_argument("--metrics-port", type=int, default=CRAWL_METRICS_PORT)
+    args = parser.parse_args()
+
+    main.init_database()
+    if args.metrics_port and not args.once:
+        metrics.serve(args.metrics_port)
+    if args.backfill:
+        with main.SessionLocal() as db:
+            enqueue_crawl_job(db, "backfill")
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    with ProcessPoolExecutor(args.processes, initializer=reset_engine) as pool:
+        worker = CrawlWorker(main.SessionLocal, pool, args.processes)
+        print(f"crawl worker {worker.owner} with {args.processes} processes")
+        if args.once:
+            if not worker.run_until_idle():
+                print("another worker holds the crawler lease")
+        else:
+            try:
+                worker.run(stop)
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == "__main__":
+    main_()
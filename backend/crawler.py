@@ -0,0 +1,211 @@
+"""
+async http fetching for the udn.com crawler
+
+one Crawler owns a pooled httpx.AsyncClient and puts every request
+through a global concurrency limit, a per-host token bucket, a timeout
+and retries with exponential backoff.
+"""
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+import httpx
+
+from metrics import OUTBOUND_REQUEST_SECONDS
+
+# overridable to point the crawler at a stub, see benchmarks/stubs.py
+UDN_MORE_URL = os.environ.get("UDN_MORE_URL", "https://udn.com/api/more")
+INITIAL_PAGES = range(1, 10)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class HostRateLimiter:
+    """token bucket per host, `rate` requests per second with bursts of `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, host):
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                tokens, updated = self._buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            await asyncio.sleep(wait)
+
+
+class Crawler:
+    """
+    shared async http client for the crawl pipeline
+
+    use as ``async with Crawler() as crawler``, or pass an existing
+    ``httpx.AsyncClient`` which is then left open on exit.
+    """
+
+    def __init__(
+            self,
+            client=None,
+            concurrency=10,
+            rate=20.0,
+            burst=10,
+            retries=3,
+            backoff=0.5,
+            timeout=10.0,
+    ):
+        self._client = client
+        self._owns_client = client is None
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._limiter = HostRateLimiter(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    async def __aenter__(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.concurrency),
+            )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._owns_client:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, url, params=None, headers=None):
+        """
+        GET with rate limiting and retries
+
+        :param url:
+        :param params:
+        :param headers: extra request headers
+        :return: httpx.Response with a non-error or 304 status
+        """
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            await self._limiter.acquire(host)
+            try:
+                async with self._semaphore:
+                    started, status = time.perf_counter(), "error"
+                    try:
+                        response = await self._client.get(
+                            url, params=params, headers=headers, timeout=self.timeout
+                        )
+                        status = response.status_code
+                    finally:
+                        OUTBOUND_REQUEST_SECONDS.observe(
+                            time.perf_counter() - started, host=host, status=status
+                        )
+                if response.status_code == 304:
+                    return response
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+                error = httpx.HTTPStatusError(
+                    f"{response.status_code} from {url}",
+                    request=response.request,
+                    response=response,
+                )
+            except httpx.TransportError as e:
+                error = e
+            if attempt == self.retries:
+                raise error
+            await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random() / 2))
+
+    async def fetch_news_list(self, search_term, page=1):
+        response = await self.get(
+            UDN_MORE_URL, params=news_list_params(search_term, page)
+        )
+        return response.json()["lists"]
+
+    async def fetch_news_list_if_modified(
+            self, search_term, page=1, etag=None, last_modified=None
+    ):
+        """
+        conditional fetch of a listing page
+
+        :param search_term:
+        :param page:
+        :param etag: ETag of the previous response
+        :param last_modified: Last-Modified of the previous response
+        :return: (news items or None when not modified, etag, last_modified)
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        response = await self.get(
+            UDN_MORE_URL, params=news_list_params(search_term, page), headers=headers
+        )
+        if response.status_code == 304:
+            return None, etag, last_modified
+        return (
+            response.json()["lists"],
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+    async def fetch_news_lists(self, search_term, pages):
+        """
+        fetch several search listing pages at once
+
+        :param search_term:
+        :param pages: page numbers
+        :return: news items of all pages, in page order
+        """
+        lists = await asyncio.gather(
+            *(self.fetch_news_list(search_term, page) for page in pages)
+        )
+        return [news for page in lists for news in page]
+
+    async def fetch_pages(self, urls):
+        """
+        fetch article pages at once
+
+        :param urls:
+        :return: html text for each url, or the exception that stopped it
+        """
+        async def fetch_text(url):
+            return (await self.get(url)).text
+
+        return await asyncio.gather(
+            *(fetch_text(url) for url in urls), return_exceptions=True
+        )
+
+
+def news_list_params(search_term, page):
+    return {
+        "page": page,
+        "id": f"search:{quote(search_term)}",
+        "channelId": 2,
+        "type": "searchword",
+    }
+
+
+def run_sync(coro):
+    """
+    run a coroutine to completion from sync code, in a helper thread when
+    the calling thread already runs an event loop
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
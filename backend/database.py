@@ -0,0 +1,159 @@
+"""
+engine factory for the news database
+
+the production profile of a sqlite file turns on write-ahead logging, so
+the crawler's writes no longer block readers, relaxes fsync to once per
+checkpoint and gives every pooled connection a larger page cache, a memory
+map of the file and a busy timeout instead of failing at once on a locked
+database. statements are echoed only in the development profile.
+
+configured with environment variables:
+    DATABASE_URL        sqlite:///news_database.db by default, with or
+                        without an async driver, e.g. postgresql+asyncpg://...
+    APP_ENV             development echoes every statement
+    DB_POOL_SIZE        pooled connections, 5 by default
+    DB_MAX_OVERFLOW     connections opened past the pool, 10 by default
+    DB_BUSY_TIMEOUT_MS  wait for a locked database, 5000 by default
+"""
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+
+DEFAULT_DATABASE_URL = "sqlite:///news_database.db"
+
+# driver of each backend for the async engine, the sync engine uses the
+# default driver of the backend. only backends with INSERT ... ON CONFLICT,
+# which main.UPSERT_INSERTS relies on
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    # with wal, NORMAL only fsyncs at checkpoints and is still crash safe
+    "synchronous": "NORMAL",
+    # negative means KiB, 64 MiB per connection
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+
+def is_memory_database(url):
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def apply_sqlite_pragmas(engine, pragmas, busy_timeout_ms):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
+
+def database_url(url=None):
+    return make_url(url or os.environ.get("DATABASE_URL") or DEFAULT_DATABASE_URL)
+
+
+def sync_database_url(url=None):
+    """the url with the default sync driver of its backend"""
+    url = database_url(url)
+    if url.get_driver_name() in ASYNC_DRIVERS.values():
+        return url.set(drivername=url.get_backend_name())
+    return url
+
+
+def async_database_url(url=None):
+    """the url with the async driver of its backend"""
+    url = database_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"no async driver known for {backend}")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def engine_options(url, env, pragmas, kwargs, is_async=False):
+    """
+    :param is_async: options of the async engine
+    :return: (create_engine options, sqlite pragmas or None)
+    """
+    env = env or os.environ.get("APP_ENV", "production")
+    options = {"echo": env == "development"}
+    if url.get_backend_name() != "sqlite":
+        options.update(
+            pool_size=env_int("DB_POOL_SIZE", 5),
+            max_overflow=env_int("DB_MAX_OVERFLOW", 10),
+            pool_pre_ping=True,
+        )
+        options.update(kwargs)
+        return options, None
+
+    busy_timeout_ms = env_int("DB_BUSY_TIMEOUT_MS", 5000)
+    # sessions are used from the request threadpool and the scheduler thread
+    options["connect_args"] = {
+        "check_same_thread": False,
+        "timeout": busy_timeout_ms / 1000,
+    }
+    if is_memory_database(url):
+        # every connection would get its own empty database otherwise
+        options["poolclass"] = StaticPool
+        pragmas = {}
+    else:
+        # a file database defaults to a NullPool under aiosqlite, which
+        # takes no pool sizes
+        options.update(
+            poolclass=AsyncAdaptedQueuePool if is_async else QueuePool,
+            pool_size=env_int("DB_POOL_SIZE", 5),
+            max_overflow=env_int("DB_MAX_OVERFLOW", 10),
+        )
+    options.update(kwargs)
+    return options, (SQLITE_PRAGMAS if pragmas is None else pragmas, busy_timeout_ms)
+
+
+def create_db_engine(url=None, env=None, pragmas=None, **kwargs):
+    """
+    create the engine of the news database
+
+    :param url: database url, DATABASE_URL by default
+    :param env: profile, APP_ENV by default; development echoes statements
+    :param pragmas: sqlite pragmas, SQLITE_PRAGMAS by default
+    :param kwargs: passed on to create_engine
+    :return:
+    """
+    url = sync_database_url(url)
+    options, sqlite = engine_options(url, env, pragmas, kwargs)
+    engine = create_engine(url, **options)
+    if sqlite is not None:
+        apply_sqlite_pragmas(engine, *sqlite)
+    return engine
+
+
+def create_async_db_engine(url=None, env=None, pragmas=None, **kwargs):
+    """
+    create the async engine of the news database, same profile as
+    create_db_engine
+
+    :param url: database url, DATABASE_URL by default
+    :param env: profile, APP_ENV by default; development echoes statements
+    :param pragmas: sqlite pragmas, SQLITE_PRAGMAS by default
+    :param kwargs: passed on to create_async_engine
+    :return:
+    """
+    url = async_database_url(url)
+    options, sqlite = engine_options(url, env, pragmas, kwargs, is_async=True)
+    engine = create_async_engine(url, **options)
+    if sqlite is not None:
+        apply_sqlite_pragmas(engine.sync_engine, *sqlite)
+    return engine
@@ -1,25 +1,44 @@
+import asyncio
+import base64
+import hashlib
 import json
-import sentry_sdk
-from apscheduler.schedulers.background import BackgroundScheduler
+from collections import Counter, namedtuple
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import itertools
-from sqlalchemy import delete, insert, select
+import time
+import orjson
+from sqlalchemy import delete, event, insert, inspect, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import Session, sessionmaker
 from typing import List, Optional
 import requests
-from fastapi import APIRouter, HTTPException, Query, Depends, status, FastAPI
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response, status, FastAPI
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from passlib.context import LazyCryptContext
 
 from pydantic import BaseModel, Field, AnyHttpUrl
-from sqlalchemy import (Column, ForeignKey, Integer, String, Table, Text,
-                        create_engine)
+from sqlalchemy import (Column, DateTime, ForeignKey, Index, Integer,
+                        LargeBinary, String, Table, Text)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 
+import news_search
+import price_series
+from article_extractor import parse_news_time
+from database import create_async_db_engine, create_db_engine
+from auth_cache import AuthCache, AuthenticatedUser
+from clients import http_session, init_sentry, openai_client
+from metrics import (CONTENT_TYPE, CRAWL_ITEMS, LLM_REQUEST_SECONDS,
+                     OUTBOUND_REQUEST_SECONDS, REGISTRY, RequestMetricsMiddleware)
+from password_hashing import PasswordHasher, PasswordHasherBusy
+from response_cache import ResponseCache, etag_matches
+
 Base = declarative_base()
 
 
@@ -52,30 +71,141 @@ class NewsArticle(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     url = Column(String, unique=True, nullable=False)
     title = Column(String, nullable=False)
+    # display text of udn.com, taiwan time
     time = Column(String, nullable=False)
+    # time parsed to naive utc, what listings sort and filter on
+    published_at = Column(
+        DateTime,
+        nullable=False,
+        default=lambda context: published_at_of(context.get_current_parameters()["time"]),
+    )
     content = Column(Text, nullable=False)
     summary = Column(Text, nullable=False)
     reason = Column(Text, nullable=False)
+    # rows of user_news_upvotes for this article, kept by toggle_upvote
+    upvote_count = Column(Integer, nullable=False, default=0, server_default="0")
     upvoted_by_users = relationship(
         "User", secondary=user_news_association_table, back_populates="upvoted_news"
     )
 
+    __table_args__ = (
+        # backs the (published_at, id) keyset pagination and date ranges
+        Index("ix_news_articles_published_at_id", "published_at", "id"),
+    )
 
-engine = create_engine("sqlite:///news_database.db", echo=True)
 
-Base.metadata.create_all(engine)
+def published_at_of(time):
+    """published_at of a display time, the ingest time when it is unreadable"""
+    return parse_news_time(time) or datetime.utcnow()
 
-Session = sessionmaker(bind=engine)
 
-sentry_sdk.init(
-    dsn="https://4001ffe917ccb261aa0e0c34026dc343@o4505702629834752.ingest.us.sentry.io/4507694792704000",
-    traces_sample_rate=1.0,
-    profiles_sample_rate=1.0,
-)
+class CrawledUrl(Base):
+    """every news item the crawler has already judged, stored or not"""
+    __tablename__ = "crawled_urls"
+    url = Column(String, primary_key=True)
+    # hash of the normalized title, catches the same story under another url
+    fingerprint = Column(String(64), nullable=False, index=True)
+    relevance = Column(String(16), nullable=True)
+    seen_at = Column(DateTime, nullable=False)
+
+
+class HttpValidator(Base):
+    """ETag / Last-Modified of the last response of a crawled url"""
+    __tablename__ = "http_validators"
+    key = Column(String, primary_key=True)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+
+
+class LlmCacheEntry(Base):
+    """chat completion result keyed by a hash of model, prompt and input"""
+    __tablename__ = "llm_cache"
+    key = Column(String(64), primary_key=True)
+    model = Column(String(50), nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    last_used_at = Column(DateTime, nullable=False, index=True)
+
+
+class WorkerLease(Base):
+    """a role only one process may hold at a time, until expires_at"""
+    __tablename__ = "worker_leases"
+    name = Column(String(32), primary_key=True)
+    owner = Column(String(100), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class CrawlJob(Base):
+    """work queued for crawl_worker, lower priority runs first"""
+    __tablename__ = "crawl_jobs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(16), nullable=False)
+    payload = Column(Text, nullable=False)
+    priority = Column(Integer, nullable=False)
+    # pending, running, done or failed
+    status = Column(String(16), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    owner = Column(String(100), nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    result = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_crawl_jobs_status_priority_id", "status", "priority", "id"),
+        Index("ix_crawl_jobs_kind_created_at", "kind", "created_at"),
+    )
+
+
+class CacheVersion(Base):
+    """version of a group of cached responses, bumped by every write to it"""
+    __tablename__ = "cache_versions"
+    namespace = Column(String(32), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class NecessitiesPrice(Base):
+    """local copy of one record of the opendata necessities price dataset"""
+    __tablename__ = "necessities_prices"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    number = Column(String, nullable=True)
+    category = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    # the upstream record, kept verbatim so responses keep the same shape
+    record = Column(Text, nullable=False)
+    # 統計值 decoded at ingest, see price_series
+    series = Column(LargeBinary, nullable=True)
+    series_start = Column(Integer, nullable=True)
+    fetched_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_necessities_prices_category_name", "category", "name"),
+        Index("ix_necessities_prices_name", "name"),
+        Index("ix_necessities_prices_number", "number"),
+    )
+
+
+# full text index over news_articles, created along with the tables
+event.listen(Base.metadata, "after_create", news_search.CREATE_FTS_TABLE)
+
+engine = create_db_engine()
+# same database for the async routes, see async_session_opener
+async_engine = create_async_db_engine()
+
+
+def init_database():
+    """create missing tables, once per process that serves or crawls"""
+    Base.metadata.create_all(engine)
+
+
+# before the app, so its integrations see the app being built
+init_sentry()
 
 app = FastAPI()
-bgs = BackgroundScheduler()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
 
 app.add_middleware(
     CORSMiddleware,  # noqa
@@ -83,10 +213,92 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+# outermost, so it times the whole request
+app.add_middleware(RequestMetricsMiddleware)
+
+
+@app.on_event("startup")
+def create_tables():
+    init_database()
+
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+# namespaces of cached responses, see cached_json_response
+NEWS_CACHE = "news"
+PRICES_CACHE = "prices"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 256))
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_MAX_ENTRIES)
+
+
+def bump_cache_version(db, namespace):
+    """invalidate the cached responses of namespace, commits with the caller"""
+    bumped = db.execute(
+        update(CacheVersion)
+        .where(CacheVersion.namespace == namespace)
+        .values(version=CacheVersion.version + 1)
+    ).rowcount
+    if not bumped:
+        db.merge(CacheVersion(namespace=namespace, version=1))
+        db.flush()
+
+
+def read_cache_version(db, namespace):
+    version = db.query(CacheVersion.version).filter(
+        CacheVersion.namespace == namespace
+    ).scalar()
+    return version or 0
+
+
+def cached_json_response(request, db, namespace, build, key=(), private=False):
+    """
+    answer a GET from response_cache, or with 304 when the client already
+    has the current body
+
+    :param request:
+    :param db:
+    :param namespace: data the response is built from
+    :param build: returns (json body as bytes, headers) on a cache miss
+    :param key: what else the body depends on, e.g. the user id
+    :param private: the body differs per user
+    :return:
+    """
+    version = read_cache_version(db, namespace)
+    cache_key = (request.url.path, tuple(sorted(request.query_params.multi_items())), key)
+    entry = response_cache.get(cache_key, version)
+    if entry is None:
+        body, headers = build()
+        entry = response_cache.put(cache_key, version, body, headers)
+    headers = {
+        "ETag": entry.etag,
+        # revalidate every time, the 304 is cheap
+        "Cache-Control": "private, no-cache" if private else "no-cache",
+    }
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(
+        content=entry.body,
+        media_type="application/json",
+        headers={**entry.headers, **headers},
+    )
+
+
+class NewsJSONResponse(ORJSONResponse):
+    """orjson response writing naive datetimes as utc, like json_body"""
+
+    def render(self, content):
+        return json_body(content)
+
+
+def json_body(data):
+    # rows are plain dicts of str, int, bool and datetime, orjson needs no
+    # encoder pass; stored datetimes are utc
+    return orjson.dumps(data, option=orjson.OPT_NAIVE_UTC)
 
-import os
-from openai import OpenAI
 
 
 # def generate_summary(content):
@@ -121,29 +333,208 @@ from openai import OpenAI
 #     return completion.choices[0].message.content
 
 
-from urllib.parse import quote
+RELEVANCE_PROMPT = "你是一個關聯度評估機器人，請評估新聞標題是否與「民生用品的價格變化」相關，並給予'high'、'medium'、'low'評價。(僅需回答'high'、'medium'、'low'三個詞之一)"
+SUMMARY_PROMPT = "你是一個新聞摘要生成機器人，請統整新聞中提及的影響及主要原因 (影響、原因各50個字，請以json格式回答 {'影響': '...', '原因': '...'})"
+BATCH_RELEVANCE_PROMPT = "你是一個關聯度評估機器人，請逐一評估新聞標題是否與「民生用品的價格變化」相關，並給予'high'、'medium'、'low'評價。用戶會輸入JSON陣列 [{\"id\": 編號, \"title\": 標題}, ...]，請以JSON格式回答 {\"results\": [{\"id\": 編號, \"relevance\": \"high\"|\"medium\"|\"low\"}, ...]}，每個編號都必須回答。"
+KEYWORDS_PROMPT = "你是一個關鍵字提取機器人，用戶將會輸入一段文字，表示其希望看見的新聞內容，請提取出用戶希望看見的關鍵字，請截取最重要的關鍵字即可，避免出現「新聞」、「資訊」等混淆搜尋引擎的字詞。(僅須回答關鍵字，若有多個關鍵字，請以空格分隔)"
+
+LLM_MODEL = "gpt-3.5-turbo"
+LLM_CACHE_TTL = timedelta(days=7)
+LLM_CACHE_MAX_ENTRIES = 20000
+
+# columns a fresh completion overwrites, the key identifies it
+LLM_CACHE_COLUMNS = ("model", "response", "created_at", "last_used_at")
+
+# in-process hit/miss counters per purpose, e.g. llm_cache_stats["summary", "hit"]
+llm_cache_stats = Counter()
+
+
+def llm_cache_key(model, system_prompt, content):
+    raw = json.dumps([model, system_prompt, content], ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def cached_chat_completion(
+        db, system_prompt, content, purpose, model=LLM_MODEL, json_mode=False
+):
+    """
+    chat completion through the persistent llm cache
+
+    :param db:
+    :param system_prompt:
+    :param content: user message
+    :param purpose: label of the hit/miss counters
+    :param model:
+    :param json_mode: ask the model for a json object
+    :return: message content of the completion
+    """
+    key = llm_cache_key(model, system_prompt, content)
+    now = datetime.utcnow()
+    entry = db.get(LlmCacheEntry, key)
+    if entry is not None and entry.created_at > now - LLM_CACHE_TTL:
+        llm_cache_stats[purpose, "hit"] += 1
+        entry.last_used_at = now
+        db.commit()
+        return entry.response
+    llm_cache_stats[purpose, "miss"] += 1
+    m = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"{content}"},
+    ]
+    options = {"response_format": {"type": "json_object"}} if json_mode else {}
+    with LLM_REQUEST_SECONDS.time(purpose=purpose, model=model):
+        completion = openai_client().chat.completions.create(
+            model=model,
+            messages=m,
+            **options,
+        )
+    result = completion.choices[0].message.content
+    if result:
+        # a concurrent miss of the same key may have stored it meanwhile
+        upsert = UPSERT_INSERTS[db.get_bind().dialect.name](LlmCacheEntry.__table__)
+        upsert = upsert.values(
+            key=key, model=model, response=result, created_at=now, last_used_at=now
+        )
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=[LlmCacheEntry.key],
+            set_={c: upsert.excluded[c] for c in LLM_CACHE_COLUMNS},
+        ))
+        evict_llm_cache(db)
+        db.commit()
+    return result
+
+
+def parse_summary(result):
+    """
+    :param result: completion of SUMMARY_PROMPT
+    :return: (summary, reason)
+    :raise ValueError: not json; KeyError, TypeError: not the asked shape
+    """
+    result = json.loads(result)
+    return result["影響"], result["原因"]
+
+
+def forget_chat_completion(db, system_prompt, content, model=LLM_MODEL):
+    """drop a cached completion, e.g. one that turned out to be malformed"""
+    db.query(LlmCacheEntry).filter(
+        LlmCacheEntry.key == llm_cache_key(model, system_prompt, content)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def evict_llm_cache(db):
+    """drop expired entries and the least recently used ones over the size limit"""
+    db.query(LlmCacheEntry).filter(
+        LlmCacheEntry.created_at <= datetime.utcnow() - LLM_CACHE_TTL
+    ).delete(synchronize_session=False)
+    overflow = (
+        select(LlmCacheEntry.key)
+        .order_by(LlmCacheEntry.last_used_at.desc())
+        .offset(LLM_CACHE_MAX_ENTRIES)
+    )
+    db.execute(delete(LlmCacheEntry).where(LlmCacheEntry.key.in_(overflow)))
+
+
+from urllib.parse import urlsplit
 import requests
-from bs4 import BeautifulSoup
 from sqlalchemy.orm import Session
 
+from article_extractor import extract_article
+from crawler import INITIAL_PAGES, UDN_MORE_URL, Crawler, run_sync
+
+
+IngestResult = namedtuple("IngestResult", ["inserted", "updated", "skipped"])
+
+# columns an article crawled again may change, the url identifies it
+NEWS_INGEST_COLUMNS = ("title", "time", "published_at", "content", "summary", "reason")
+
+# insert statements with ON CONFLICT support, per dialect
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def news_article_row(news_data):
+    return {
+        # the form filter_unseen_news looks up, a listing may add ?from=...
+        "url": normalize_news_url(news_data["url"]),
+        "title": news_data["title"],
+        "time": news_data["time"],
+        # None when unreadable, see add_news_batch
+        "published_at": parse_news_time(news_data["time"]),
+        "content": " ".join(news_data["content"]),  # 將內容list轉換為字串
+        "summary": news_data["summary"],
+        "reason": news_data["reason"],
+    }
+
+
+def add_news_batch(db, news_list):
+    """
+    upsert the articles of a crawl run with one INSERT ... ON CONFLICT(url)
+    DO UPDATE and index them for search. the caller commits, so a whole run
+    is one transaction.
+
+    :param db:
+    :param news_list: parsed articles with summary and reason
+    :return: IngestResult; unchanged articles and repeated urls are skipped
+    """
+    rows, skipped = {}, 0
+    for news_data in news_list:
+        row = news_article_row(news_data)
+        if row["url"] in rows:
+            skipped += 1
+            continue
+        rows[row["url"]] = row
+    if not rows:
+        return IngestResult(0, 0, skipped)
+    existing = {
+        stored.url: stored
+        for stored in db.query(
+            NewsArticle.url, *(getattr(NewsArticle, c) for c in NEWS_INGEST_COLUMNS)
+        ).filter(NewsArticle.url.in_(list(rows)))
+    }
+    changed, inserted, updated = [], 0, 0
+    for url, row in rows.items():
+        stored = existing.get(url)
+        if row["published_at"] is None:
+            # keep the first guess instead of moving the article every crawl
+            row["published_at"] = stored.published_at if stored else datetime.utcnow()
+        if stored is None:
+            inserted += 1
+        elif any(getattr(stored, c) != row[c] for c in NEWS_INGEST_COLUMNS):
+            updated += 1
+        else:
+            skipped += 1
+            continue
+        changed.append(row)
+    if changed:
+        upsert = UPSERT_INSERTS[db.get_bind().dialect.name](NewsArticle.__table__)
+        upsert = upsert.values(changed)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[NewsArticle.url],
+            set_={c: upsert.excluded[c] for c in NEWS_INGEST_COLUMNS},
+        ).returning(NewsArticle.id, NewsArticle.url)
+        for article_id, url in db.execute(upsert).all():
+            row = rows[url]
+            news_search.index_news_article(
+                db, article_id, row["title"], row["content"], row["summary"],
+                row["reason"],
+            )
+        bump_cache_version(db, NEWS_CACHE)
+    return IngestResult(inserted, updated, skipped)
+
 
 def add_new(news_data):
     """
     add new to db
     :param news_data: news info
-    :return:
+    :return: IngestResult
     """
-    session = Session()
-    session.add(NewsArticle(
-        url=news_data["url"],
-        title=news_data["title"],
-        time=news_data["time"],
-        content=" ".join(news_data["content"]),  # 將內容list轉換為字串
-        summary=news_data["summary"],
-        reason=news_data["reason"],
-    ))
-    session.commit()
-    session.close()
+    session = SessionLocal()
+    try:
+        result = add_news_batch(session, [news_data])
+        session.commit()
+        return result
+    finally:
+        session.close()
 
 
 def get_new_info(search_term, is_initial=False):
@@ -154,141 +545,496 @@ def get_new_info(search_term, is_initial=False):
     :param is_initial:
     :return:
     """
-    all_news_data = []
-    # iterate pages to get more news data, not actually get all news data
-    if is_initial:
-        a = []
-        for p in range(1, 10):
-            p2 = {
-                "page": p,
-                "id": f"search:{quote(search_term)}",
-                "channelId": 2,
-                "type": "searchword",
-            }
-            response = requests.get("https://udn.com/api/more", params=p2)
-            a.append(response.json()["lists"])
-
-        for l in a:
-            all_news_data.append(l)
-    else:
-        p = {
-            "page": 1,
-            "id": f"search:{quote(search_term)}",
-            "channelId": 2,
-            "type": "searchword",
-        }
-        response = requests.get("https://udn.com/api/more", params=p)
+    return run_sync(get_new_info_async(search_term, is_initial=is_initial))
 
-        all_news_data = response.json()["lists"]
-    return all_news_data
 
-def get_new(is_initial=False):
+async def get_new_info_async(search_term, is_initial=False, crawler=None):
     """
-    get new info
+    get new, fetching the listing pages concurrently
 
+    :param search_term:
     :param is_initial:
+    :param crawler: shared Crawler, a new one is opened when None
     :return:
     """
-    news_data = get_new_info("價格", is_initial=is_initial)
-    for news in news_data:
-        title = news["title"]
-        m = [
-            {
-                "role": "system",
-                "content": "你是一個關聯度評估機器人，請評估新聞標題是否與「民生用品的價格變化」相關，並給予'high'、'medium'、'low'評價。(僅需回答'high'、'medium'、'low'三個詞之一)",
-            },
-            {"role": "user", "content": f"{title}"},
-        ]
-        ai = OpenAI(api_key="xxx").chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=m,
+    # iterate pages to get more news data, not actually get all news data
+    pages = INITIAL_PAGES if is_initial else [1]
+    if crawler is None:
+        async with Crawler() as crawler:
+            return await crawler.fetch_news_lists(search_term, pages)
+    return await crawler.fetch_news_lists(search_term, pages)
+
+
+def parse_article(url, html):
+    """
+    extract title, time and paragraphs of an udn.com article page
+
+    :param url:
+    :param html:
+    :return: None if the page lacks the title, time or article content
+    """
+    article = extract_article(html)
+    if article is None or article["time"] is None or not article["content"]:
+        return None
+    return {"url": url, **article}
+
+
+def normalize_news_url(url):
+    return url.split("#", 1)[0].split("?", 1)[0].rstrip("/")
+
+
+def news_fingerprint(title):
+    return hashlib.sha256(" ".join(title.split()).encode()).hexdigest()
+
+
+def filter_unseen_news(db, news_items):
+    """
+    drop news items the crawler has already judged or stored
+
+    :param db:
+    :param news_items: items of the udn.com listing
+    :return: unseen items, without duplicates
+    """
+    urls = {normalize_news_url(n["titleLink"]) for n in news_items}
+    fingerprints = {news_fingerprint(n["title"]) for n in news_items}
+    seen_urls = {
+        row.url
+        for row in db.query(CrawledUrl.url).filter(CrawledUrl.url.in_(urls))
+    }
+    seen_urls.update(
+        row.url for row in db.query(NewsArticle.url).filter(NewsArticle.url.in_(urls))
+    )
+    seen_fingerprints = {
+        row.fingerprint
+        for row in db.query(CrawledUrl.fingerprint).filter(
+            CrawledUrl.fingerprint.in_(fingerprints)
         )
-        relevance = ai.choices[0].message.content
-        if relevance == "high":
-            response = requests.get(news["titleLink"])
-            soup = BeautifulSoup(response.text, "html.parser")
-            # 標題
-            title = soup.find("h1", class_="article-content__title").text
-            time = soup.find("time", class_="article-content__time").text
-            # 定位到包含文章内容的 <section>
-            content_section = soup.find("section", class_="article-content__editor")
-
-            paragraphs = [
-                p.text
-                for p in content_section.find_all("p")
-                if p.text.strip() != "" and "▪" not in p.text
-            ]
-            detailed_news =  {
-                "url": news["titleLink"],
-                "title": title,
-                "time": time,
-                "content": paragraphs,
-            }
-            m = [
-                {
-                    "role": "system",
-                    "content": "你是一個新聞摘要生成機器人，請統整新聞中提及的影響及主要原因 (影響、原因各50個字，請以json格式回答 {'影響': '...', '原因': '...'})",
-                },
-                {"role": "user", "content": " ".join(detailed_news["content"])},
-            ]
-
-            completion = OpenAI(api_key="xxx").chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=m,
+    }
+    unseen = []
+    for news in news_items:
+        url = normalize_news_url(news["titleLink"])
+        fingerprint = news_fingerprint(news["title"])
+        if url in seen_urls or fingerprint in seen_fingerprints:
+            continue
+        seen_urls.add(url)
+        seen_fingerprints.add(fingerprint)
+        unseen.append(news)
+    return unseen
+
+
+def mark_news_seen(db, news, relevance, commit=True):
+    db.merge(CrawledUrl(
+        url=normalize_news_url(news["titleLink"]),
+        fingerprint=news_fingerprint(news["title"]),
+        relevance=relevance,
+        seen_at=datetime.utcnow(),
+    ))
+    if commit:
+        db.commit()
+
+
+async def fetch_new_news_incrementally(db, crawler, search_term):
+    """
+    walk the listing page by page with conditional requests, stopping at
+    the first page that is unchanged or contains an already seen item
+
+    :param db:
+    :param crawler:
+    :param search_term:
+    :return: (unseen news items, new HttpValidator of each page fetched);
+        the validators are left for the caller to merge with the stored
+        items, a page must not count as unchanged before its items are
+    """
+    fresh, validators = [], []
+    for page in INITIAL_PAGES:
+        key = f"{UDN_MORE_URL}?search={search_term}&page={page}"
+        validator = db.get(HttpValidator, key) or HttpValidator(key=key)
+        news_items, etag, last_modified = await crawler.fetch_news_list_if_modified(
+            search_term, page, validator.etag, validator.last_modified
+        )
+        if news_items is None:
+            break
+        validators.append(HttpValidator(key=key, etag=etag, last_modified=last_modified))
+        unseen = filter_unseen_news(db, news_items)
+        fresh.extend(unseen)
+        if not news_items or len(unseen) < len(news_items):
+            break
+    return fresh, validators
+
+
+async def crawl_relevant_news(db, is_initial=False, search_term="價格"):
+    """
+    fetch the unseen listing items, keep the highly relevant titles and
+    fetch their article pages, all through one shared crawler. items
+    judged not relevant are recorded as seen right away.
+
+    :param db:
+    :param is_initial: fetch every listing page at once instead of
+        stopping at known items
+    :param search_term: udn.com search of the listing
+    :return: ([(news item, article html or exception)], HttpValidators of
+        the listing pages to merge once the items are stored)
+    """
+    async with Crawler() as crawler:
+        if is_initial:
+            news_data = filter_unseen_news(
+                db, await get_new_info_async(search_term, True, crawler)
+            )
+            validators = []
+        else:
+            news_data, validators = await fetch_new_news_incrementally(
+                db, crawler, search_term
             )
-            result = completion.choices[0].message.content
-            result = json.loads(result)
-            detailed_news["summary"] = result["影響"]
-            detailed_news["reason"] = result["原因"]
-            add_new(detailed_news)
+        CRAWL_ITEMS.inc(len(news_data), stage="unseen")
+        relevant = []
+        relevances = evaluate_relevance_batch(db, [n["title"] for n in news_data])
+        for news, relevance in zip(news_data, relevances):
+            if relevance == "high":
+                relevant.append(news)
+            else:
+                mark_news_seen(db, news, relevance, commit=False)
+        db.commit()
+        CRAWL_ITEMS.inc(len(relevant), stage="relevant")
+        pages = await crawler.fetch_pages([news["titleLink"] for news in relevant])
+    return list(zip(relevant, pages)), validators
 
 
-@app.on_event("startup")
-def start_scheduler():
+def evaluate_relevance(db, title):
+    return cached_chat_completion(db, RELEVANCE_PROMPT, title, "relevance")
+
+
+RELEVANCE_LEVELS = ("high", "medium", "low")
+RELEVANCE_BATCH_TOKEN_BUDGET = 1500
+RELEVANCE_BATCH_MAX_ITEMS = 40
+
+
+def estimate_tokens(text):
+    """
+    rough upper bound of the token count, cjk characters take about one
+    token each and other text about one per four characters
+    """
+    cjk = sum(1 for c in text if ord(c) > 0x2E80)
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def chunk_by_token_budget(titles, budget, max_items):
+    """
+    split title positions into chunks whose titles fit in the budget
+
+    :param titles:
+    :param budget: estimated tokens per chunk
+    :param max_items: titles per chunk
+    :return: list of lists of positions in titles
+    """
+    chunks = []
+    chunk, used = [], 0
+    for i, title in enumerate(titles):
+        # id, quotes and json punctuation around each title
+        cost = estimate_tokens(title) + 8
+        if chunk and (used + cost > budget or len(chunk) >= max_items):
+            chunks.append(chunk)
+            chunk, used = [], 0
+        chunk.append(i)
+        used += cost
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def parse_batch_relevance(answer):
+    """
+    read the json answer of BATCH_RELEVANCE_PROMPT
+
+    :param answer:
+    :return: {id: relevance}
+    """
+    results = json.loads(answer)["results"]
+    parsed = {}
+    for item in results:
+        relevance = str(item["relevance"]).strip().strip("'\"").lower()
+        if relevance in RELEVANCE_LEVELS:
+            parsed[int(item["id"])] = relevance
+    return parsed
+
+
+def evaluate_relevance_batch(db, titles):
+    """
+    judge many titles with one completion per chunk, falling back to one
+    call per title for titles missing from an unreadable answer
+
+    :param db:
+    :param titles:
+    :return: relevance of each title, in order
+    """
+    relevances = [None] * len(titles)
+    chunks = chunk_by_token_budget(
+        titles, RELEVANCE_BATCH_TOKEN_BUDGET, RELEVANCE_BATCH_MAX_ITEMS
+    )
+    for chunk in chunks:
+        payload = json.dumps(
+            [{"id": i, "title": titles[i]} for i in chunk], ensure_ascii=False
+        )
+        answer = cached_chat_completion(
+            db, BATCH_RELEVANCE_PROMPT, payload, "relevance_batch", json_mode=True
+        )
+        try:
+            parsed = parse_batch_relevance(answer or "")
+        except (ValueError, KeyError, TypeError) as e:
+            print(e)
+            parsed = {}
+        if any(i not in parsed for i in chunk):
+            forget_chat_completion(db, BATCH_RELEVANCE_PROMPT, payload)
+        for i in chunk:
+            relevances[i] = parsed.get(i) or evaluate_relevance(db, titles[i])
+    return relevances
+
+
+def get_new(is_initial=False, search_term="價格"):
+    """
+    get new info, run by crawl_worker
+
+    :param is_initial:
+    :param search_term: udn.com search of the listing
+    :return: IngestResult of the run
+    """
     db = SessionLocal()
-    if db.query(NewsArticle).count() == 0:
-        # should change into simple factory pattern
-        get_new()
-    db.close()
-    bgs.add_job(get_new, "interval", minutes=100)
-    bgs.start()
+    try:
+        accepted, complete = [], True
+        results, validators = run_sync(crawl_relevant_news(db, is_initial, search_term))
+        for news, html in results:
+            if isinstance(html, Exception):
+                print(html)
+                complete = False
+                continue
+            CRAWL_ITEMS.inc(stage="fetched")
+            detailed_news = parse_article(news["titleLink"], html)
+            if detailed_news is None:
+                print(f"no article content in {news['titleLink']}")
+                complete = False
+                continue
+            CRAWL_ITEMS.inc(stage="parsed")
+            content = " ".join(detailed_news["content"])
+            result = cached_chat_completion(db, SUMMARY_PROMPT, content, "summary")
+            try:
+                detailed_news["summary"], detailed_news["reason"] = parse_summary(result)
+            except (ValueError, KeyError, TypeError) as e:
+                # one malformed summary skips its article, not the run
+                print(f"no summary of {news['titleLink']}: {e!r}")
+                forget_chat_completion(db, SUMMARY_PROMPT, content)
+                complete = False
+                continue
+            accepted.append((news, detailed_news))
+        CRAWL_ITEMS.inc(len(accepted), stage="summarized")
+        # the whole run is stored in one transaction
+        stored = add_news_batch(db, [detailed_news for _, detailed_news in accepted])
+        for news, _ in accepted:
+            mark_news_seen(db, news, "high", commit=False)
+        # with an item left out, the listing is fetched in full next run
+        # instead of answering 304 and hiding it
+        if complete:
+            for validator in validators:
+                db.merge(validator)
+        db.commit()
+        CRAWL_ITEMS.inc(stored.inserted + stored.updated, stage="stored")
+        print(f"stored news: {stored}")
+        return stored
+    finally:
+        db.close()
+
+
+# kinds of crawl jobs, lower priority is claimed first
+CRAWL_JOB_PRIORITY = {"latest": 0, "prices": 0, "search": 1, "backfill": 2}
 
 
-@app.on_event("shutdown")
-def shutdown_scheduler():
-    bgs.shutdown()
+def enqueue_crawl_job(db, kind, payload=None):
+    """
+    queue a job for crawl_worker, unless the same one is already pending
+
+    :param db:
+    :param kind: one of CRAWL_JOB_PRIORITY
+    :param payload: json arguments of the job
+    :return: id of the pending job
+    """
+    payload = json.dumps(payload or {}, ensure_ascii=False, sort_keys=True)
+    pending = db.query(CrawlJob.id).filter(
+        CrawlJob.kind == kind, CrawlJob.payload == payload, CrawlJob.status == "pending"
+    ).first()
+    if pending is not None:
+        return pending.id
+    job = CrawlJob(
+        kind=kind,
+        payload=payload,
+        priority=CRAWL_JOB_PRIORITY[kind],
+        status="pending",
+        attempts=0,
+        created_at=datetime.utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    return job.id
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt is loaded on the first hash, not on import
+pwd_context = LazyCryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt runs here, off the event loop and off the request threadpool
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 0)) or None
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", 64))
+password_hasher = PasswordHasher(
+    pwd_context, max_workers=PASSWORD_HASH_WORKERS, max_queue=PASSWORD_HASH_MAX_QUEUE
+)
+
+
+def password_hash_calls():
+    """:return: {(state,): calls} of the hashing pool, for /metrics"""
+    stats = password_hasher.stats()
+    return {
+        ("queued",): stats["queued"],
+        ("active",): stats["running"],
+        ("rejected",): stats["rejected"],
+    }
+
+
+REGISTRY.callback(
+    "password_hash_calls", "gauge",
+    "calls of the password hashing pool waiting, running and rejected since start",
+    ("state",), password_hash_calls,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/users/login")
 
 
 def session_opener():
-    session = Session(bind=engine)
+    session = SessionLocal()
     try:
         yield session
     finally:
         session.close()
 
 
+async def async_session_opener():
+    """AsyncSession for async routes, so queries do not block the event loop"""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
 
-def verify(p1, p2):
-    return pwd_context.verify(p1, p2)
+def password_hasher_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts, try again later",
+        headers={"Retry-After": "1"},
+    )
 
 
-def check_user_password_is_correct(db, n, pwd):
-    OuO = db.query(User).filter(User.username == n).first()
-    if not verify(pwd, OuO.hashed_password):
+async def verify(p1, p2):
+    try:
+        return await password_hasher.verify(p1, p2)
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
+
+
+async def check_user_password_is_correct(db, n, pwd):
+    OuO = (await db.execute(select(User).where(User.username == n))).scalars().first()
+    # hand the connection back to the pool while waiting for bcrypt,
+    # a login burst would otherwise hold every pooled connection
+    if OuO is not None:
+        db.expunge(OuO)
+    await db.rollback()
+    if OuO is None or not await verify(pwd, OuO.hashed_password):
         return False
     return OuO
 
 
+AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", 300))
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_CACHE_MAX_ENTRIES", 4096))
+auth_cache = AuthCache(ttl=AUTH_CACHE_TTL, max_entries=AUTH_CACHE_MAX_ENTRIES)
+
+
+def cache_lookups():
+    """:return: {(cache, "hit" or "miss"): lookups} of the in-process caches"""
+    lookups = {
+        ("response", "hit"): response_cache.hits,
+        ("response", "miss"): response_cache.misses,
+        ("auth", "hit"): auth_cache.hits,
+        ("auth", "miss"): auth_cache.misses,
+    }
+    for (purpose, result), count in list(llm_cache_stats.items()):
+        lookups[f"llm_{purpose}", result] = count
+    return lookups
+
+
+def cache_hit_ratios():
+    lookups = cache_lookups()
+    ratios = {}
+    for cache in {cache for cache, _ in lookups}:
+        hits = lookups.get((cache, "hit"), 0)
+        total = hits + lookups.get((cache, "miss"), 0)
+        ratios[cache,] = hits / total if total else 0.0
+    return ratios
+
+
+REGISTRY.callback(
+    "cache_lookups", "counter", "lookups of an in-process cache",
+    ("cache", "result"), cache_lookups,
+)
+REGISTRY.callback(
+    "cache_hit_ratio", "gauge", "share of lookups answered by an in-process cache",
+    ("cache",), cache_hit_ratios,
+)
+
+
+def invalidate_cached_user(mapper, connection, target):
+    history = inspect(target).attrs.username.history
+    for username in [target.username, *(history.deleted or ())]:
+        auth_cache.invalidate_user(username=username, user_id=target.id)
+
+
+for user_event in ("after_insert", "after_update", "after_delete"):
+    event.listen(User, user_event, invalidate_cached_user)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def invalidate_cached_users_on_bulk_write(orm_execute_state):
+    # query(User).delete() and update(User) skip the mapper events
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+        mapper.class_ is User for mapper in orm_execute_state.all_mappers
+    ):
+        auth_cache.clear()
+
+
 def authenticate_user_token(
     token = Depends(oauth2_scheme),
     db = Depends(session_opener)
 ):
-    payload = jwt.decode(token, '1892dhianiandowqd0n', algorithms=["HS256"])
-    return db.query(User).filter(User.username == payload.get("sub")).first()
+    """
+    resolve the bearer token to the user it was issued to, a token seen
+    before is answered from auth_cache without decoding or a query
+
+    :return: AuthenticatedUser
+    :raise HTTPException: 401 for an invalid token or a user that no
+        longer exists
+    """
+    user = auth_cache.get_token(token)
+    if user is not None:
+        return user
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, '1892dhianiandowqd0n', algorithms=["HS256"])
+    except JWTError:
+        raise credentials_exception
+    username = payload.get("sub")
+    user = auth_cache.get_user(username)
+    if user is None:
+        row = db.query(User.id, User.username).filter(User.username == username).first()
+        if row is None:
+            raise credentials_exception
+        user = AuthenticatedUser(row.id, row.username)
+        auth_cache.put_user(user)
+    auth_cache.put_token(token, user, payload.get("exp"))
+    return user
 
 
 def create_access_token(data, expires_delta=None):
@@ -306,10 +1052,17 @@ def create_access_token(data, expires_delta=None):
 
 @app.post("/api/v1/users/login")
 async def login_for_access_token(
-        form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(session_opener)
+        form_data: OAuth2PasswordRequestForm = Depends(),
+        db: AsyncSession = Depends(async_session_opener),
 ):
     """login"""
-    user = check_user_password_is_correct(db, form_data.username, form_data.password)
+    user = await check_user_password_is_correct(db, form_data.username, form_data.password)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     access_token = create_access_token(
         data={"sub": str(user.username)}, expires_delta=timedelta(minutes=30)
     )
@@ -321,7 +1074,10 @@ class UserAuthSchema(BaseModel):
 @app.post("/api/v1/users/register")
 def create_user(user: UserAuthSchema, db: Session = Depends(session_opener)):
     """create user"""
-    hashed_password = pwd_context.hash(user.password)
+    try:
+        hashed_password = password_hasher.hash_blocking(user.password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
     db_user = User(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
@@ -337,149 +1093,441 @@ def read_users_me(user=Depends(authenticate_user_token)):
 _id_counter = itertools.count(start=1000000)
 
 
+def get_upvoted_article_ids(article_ids, uid, db):
+    """
+    :param article_ids:
+    :param uid: current user id, or None for anonymous
+    :param db:
+    :return: set of the article ids uid has upvoted
+    """
+    if not uid or not article_ids:
+        return set()
+    return {
+        row.news_articles_id
+        for row in db.query(user_news_association_table.c.news_articles_id)
+        .filter(
+            user_news_association_table.c.user_id == uid,
+            user_news_association_table.c.news_articles_id.in_(article_ids),
+        )
+        .all()
+    }
+
+
+def get_articles_upvote_details(article_ids, uid, db):
+    """
+    get upvote count and upvote status of many articles at once
+
+    :param article_ids: ids of the articles
+    :param uid: current user id, or None for anonymous
+    :param db:
+    :return: {article_id: (upvote count, is upvoted by uid)}
+    """
+    article_ids = list(article_ids)
+    if not article_ids:
+        return {}
+    counts = dict(
+        db.query(NewsArticle.id, NewsArticle.upvote_count)
+        .filter(NewsArticle.id.in_(article_ids))
+        .all()
+    )
+    voted = get_upvoted_article_ids(article_ids, uid, db)
+    return {
+        article_id: (counts.get(article_id, 0), article_id in voted)
+        for article_id in article_ids
+    }
+
+
 def get_article_upvote_details(article_id, uid, db):
-    cnt = (
-        db.query(user_news_association_table)
-        .filter_by(news_articles_id=article_id)
-        .count()
+    return get_articles_upvote_details([article_id], uid, db)[article_id]
+
+
+NEWS_PAGE_DEFAULT_LIMIT = 50
+NEWS_PAGE_MAX_LIMIT = 200
+
+NEWS_LIST_COLUMNS = (
+    NewsArticle.id,
+    NewsArticle.url,
+    NewsArticle.title,
+    NewsArticle.time,
+    NewsArticle.published_at,
+    NewsArticle.summary,
+    NewsArticle.reason,
+)
+
+
+class NewsListItem(BaseModel):
+    """one article of the news listing, documents the json built by read_news_page"""
+    id: int
+    url: str
+    title: str
+    time: str
+    published_at: datetime
+    summary: str
+    reason: str
+    upvotes: int
+    is_upvoted: bool
+    # only with include_content
+    content: Optional[str] = None
+
+
+def encode_news_cursor(published_at, article_id):
+    raw = json.dumps([published_at.isoformat(), article_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_news_cursor(cursor):
+    try:
+        published_at, article_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(published_at), int(article_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def naive_utc(value):
+    """datetime from a query parameter as naive utc, naive input is utc already"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def query_news_page(db, limit, cursor=None, include_content=False, since=None, until=None):
+    """
+    read one page of news ordered by (published_at, id) descending
+
+    :param db:
+    :param limit: max number of articles in the page
+    :param cursor: cursor returned with the previous page
+    :param include_content: whether to load the content column
+    :param since: only articles published at or after, naive utc
+    :param until: only articles published before, naive utc
+    :return: (rows as dicts, cursor of the next page or None)
+    """
+    columns = [*NEWS_LIST_COLUMNS, NewsArticle.upvote_count]
+    if include_content:
+        columns.append(NewsArticle.content)
+    query = db.query(*columns).order_by(
+        NewsArticle.published_at.desc(), NewsArticle.id.desc()
     )
-    voted = False
-    if uid:
-        voted = (
-                db.query(user_news_association_table)
-                .filter_by(news_articles_id=article_id, user_id=uid)
-                .first()
-                is not None
+    if since is not None:
+        query = query.filter(NewsArticle.published_at >= since)
+    if until is not None:
+        query = query.filter(NewsArticle.published_at < until)
+    if cursor:
+        published_at, article_id = decode_news_cursor(cursor)
+        query = query.filter(
+            tuple_(NewsArticle.published_at, NewsArticle.id)
+            < tuple_(published_at, article_id)
         )
-    return cnt, voted
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_news_cursor(rows[-1].published_at, rows[-1].id)
+    return [row._asdict() for row in rows], next_cursor
 
 
-@app.get("/api/v1/news/news")
-def read_news(db=Depends(session_opener)):
+def read_news_page(db, uid, limit, cursor, include_content, since=None, until=None):
+    """
+    :return: (json body, headers) of one page of the listing
     """
-    read new
+    news, next_cursor = query_news_page(
+        db, limit, cursor, include_content, naive_utc(since), naive_utc(until)
+    )
+    voted = get_upvoted_article_ids([n["id"] for n in news], uid, db)
+    result = []
+    for n in news:
+        upvotes = n.pop("upvote_count")
+        result.append({**n, "upvotes": upvotes, "is_upvoted": n["id"] in voted})
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return json_body(result), headers
 
+
+@app.get("/api/v1/news/news", response_model=List[NewsListItem])
+def read_news(
+        request: Request,
+        db=Depends(session_opener),
+        limit: int = Query(NEWS_PAGE_DEFAULT_LIMIT, ge=1, le=NEWS_PAGE_MAX_LIMIT),
+        cursor: Optional[str] = Query(None),
+        include_content: bool = Query(False),
+        since: Optional[datetime] = Query(None),
+        until: Optional[datetime] = Query(None),
+):
+    """
+    read new, answering 304 to a matching If-None-Match
+
+    :param request:
     :param db:
+    :param limit: page size
+    :param cursor: value of X-Next-Cursor from the previous page
+    :param include_content: include the full article content
+    :param since: only news published at or after, utc unless an offset is given
+    :param until: only news published before, utc unless an offset is given
     :return:
     """
-    news = db.query(NewsArticle).order_by(NewsArticle.time.desc()).all()
-    result = []
-    for n in news:
-        upvotes, upvoted = get_article_upvote_details(n.id, None, db)
-        result.append(
-            {**n.__dict__, "upvotes": upvotes, "is_upvoted": upvoted}
-        )
-    return result
+    return cached_json_response(
+        request, db, NEWS_CACHE,
+        lambda: read_news_page(db, None, limit, cursor, include_content, since, until),
+    )
 
 
-@app.get(
-    "/api/v1/news/user_news"
-)
+@app.get("/api/v1/news/user_news", response_model=List[NewsListItem])
 def read_user_news(
+        request: Request,
         db=Depends(session_opener),
-        u=Depends(authenticate_user_token)
+        u=Depends(authenticate_user_token),
+        limit: int = Query(NEWS_PAGE_DEFAULT_LIMIT, ge=1, le=NEWS_PAGE_MAX_LIMIT),
+        cursor: Optional[str] = Query(None),
+        include_content: bool = Query(False),
+        since: Optional[datetime] = Query(None),
+        until: Optional[datetime] = Query(None),
 ):
     """
-    read user new
+    read user new, answering 304 to a matching If-None-Match
 
+    :param request:
     :param db:
     :param u:
+    :param limit: page size
+    :param cursor: value of X-Next-Cursor from the previous page
+    :param include_content: include the full article content
+    :param since: only news published at or after, utc unless an offset is given
+    :param until: only news published before, utc unless an offset is given
     :return:
     """
-    news = db.query(NewsArticle).order_by(NewsArticle.time.desc()).all()
-    result = []
-    for article in news:
-        upvotes, upvoted = get_article_upvote_details(article.id, u.id, db)
-        result.append(
-            {
-                **article.__dict__,
-                "upvotes": upvotes,
-                "is_upvoted": upvoted,
-            }
-        )
-    return result
+    return cached_json_response(
+        request, db, NEWS_CACHE,
+        lambda: read_news_page(db, u.id, limit, cursor, include_content, since, until),
+        key=u.id, private=True,
+    )
 
 class PromptRequest(BaseModel):
     prompt: str
 
-@app.post("/api/v1/news/search_news")
-async def search_news(request: PromptRequest):
-    prompt = request.prompt
-    news_list = []
-    m = [
-        {
-            "role": "system",
-            "content": "你是一個關鍵字提取機器人，用戶將會輸入一段文字，表示其希望看見的新聞內容，請提取出用戶希望看見的關鍵字，請截取最重要的關鍵字即可，避免出現「新聞」、「資訊」等混淆搜尋引擎的字詞。(僅須回答關鍵字，若有多個關鍵字，請以空格分隔)",
-        },
-        {"role": "user", "content": f"{prompt}"},
-    ]
+# seconds a search may take, articles not parsed by then are left out
+SEARCH_NEWS_DEADLINE = 8.0
+# stored articles needed to answer a search without crawling udn.com
+SEARCH_LOCAL_MIN_RESULTS = 5
 
-    completion = OpenAI(api_key="xxx").chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=m,
+
+async def fetch_article(crawler, url):
+    """
+    fetch an article page and parse it on a worker thread
+
+    :param crawler:
+    :param url:
+    :return: parsed article or None
+    """
+    response = await crawler.get(url)
+    return await asyncio.to_thread(parse_article, url, response.text)
+
+
+async def extract_search_keywords(db, prompt):
+    """:return: space separated keywords, "" when the model gave none"""
+    keywords = await asyncio.to_thread(
+        cached_chat_completion, db, KEYWORDS_PROMPT, prompt, "keywords"
     )
-    keywords = completion.choices[0].message.content
-    # should change into simple factory pattern
-    news_items = get_new_info(keywords, is_initial=False)
-    for news in news_items:
+    return (keywords or "").strip()
+
+
+async def iter_search_results(keywords, deadline):
+    """
+    search udn.com and yield each article as soon as it is fetched and
+    parsed, until the deadline
+
+    :param keywords:
+    :param deadline: event loop time to stop at
+    :return: async iterator of articles, in completion order
+    """
+    loop = asyncio.get_running_loop()
+    async with Crawler() as crawler:
         try:
-            response = requests.get(news["titleLink"])
-            soup = BeautifulSoup(response.text, "html.parser")
-            # 標題
-            title = soup.find("h1", class_="article-content__title").text
-            time = soup.find("time", class_="article-content__time").text
-            # 定位到包含文章内容的 <section>
-            content_section = soup.find("section", class_="article-content__editor")
-
-            paragraphs = [
-                p.text
-                for p in content_section.find_all("p")
-                if p.text.strip() != "" and "▪" not in p.text
-            ]
-            detailed_news = {
-                "url": news["titleLink"],
-                "title": title,
-                "time": time,
-                "content": paragraphs,
-            }
-            detailed_news["content"] = " ".join(detailed_news["content"])
-            detailed_news["id"] = next(_id_counter)
-            news_list.append(detailed_news)
-        except Exception as e:
-            print(e)
-    return sorted(news_list, key=lambda x: x["time"], reverse=True)
+            news_items = await asyncio.wait_for(
+                get_new_info_async(keywords, crawler=crawler),
+                timeout=max(deadline - loop.time(), 0),
+            )
+        except asyncio.TimeoutError:
+            print(f"search listing for {keywords!r} missed the deadline")
+            return
+        tasks = [
+            asyncio.create_task(fetch_article(crawler, news["titleLink"]))
+            for news in news_items
+        ]
+        try:
+            for next_done in asyncio.as_completed(
+                    tasks, timeout=max(deadline - loop.time(), 0)
+            ):
+                try:
+                    detailed_news = await next_done
+                except asyncio.TimeoutError:
+                    raise
+                except Exception as e:
+                    print(e)
+                    continue
+                if detailed_news is None:
+                    continue
+                detailed_news["content"] = " ".join(detailed_news["content"])
+                detailed_news["published_at"] = published_at_of(detailed_news["time"])
+                detailed_news["id"] = next(_id_counter)
+                yield detailed_news
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def queue_search_crawl(db, keywords):
+    """let crawl_worker store the relevant news of a search answered live"""
+    if keywords:
+        await asyncio.to_thread(enqueue_crawl_job, db, "search", {"keywords": keywords})
+
+
+def search_result_order(news_list):
+    return sorted(news_list, key=lambda x: x["published_at"], reverse=True)
+
+
+def search_stored_news(db, query, limit, include_content=True):
+    """
+    rank stored articles for the query with the full text index
+
+    :param db:
+    :param query: space separated search terms
+    :param limit:
+    :param include_content:
+    :return: articles, best match first
+    """
+    ranked = news_search.search_news_ids(db, query, limit)
+    if not ranked:
+        return []
+    columns = list(NEWS_LIST_COLUMNS)
+    if include_content:
+        columns.append(NewsArticle.content)
+    rows = {
+        row.id: row._asdict()
+        for row in db.query(*columns).filter(
+            NewsArticle.id.in_([article_id for article_id, _ in ranked])
+        )
+    }
+    return [
+        {**rows[article_id], "score": score}
+        for article_id, score in ranked
+        if article_id in rows
+    ]
+
+
+@app.get("/api/v1/news/search_local")
+def search_local_news(
+        q: str = Query(..., min_length=1),
+        limit: int = Query(20, ge=1, le=NEWS_PAGE_MAX_LIMIT),
+        include_content: bool = Query(False),
+        db=Depends(session_opener),
+):
+    """
+    search stored news, ranked with bm25
+
+    :param q: space separated search terms
+    :param limit:
+    :param include_content: include the full article content
+    :param db:
+    :return:
+    """
+    return NewsJSONResponse(search_stored_news(db, q, limit, include_content))
+
+
+@app.post("/api/v1/news/search_news")
+async def search_news(
+        request: PromptRequest,
+        db=Depends(session_opener),
+        async_db=Depends(async_session_opener),
+):
+    """
+    answer from stored news when enough of it matches, else search udn.com
+
+    :param request:
+    :param db: for the llm cache, used on a worker thread
+    :param async_db:
+    :return:
+    """
+    deadline = asyncio.get_running_loop().time() + SEARCH_NEWS_DEADLINE
+    keywords = await extract_search_keywords(db, request.prompt)
+    if not keywords:
+        return NewsJSONResponse([])
+    stored = await async_db.run_sync(
+        search_stored_news, keywords, NEWS_PAGE_DEFAULT_LIMIT
+    )
+    if len(stored) >= SEARCH_LOCAL_MIN_RESULTS:
+        return NewsJSONResponse(stored)
+    await queue_search_crawl(db, keywords)
+    news_list = [news async for news in iter_search_results(keywords, deadline)]
+    return NewsJSONResponse(search_result_order(news_list))
+
+
+@app.post("/api/v1/news/search_news/stream")
+async def search_news_stream(
+        request: PromptRequest,
+        db=Depends(session_opener),
+        async_db=Depends(async_session_opener),
+):
+    """
+    search_news as newline delimited json: one {"type": "article"} line per
+    article as soon as it is parsed, then a {"type": "done"} line with the
+    ids in display order. stored articles are sent at once when enough of
+    them match.
+    """
+    deadline = asyncio.get_running_loop().time() + SEARCH_NEWS_DEADLINE
+    keywords = await extract_search_keywords(db, request.prompt)
+    stored = []
+    if keywords:
+        stored = await async_db.run_sync(
+            search_stored_news, keywords, NEWS_PAGE_DEFAULT_LIMIT
+        )
+        if len(stored) < SEARCH_LOCAL_MIN_RESULTS:
+            await queue_search_crawl(db, keywords)
+
+    async def events():
+        if not keywords or len(stored) >= SEARCH_LOCAL_MIN_RESULTS:
+            for news in stored:
+                yield json_body({"type": "article", "article": news}) + b"\n"
+            yield json_body({"type": "done", "order": [n["id"] for n in stored]}) + b"\n"
+            return
+        news_list = []
+        async for news in iter_search_results(keywords, deadline):
+            news_list.append(news)
+            yield json_body({"type": "article", "article": news}) + b"\n"
+        order = [news["id"] for news in search_result_order(news_list)]
+        yield json_body({"type": "done", "order": order}) + b"\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 
 class NewsSumaryRequestSchema(BaseModel):
     content: str
 
 @app.post("/api/v1/news/news_summary")
 async def news_summary(
-        payload: NewsSumaryRequestSchema, u=Depends(authenticate_user_token)
+        payload: NewsSumaryRequestSchema,
+        u=Depends(authenticate_user_token),
+        db=Depends(session_opener),
 ):
     response = {}
-    m = [
-        {
-            "role": "system",
-            "content": "你是一個新聞摘要生成機器人，請統整新聞中提及的影響及主要原因 (影響、原因各50個字，請以json格式回答 {'影響': '...', '原因': '...'})",
-        },
-        {"role": "user", "content": f"{payload.content}"},
-    ]
-
-    completion = OpenAI(api_key="xxx").chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=m,
+    # the completion may call openai, keep it off the event loop
+    result = await asyncio.to_thread(
+        cached_chat_completion, db, SUMMARY_PROMPT, payload.content, "summary"
     )
-    result = completion.choices[0].message.content
     if result:
-        result = json.loads(result)
-        response["summary"] = result["影響"]
-        response["reason"] = result["原因"]
+        try:
+            response["summary"], response["reason"] = parse_summary(result)
+        except (ValueError, KeyError, TypeError) as e:
+            print(e)
+            # ask again next time instead of replaying it from the cache
+            await asyncio.to_thread(forget_chat_completion, db, SUMMARY_PROMPT, payload.content)
     return response
 
 
 @app.post("/api/v1/news/{id}/upvote")
 def upvote_article(
-        id,
+        id: int,
         db=Depends(session_opener),
         u=Depends(authenticate_user_token),
 ):
@@ -487,40 +1535,275 @@ def upvote_article(
     return {"message": message}
 
 
-def toggle_upvote(n_id, u_id, db):
-    existing_upvote = db.execute(
-        select(user_news_association_table).where(
-            user_news_association_table.c.news_articles_id == n_id,
-            user_news_association_table.c.user_id == u_id,
-        )
-    ).scalar()
+def toggle_upvote(n_id, u_id, db, retry=True):
+    """
+    add or remove the upvote of u_id and move upvote_count of the article
+    in the same transaction. the delete goes first, so its row count
+    decides the direction instead of a select that a concurrent click
+    could outdate.
 
-    if existing_upvote:
-        delete_stmt = delete(user_news_association_table).where(
-            user_news_association_table.c.news_articles_id == n_id,
-            user_news_association_table.c.user_id == u_id,
-        )
-        db.execute(delete_stmt)
-        db.commit()
-        return "Upvote removed"
+    :param n_id:
+    :param u_id:
+    :param db:
+    :param retry: toggle again when a concurrent click inserted the row first
+    :return: message
+    """
+    delete_stmt = delete(user_news_association_table).where(
+        user_news_association_table.c.news_articles_id == n_id,
+        user_news_association_table.c.user_id == u_id,
+    )
+    if db.execute(delete_stmt).rowcount:
+        delta, message = -1, "Upvote removed"
     else:
         insert_stmt = insert(user_news_association_table).values(
             news_articles_id=n_id, user_id=u_id
         )
-        db.execute(insert_stmt)
-        db.commit()
-        return "Article upvoted"
+        try:
+            db.execute(insert_stmt)
+        except IntegrityError:
+            db.rollback()
+            if not retry:
+                raise
+            return toggle_upvote(n_id, u_id, db, retry=False)
+        delta, message = 1, "Article upvoted"
+    db.execute(
+        update(NewsArticle)
+        .where(NewsArticle.id == n_id)
+        .values(upvote_count=NewsArticle.upvote_count + delta)
+    )
+    bump_cache_version(db, NEWS_CACHE)
+    db.commit()
+    return message
 
 
 def news_exists(id2, db: Session):
     return db.query(NewsArticle).filter_by(id=id2).first() is not None
 
 
+NECESSITIES_PRICE_URL = os.environ.get(
+    "NECESSITIES_PRICE_URL",
+    "https://opendata.ey.gov.tw/api/ConsumerProtection/NecessitiesPrice",
+)
+NECESSITIES_PRICE_REFRESH_HOURS = 6
+
+
+def fetch_necessities_prices():
+    """
+    download the whole necessities price dataset from opendata
+
+    :return: list of price records
+    """
+    started, status_code = time.perf_counter(), "error"
+    try:
+        response = http_session().get(NECESSITIES_PRICE_URL, timeout=30)
+        status_code = response.status_code
+    finally:
+        OUTBOUND_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            host=urlsplit(NECESSITIES_PRICE_URL).netloc, status=status_code,
+        )
+    response.raise_for_status()
+    return response.json()
+
+
+def refresh_necessities_prices(db):
+    """
+    replace the local price store with a fresh copy of the dataset,
+    keeping the old copy when the upstream is unavailable
+
+    :param db:
+    :return: number of stored records, or None if the fetch failed
+    """
+    try:
+        records = fetch_necessities_prices()
+    except (requests.RequestException, ValueError) as e:
+        print(e)
+        return None
+    fetched_at = datetime.utcnow()
+    db.query(NecessitiesPrice).delete()
+    db.add_all(
+        necessities_price_from_record(record, fetched_at) for record in records
+    )
+    bump_cache_version(db, PRICES_CACHE)
+    db.commit()
+    return len(records)
+
+
+def necessities_price_from_record(record, fetched_at):
+    series, series_start = None, None
+    try:
+        series = price_series.pack_series(
+            price_series.decode_series(record.get("統計值"))
+        )
+        series_start = price_series.month_index(record.get("時間起點"))
+    except (AttributeError, ValueError) as e:
+        print(e)
+        series, series_start = None, None
+    number = record.get("編號")
+    return NecessitiesPrice(
+        number=None if number is None else str(number),
+        category=record.get("類別", ""),
+        name=record.get("產品名稱", ""),
+        record=json.dumps(record, ensure_ascii=False),
+        series=series,
+        series_start=series_start,
+        fetched_at=fetched_at,
+    )
+
+
+def ensure_necessities_prices(db):
+    """fill an empty price store, answering 503 if that is not possible"""
+    if db.query(NecessitiesPrice.id).first() is None:
+        if refresh_necessities_prices(db) is None:
+            raise HTTPException(
+                status_code=503, detail="Necessities price data is unavailable"
+            )
+
+
 @app.get("/api/v1/prices/necessities-price")
 def get_necessities_prices(
-        category=Query(None), commodity=Query(None)
+        request: Request,
+        category=Query(None),
+        commodity=Query(None),
+        db=Depends(session_opener),
+):
+    ensure_necessities_prices(db)
+
+    def build():
+        query = db.query(NecessitiesPrice.record)
+        if category:
+            query = query.filter(NecessitiesPrice.category == category)
+        if commodity:
+            query = query.filter(NecessitiesPrice.name == commodity)
+        records = query.order_by(NecessitiesPrice.id).all()
+        # records are stored as json already, so join them instead of re-encoding
+        return ("[" + ",".join(r.record for r in records) + "]").encode(), {}
+
+    return cached_json_response(request, db, PRICES_CACHE, build)
+
+
+PRICE_TREND_COLUMNS = (
+    NecessitiesPrice.number,
+    NecessitiesPrice.category,
+    NecessitiesPrice.name,
+    NecessitiesPrice.series,
+    NecessitiesPrice.series_start,
+)
+
+
+def price_point(series_start, point, digits=4):
+    if point is None:
+        return None
+    index, value = point
+    return {
+        "month": price_series.month_label(series_start + index),
+        "value": round(value, digits),
+    }
+
+
+def summarize_price_trend(row, window):
+    """
+    latest value and aggregates of one product's series
+
+    :param row: row of PRICE_TREND_COLUMNS
+    :param window: rolling mean window in months
+    :return:
+    """
+    summary = {"number": row.number, "category": row.category, "name": row.name}
+    if row.series is None:
+        return summary
+    series = price_series.unpack_series(row.series)
+    extremes = price_series.min_max(series)
+    mom = price_series.month_over_month(series)
+    yoy = price_series.year_over_year(series)
+    means = price_series.rolling_mean(series, window)
+    summary.update({
+        "start": price_series.month_label(row.series_start),
+        "end": price_series.month_label(row.series_start + len(series) - 1),
+        "latest": price_point(row.series_start, price_series.last_present(series)),
+        "min": price_point(row.series_start, extremes and extremes[0]),
+        "max": price_point(row.series_start, extremes and extremes[1]),
+        "mom_change": price_point(row.series_start, price_series.last_present(mom)),
+        "yoy_change": price_point(row.series_start, price_series.last_present(yoy)),
+        "rolling_mean": price_point(row.series_start, price_series.last_present(means)),
+    })
+    return summary
+
+
+@app.get("/api/v1/prices/trends")
+def get_price_trends(
+        request: Request,
+        category=Query(None),
+        commodity=Query(None),
+        window: int = Query(3, ge=1, le=36),
+        db=Depends(session_opener),
 ):
-    return requests.get(
-        "https://opendata.ey.gov.tw/api/ConsumerProtection/NecessitiesPrice",
-        params={"CategoryName": category, "Name": commodity},
-    ).json()
+    """
+    latest trend figures of every product, or of the filtered ones. the
+    figures only change with a price refresh, so they are computed once
+    per PRICES_CACHE version and query.
+
+    :param request:
+    :param category:
+    :param commodity:
+    :param window: rolling mean window in months
+    :param db:
+    :return:
+    """
+    ensure_necessities_prices(db)
+
+    def build():
+        query = db.query(*PRICE_TREND_COLUMNS)
+        if category:
+            query = query.filter(NecessitiesPrice.category == category)
+        if commodity:
+            query = query.filter(NecessitiesPrice.name == commodity)
+        return json_body([
+            summarize_price_trend(row, window)
+            for row in query.order_by(NecessitiesPrice.id).all()
+        ]), {}
+
+    return cached_json_response(request, db, PRICES_CACHE, build)
+
+
+@app.get("/api/v1/prices/trends/{number}")
+def get_price_trend(
+        request: Request,
+        number,
+        window: int = Query(3, ge=1, le=36),
+        db=Depends(session_opener),
+):
+    """
+    full monthly series of one product with its aggregates
+
+    :param request:
+    :param number: 編號 of the product
+    :param window: rolling mean window in months
+    :param db:
+    :return:
+    """
+    ensure_necessities_prices(db)
+
+    def build():
+        row = (
+            db.query(*PRICE_TREND_COLUMNS)
+            .filter(NecessitiesPrice.number == number)
+            .first()
+        )
+        if row is None or row.series is None:
+            raise HTTPException(status_code=404, detail="Price series not found")
+        series = price_series.unpack_series(row.series)
+        # one entry per month from "start" to "end", None for missing months
+        return json_body({
+            **summarize_price_trend(row, window),
+            "series": {
+                "values": price_series.to_list(series),
+                "mom_change": price_series.to_list(price_series.month_over_month(series)),
+                "yoy_change": price_series.to_list(price_series.year_over_year(series)),
+                "rolling_mean": price_series.to_list(
+                    price_series.rolling_mean(series, window)
+                ),
+            },
+        }), {}
+
+    return cached_json_response(request, db, PRICES_CACHE, build)
@@ -0,0 +1,365 @@
+"""
+in-process counters and histograms served in the prometheus text format
+
+an observation is a perf_counter difference, a bisect over the buckets
+and a few dict updates under a lock, cheap enough to stay on for every
+request and query, unlike sampling profilers. each process keeps its own
+values: the api serves them at /metrics, and the crawl worker serves its
+own with the ones returned by its pool processes merged in (see
+crawl_worker.py).
+
+database queries are timed with engine events, for any engine; inside
+a request they are also added up per request, see track_queries.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+JOB_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        :param name:
+        :param documentation: HELP line of the metric
+        :param labelnames: names of the labels every observation gives
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        # label values -> value
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def _copy(self, value):
+        return value
+
+    def samples(self):
+        """:return: [(name suffix, ((label, value), ...), value)]"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        for key, value in sorted(self.snapshot().items()):
+            yield "_total", tuple(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        # first bucket whose upper bound is >= value, le is inclusive
+        index = bisect.bisect_left(self.buckets, value)
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [count per bucket and +Inf, sum]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return 0 if state is None else sum(state[0])
+
+    def _copy(self, value):
+        return [list(value[0]), value[1]]
+
+    def merge(self, values):
+        with self._lock:
+            for key, (counts, total) in values.items():
+                state = self._values.get(key)
+                if state is None:
+                    state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+
+    def samples(self):
+        for key, (counts, total) in sorted(self.snapshot().items()):
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", labels + (("le", format_value(float(bound))),), cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class Callback:
+    """values read when the metrics are rendered, e.g. from a cache"""
+
+    def __init__(self, name, kind, documentation, labelnames, read):
+        """
+        :param read: returns {label values: value}
+        """
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.read = read
+
+    def samples(self):
+        suffix = "_total" if self.kind == "counter" else ""
+        for key, value in sorted(self.read().items()):
+            yield suffix, tuple(zip(self.labelnames, key)), value
+
+
+class Registry:
+
+    def __init__(self):
+        # name -> metric, in registration order
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, kind, documentation, labelnames, read):
+        return self.register(Callback(name, kind, documentation, labelnames, read))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """:return: picklable values of the counters and histograms"""
+        return {
+            name: metric.snapshot()
+            for name, metric in self.metrics.items()
+            if isinstance(metric, (Counter, Histogram))
+        }
+
+    def merge(self, snapshot):
+        """add the values of another process"""
+        for name, values in snapshot.items():
+            metric = self.metrics.get(name)
+            if isinstance(metric, (Counter, Histogram)):
+                metric.merge(values)
+
+    def reset(self):
+        for metric in self.metrics.values():
+            if isinstance(metric, (Counter, Histogram)):
+                metric.reset()
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "time to answer a request",
+    ("method", "route", "status"),
+)
+REQUEST_DB_QUERIES = REGISTRY.histogram(
+    "http_request_db_queries", "database queries run by a request",
+    ("route",), COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = REGISTRY.histogram(
+    "http_request_db_seconds", "time a request spent in database queries",
+    ("route",), QUERY_BUCKETS,
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "time of one database query",
+    ("statement",), QUERY_BUCKETS,
+)
+OUTBOUND_REQUEST_SECONDS = REGISTRY.histogram(
+    "outbound_request_duration_seconds", "time of a request to another site",
+    ("host", "status"),
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds", "time of a chat completion call",
+    ("purpose", "model"),
+)
+CRAWL_JOB_SECONDS = REGISTRY.histogram(
+    "crawl_job_duration_seconds", "time from claiming a crawl job to its outcome",
+    ("kind", "status"), JOB_BUCKETS,
+)
+CRAWL_ITEMS = REGISTRY.counter(
+    "crawl_items", "news items that reached each stage of a crawl",
+    ("stage",),
+)
+
+# [queries, seconds] of the current request, None outside of one
+_request_queries = ContextVar("request_queries", default=None)
+
+
+@contextmanager
+def track_queries():
+    """
+    add up the queries run until exit, also by the threads and tasks the
+    block starts
+
+    :return: [queries, seconds], final on exit
+    """
+    totals = [0, 0.0]
+    token = _request_queries.set(totals)
+    try:
+        yield totals
+    finally:
+        _request_queries.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    verb = statement.split(None, 1)[0].lower() if statement.strip() else ""
+    DB_QUERY_SECONDS.observe(elapsed, statement=verb)
+    totals = _request_queries.get()
+    if totals is not None:
+        totals[0] += 1
+        totals[1] += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_query(exception_context):
+    # after_cursor_execute does not run for a failed query
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+
+class RequestMetricsMiddleware:
+    """
+    asgi middleware recording the latency and the database queries of each
+    request, labelled with the route template so ids in paths do not make
+    new series. streamed responses are timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        with track_queries() as queries:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # the router stores the matched route in the scope
+                route = scope.get("route")
+                path = getattr(route, "path", "unmatched")
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started,
+                    method=scope["method"], route=path, status=status[0],
+                )
+                REQUEST_DB_QUERIES.observe(queries[0], route=path)
+                REQUEST_DB_SECONDS.observe(queries[1], route=path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="0.0.0.0"):
+    """serve the metrics over http from a daemon thread, for processes without an api"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,139 @@
+"""
+full text search over stored news with sqlite fts5
+
+fts5's tokenizers split text on spaces and punctuation, which leaves a
+whole chinese sentence as one token. text is therefore tokenized here
+before it is indexed: every run of cjk characters becomes its overlapping
+bigrams plus its single characters, other text becomes lowercase words.
+the fts table stores those tokens, with the article id as rowid, and
+results are joined back to news_articles. on other databases there is no
+index: nothing is indexed and searches find nothing.
+"""
+import re
+
+from sqlalchemy import DDL, text
+
+FTS_TABLE = "news_articles_fts"
+FTS_COLUMNS = ("title", "content", "summary", "reason")
+# bm25 weight of each column, a title match counts most
+FTS_WEIGHTS = (10.0, 1.0, 2.0, 2.0)
+
+CREATE_FTS_TABLE = DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    f"USING fts5({', '.join(FTS_COLUMNS)}, tokenize='unicode61')"
+).execute_if(dialect="sqlite")
+
+
+def is_available(db):
+    """
+    :param db: session or connection
+    :return: whether the database has the fts index
+    """
+    bind = db.get_bind() if hasattr(db, "get_bind") else db
+    return bind.dialect.name == "sqlite"
+
+_CJK = "㐀-䶿一-鿿豈-﫿"
+_RUNS = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_RUN = re.compile(rf"[{_CJK}]+")
+
+
+def tokenize(value):
+    """
+    :param value: text in any mix of chinese and latin script
+    :return: list of index tokens
+    """
+    tokens = []
+    for run in _RUNS.findall(value or ""):
+        if _CJK_RUN.fullmatch(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.extend(run)
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+def build_match_query(query):
+    """
+    turn search terms into an fts5 match expression: a term matches when
+    all its bigrams (or its only character) appear, any term may match
+
+    :param query: space separated search terms
+    :return: match expression, or None when there is nothing to search
+    """
+    terms = []
+    for term in (query or "").split():
+        tokens = []
+        for run in _RUNS.findall(term):
+            if _CJK_RUN.fullmatch(run) and len(run) > 1:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            else:
+                tokens.append(run.lower())
+        if tokens:
+            terms.append("(" + " AND ".join(f'"{t}"' for t in tokens) + ")")
+    return " OR ".join(terms) or None
+
+
+def index_news_article(db, article_id, title, content, summary, reason):
+    """add or replace the index entry of an article"""
+    if not is_available(db):
+        return
+    db.execute(
+        text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": article_id}
+    )
+    db.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+            f"VALUES (:id, :title, :content, :summary, :reason)"
+        ),
+        {
+            "id": article_id,
+            "title": " ".join(tokenize(title)),
+            "content": " ".join(tokenize(content)),
+            "summary": " ".join(tokenize(summary)),
+            "reason": " ".join(tokenize(reason)),
+        },
+    )
+
+
+def rebuild_news_search_index(db):
+    """
+    index every stored article again
+
+    :param db:
+    :return: number of indexed articles
+    """
+    if not is_available(db):
+        return 0
+    db.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    rows = db.execute(
+        text("SELECT id, title, content, summary, reason FROM news_articles")
+    ).all()
+    for row in rows:
+        index_news_article(db, *row)
+    return len(rows)
+
+
+def search_news_ids(db, query, limit):
+    """
+    ids of the best matching articles, best first
+
+    :param db:
+    :param query: space separated search terms
+    :param limit:
+    :return: list of (article id, bm25 score), lower scores rank higher
+    """
+    match = build_match_query(query)
+    if match is None or not is_available(db):
+        return []
+    weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+    return [
+        (row.id, row.score)
+        for row in db.execute(
+            text(
+                f"SELECT rowid AS id, bm25({FTS_TABLE}, {weights}) AS score "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+                f"ORDER BY score LIMIT :limit"
+            ),
+            {"match": match, "limit": limit},
+        )
+    ]
@@ -0,0 +1,92 @@
+"""
+bcrypt hashing and verification on a bounded pool of worker threads
+
+bcrypt takes 100-300 ms of cpu per call. run on the event loop it stalls
+every other request, and run on the shared request threadpool a burst of
+logins can take every worker. this pool has its own small number of
+threads and a bounded queue; when the queue is full new calls are
+rejected with PasswordHasherBusy instead of piling up.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PasswordHasherBusy(Exception):
+    """the hashing queue is full"""
+
+
+class PasswordHasher:
+
+    def __init__(self, context, max_workers=None, max_queue=64):
+        """
+        :param context: passlib CryptContext doing the actual work
+        :param max_workers: hashing threads, half the cpus by default
+        :param max_queue: calls allowed to wait for a thread
+        """
+        self.context = context
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="password-hasher"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "wait_seconds_total": self._wait_seconds,
+                "wait_seconds_max": self._max_wait_seconds,
+                "run_seconds_total": self._run_seconds,
+            }
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise PasswordHasherBusy()
+            self._queued += 1
+        return self._executor.submit(self._run, time.perf_counter(), fn, *args)
+
+    def _run(self, submitted, fn, *args):
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            waited = started - submitted
+            self._wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._run_seconds += time.perf_counter() - started
+
+    async def hash(self, password):
+        return await asyncio.wrap_future(self._submit(self.context.hash, password))
+
+    async def verify(self, password, hashed_password):
+        return await asyncio.wrap_future(
+            self._submit(self.context.verify, password, hashed_password)
+        )
+
+    def hash_blocking(self, password):
+        """hash from sync code, e.g. a route already running on a threadpool"""
+        return self._submit(self.context.hash, password).result()
@@ -0,0 +1,136 @@
+"""
+monthly price series of the necessities price dataset
+
+the dataset keeps each product's history as a comma separated string in
+統計值, one value per month starting at 時間起點, with 0 meaning no data.
+series are decoded once into float64 arrays (nan for missing months) and
+stored packed as little-endian bytes.
+"""
+import math
+import sys
+from array import array
+
+MISSING = float("nan")
+
+
+def month_index(date_str):
+    """
+    convert 'YYYY-MM-DD' or 'YYYY-MM' into a month number
+
+    :param date_str:
+    :return: year * 12 + month - 1
+    """
+    year, month = date_str.split("-")[:2]
+    return int(year) * 12 + int(month) - 1
+
+
+def month_label(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def decode_series(values_str):
+    """
+    decode a 統計值 string into an array, zero and blank values become nan
+
+    :param values_str:
+    :return: array('d')
+    """
+    series = array("d")
+    for value in (values_str or "").split(","):
+        value = value.strip()
+        number = float(value) if value else 0.0
+        series.append(number if number else MISSING)
+    return series
+
+
+def pack_series(series):
+    if sys.byteorder != "little":
+        series = array("d", series)
+        series.byteswap()
+    return series.tobytes()
+
+
+def unpack_series(data):
+    series = array("d")
+    series.frombytes(data)
+    if sys.byteorder != "little":
+        series.byteswap()
+    return series
+
+
+def _present(value):
+    return not math.isnan(value)
+
+
+def _ratio_change(series, lag):
+    """relative change of each month against the month `lag` months before"""
+    changes = [None] * min(lag, len(series))
+    for current, previous in zip(series[lag:], series):
+        if _present(current) and _present(previous):
+            changes.append(current / previous - 1)
+        else:
+            changes.append(None)
+    return changes
+
+
+def month_over_month(series):
+    return _ratio_change(series, 1)
+
+
+def year_over_year(series):
+    return _ratio_change(series, 12)
+
+
+def rolling_mean(series, window):
+    """
+    mean of the present values in each trailing window
+
+    :param series:
+    :param window: number of months in a window
+    :return: list with None where the window has no value
+    """
+    means = []
+    total = 0.0
+    count = 0
+    for i, value in enumerate(series):
+        if _present(value):
+            total += value
+            count += 1
+        if i >= window and _present(series[i - window]):
+            total -= series[i - window]
+            count -= 1
+        means.append(total / count if count else None)
+    return means
+
+
+def min_max(series):
+    """
+    lowest and highest present values with their positions
+
+    :param series:
+    :return: ((min index, min value), (max index, max value)), or None if empty
+    """
+    present = [(i, value) for i, value in enumerate(series) if _present(value)]
+    if not present:
+        return None
+    return (
+        min(present, key=lambda item: item[1]),
+        max(present, key=lambda item: item[1]),
+    )
+
+
+def last_present(values):
+    """last value that is neither nan nor None, with its position"""
+    for i in range(len(values) - 1, -1, -1):
+        value = values[i]
+        if value is not None and _present(value):
+            return i, value
+    return None
+
+
+def to_list(values, digits=4):
+    """json friendly copy of a series, missing values become None"""
+    return [
+        None if value is None or not _present(value) else round(value, digits)
+        for value in values
+    ]
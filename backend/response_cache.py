@@ -0,0 +1,81 @@
+"""
+in-process cache of serialized GET responses with strong etags
+
+reads of the news listing and the price store change only when the crawler,
+the price refresh or an upvote writes, but every poll used to query and
+serialize them again. each cached body is stored under its route, params
+and the version of the data it was built from; writers bump that version
+(see bump_cache_version in main.py), so a stale body is never looked up
+again and is eventually dropped as least recently used.
+
+the etag is a hash of the body, so a client sending it back in
+If-None-Match gets a 304 without a body.
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+CachedResponse = namedtuple("CachedResponse", ["etag", "body", "headers"])
+
+
+def make_etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    :param if_none_match: value of the If-None-Match header, or None
+    :param etag:
+    :return: whether a 304 may be sent
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match compares weakly
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries=256):
+        """
+        :param max_entries: bodies kept, least recently used dropped first
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (key, version) -> CachedResponse
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get((key, version))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((key, version))
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, body, headers=None):
+        """
+        :param key: route and params the body answers
+        :param version: version of the data the body was built from
+        :param body: serialized response, bytes
+        :param headers: extra headers to send with the body
+        :return: CachedResponse
+        """
+        entry = CachedResponse(make_etag(body), body, dict(headers or {}))
+        with self._lock:
+            self._entries[key, version] = entry
+            self._entries.move_to_end((key, version))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
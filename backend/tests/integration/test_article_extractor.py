@@ -0,0 +1,61 @@
+import pathlib
+
+from datetime import datetime
+
+from article_extractor import extract_article, parse_news_time
+from main import parse_article
+
+FIXTURES = pathlib.Path(__file__).resolve().parents[2] / "benchmarks" / "fixtures"
+
+
+def test_extract_article_fixture():
+    article = extract_article((FIXTURES / "udn_article_1.html").read_text(encoding="utf-8"))
+
+    assert article["title"].endswith("。")
+    assert article["time"] == "2024-07-01 11:07"
+    assert len(article["content"]) == 12
+    assert all("▪" not in p and p.strip() for p in article["content"])
+
+
+def test_extract_article_nested_markup():
+    html = """
+    <h1 class="article-content__title">Tom &amp; <em>Jerry</em></h1>
+    <time class="article-content__time other">2024-09-10</time>
+    <section class="article-content__editor">
+        <p>first <a href="#">link</a> text</p>
+        <section class="inner"><p>inside inner</p></section>
+        <p>   </p>
+        <p>▪ related</p>
+        <p>unclosed
+    </section>
+    <p>after the editor</p>
+    """
+
+    article = extract_article(html)
+
+    assert article["title"] == "Tom & Jerry"
+    assert article["time"] == "2024-09-10"
+    assert article["content"] == ["first link text", "inside inner", "unclosed\n    "]
+
+
+def test_extract_article_missing_section():
+    html = (FIXTURES / "udn_article_no_editor.html").read_text(encoding="utf-8")
+
+    article = extract_article(html)
+
+    assert article["title"]
+    assert article["content"] == []
+    assert parse_article("https://udn.com/news/story/1/1", html) is None
+
+
+def test_extract_article_not_an_article():
+    assert extract_article("<html><body><p>404</p></body></html>") is None
+    assert extract_article("") is None
+
+
+def test_parse_news_time_to_utc():
+    assert parse_news_time("2024-07-01 11:07") == datetime(2024, 7, 1, 3, 7)
+    assert parse_news_time(" 2024/07/01  08:00:30 ") == datetime(2024, 7, 1, 0, 0, 30)
+    assert parse_news_time("2024-07-01") == datetime(2024, 6, 30, 16, 0)
+    assert parse_news_time("3 小時前") is None
+    assert parse_news_time(None) is None
@@ -0,0 +1,51 @@
+from auth_cache import AuthCache, AuthenticatedUser
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_expires_at_exp_claim_or_ttl():
+    clock = Clock()
+    cache = AuthCache(ttl=60, clock=clock)
+    user = AuthenticatedUser(1, "alice")
+    cache.put_token("short", user, expires_at=clock.now + 10)
+    cache.put_token("long", user, expires_at=clock.now + 3600)
+
+    clock.now += 11
+    assert cache.get_token("short") is None
+    assert cache.get_token("long") == user
+
+    clock.now += 50
+    assert cache.get_token("long") is None
+
+
+def test_least_recently_used_dropped():
+    cache = AuthCache(max_entries=2)
+    for i in range(2):
+        cache.put_token(f"token {i}", AuthenticatedUser(i, f"user {i}"))
+    cache.get_token("token 0")
+    cache.put_token("token 2", AuthenticatedUser(2, "user 2"))
+
+    assert cache.get_token("token 0") is not None
+    assert cache.get_token("token 1") is None
+    assert cache.get_token("token 2") is not None
+
+
+def test_invalidate_user():
+    cache = AuthCache()
+    alice, bob = AuthenticatedUser(1, "alice"), AuthenticatedUser(2, "bob")
+    cache.put_token("a1", alice)
+    cache.put_token("a2", alice)
+    cache.put_token("b1", bob)
+    cache.put_user(alice)
+
+    cache.invalidate_user(username="alice")
+
+    assert cache.get_token("a1") is None and cache.get_token("a2") is None
+    assert cache.get_user("alice") is None
+    assert cache.get_token("b1") == bob
@@ -0,0 +1,78 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+import clients
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    clients.reset_clients()
+    yield
+    clients.reset_clients()
+
+
+def test_client_built_once():
+    built = []
+
+    def factory():
+        built.append(object())
+        return built[-1]
+
+    assert clients.shared("test", factory) is clients.shared("test", factory)
+    assert len(built) == 1
+
+    clients.reset_clients()
+    assert clients.shared("test", factory) is built[1]
+
+
+def test_http_session_is_shared():
+    session = clients.http_session()
+
+    assert clients.http_session() is session
+    assert session.get_adapter("https://opendata.ey.gov.tw") is session.get_adapter("http://udn.com")
+
+
+def test_openai_client_is_shared(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    client = clients.openai_client()
+
+    assert clients.openai_client() is client
+    assert client.api_key == "test-key"
+
+
+def test_sentry_off_without_dsn(monkeypatch, mocker):
+    monkeypatch.setenv("SENTRY_DSN", "")
+    init = mocker.patch("sentry_sdk.init")
+
+    assert clients.init_sentry() is False
+    init.assert_not_called()
+
+
+def test_sentry_sample_rates(monkeypatch, mocker):
+    monkeypatch.setenv("SENTRY_DSN", "https://key@sentry.example/1")
+    monkeypatch.setenv("SENTRY_TRACES_SAMPLE_RATE", "0.25")
+    init = mocker.patch("sentry_sdk.init")
+
+    assert clients.init_sentry() is True
+    init.assert_called_once_with(
+        dsn="https://key@sentry.example/1", traces_sample_rate=0.25, profiles_sample_rate=0.0
+    )
+
+
+def test_main_import_leaves_heavy_modules_unloaded():
+    code = (
+        "import sys, main; "
+        "print(' '.join(m for m in ('openai', 'bcrypt') if m in sys.modules))"
+    )
+    loaded = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, check=True,
+        cwd=pathlib.Path(__file__).resolve().parents[2],
+        env={**os.environ, "SENTRY_DSN": "", "DATABASE_URL": "sqlite://"},
+    ).stdout.strip()
+
+    assert loaded == ""
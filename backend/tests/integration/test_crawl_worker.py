@@ -0,0 +1,122 @@
+import json
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, StaticPool
+from sqlalchemy.orm import sessionmaker
+
+import crawl_worker
+import metrics
+from crawl_worker import CrawlWorker, acquire_lease, claim_crawl_jobs, schedule_periodic_jobs
+from main import Base, CrawlJob, WorkerLease, enqueue_crawl_job
+
+
+@pytest.fixture
+def worker_db():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class InlinePool:
+    """runs each job at once, in the calling thread"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def test_lease_held_by_one_worker(worker_db):
+    with worker_db() as db:
+        assert acquire_lease(db, "crawler", "a")
+        assert not acquire_lease(db, "crawler", "b")
+        assert acquire_lease(db, "crawler", "a")
+
+        # a stops renewing
+        assert acquire_lease(db, "crawler", "a", ttl=timedelta(seconds=-1))
+        assert acquire_lease(db, "crawler", "b")
+        assert not acquire_lease(db, "crawler", "a")
+
+
+def test_enqueue_dedupes_pending_jobs(worker_db):
+    with worker_db() as db:
+        first = enqueue_crawl_job(db, "search", {"keywords": "雞蛋"})
+        assert enqueue_crawl_job(db, "search", {"keywords": "雞蛋"}) == first
+        assert enqueue_crawl_job(db, "search", {"keywords": "牛奶"}) != first
+
+
+def test_jobs_claimed_by_priority(worker_db):
+    with worker_db() as db:
+        enqueue_crawl_job(db, "backfill")
+        enqueue_crawl_job(db, "search", {"keywords": "雞蛋"})
+        enqueue_crawl_job(db, "latest")
+
+        claimed = claim_crawl_jobs(db, "a", 2)
+
+        assert [kind for _, kind, _ in claimed] == ["latest", "search"]
+        assert claim_crawl_jobs(db, "a", 5)[0][1] == "backfill"
+        assert claim_crawl_jobs(db, "a", 5) == []
+
+
+def test_periodic_jobs_queued_when_due(worker_db):
+    with worker_db() as db:
+        assert sorted(schedule_periodic_jobs(db)) == ["backfill", "latest", "prices"]
+        assert schedule_periodic_jobs(db) == []
+        later = datetime.utcnow() + crawl_worker.PERIODIC_JOBS["latest"]
+        assert schedule_periodic_jobs(db, later) == ["latest"]
+
+
+def test_worker_runs_jobs_and_retries(worker_db, mocker):
+    calls = []
+
+    def run(kind, payload):
+        calls.append(kind)
+        if calls.count("latest") == 1 and kind == "latest":
+            raise RuntimeError("udn.com is down")
+        return {"inserted": 1}, {"crawl_items": {("stored",): 1}}
+
+    metrics.REGISTRY.reset()
+    mocker.patch("crawl_worker.run_crawl_job", side_effect=run)
+    worker = CrawlWorker(worker_db, InlinePool(), processes=4, owner="a")
+    other = CrawlWorker(worker_db, InlinePool(), processes=4, owner="b")
+
+    assert worker.tick()
+    assert not other.tick()
+    # record the results, the failed latest job is run again
+    worker.tick()
+    worker.tick()
+
+    with worker_db() as db:
+        latest = db.query(CrawlJob).filter_by(kind="latest").one()
+        assert latest.status == "done"
+        assert latest.attempts == 2
+        assert json.loads(latest.result) == {"inserted": 1}
+        assert {job.status for job in db.query(CrawlJob)} == {"done"}
+    # what the jobs recorded is merged into the worker's metrics
+    assert metrics.CRAWL_ITEMS.value(stage="stored") == len(calls) - 1
+    assert metrics.CRAWL_JOB_SECONDS.count(kind="latest", status="failed") == 1
+    assert metrics.CRAWL_JOB_SECONDS.count(kind="latest", status="done") == 1
+
+
+def test_shutdown_records_jobs_without_claiming_more(worker_db, mocker):
+    mocker.patch("crawl_worker.run_crawl_job", return_value=({"inserted": 1}, {}))
+    worker = CrawlWorker(worker_db, InlinePool(), processes=4, owner="a")
+    worker.tick()
+    with worker_db() as db:
+        enqueue_crawl_job(db, "search", {"keywords": "雞蛋"})
+    stop = threading.Event()
+    stop.set()
+
+    worker.run(stop)
+
+    assert worker.running == {}
+    with worker_db() as db:
+        assert db.query(CrawlJob).filter_by(kind="search").one().status == "pending"
+        assert {job.status for job in db.query(CrawlJob).filter(CrawlJob.kind != "search")} == {"done"}
+        assert db.query(WorkerLease).count() == 0
@@ -0,0 +1,369 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, StaticPool
+from sqlalchemy.orm import sessionmaker
+
+import main
+from crawler import Crawler, INITIAL_PAGES, run_sync
+from main import Base, CrawledUrl, NewsArticle
+
+DELAY = 0.2
+
+ARTICLE_HTML = """
+<html>
+<h1 class="article-content__title">{title}</h1>
+<time class="article-content__time">2024-09-10 10:00</time>
+<section class="article-content__editor">
+    <p>Paragraph of {title}.</p>
+</section>
+</html>
+"""
+
+
+def stand_in_udn(delay=DELAY, fail_first=0, fresh_items=None):
+    """
+    async handler standing in for udn.com, every response takes `delay`.
+    listing pages carry an ETag and answer 304 to a matching If-None-Match;
+    `fresh_items` are extra items put on top of page 1.
+    """
+    calls = []
+    fresh_items = fresh_items if fresh_items is not None else []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(delay)
+        if len(calls) <= fail_first:
+            return httpx.Response(503)
+        if request.url.path == "/api/more":
+            page = int(request.url.params["page"])
+            lists = [
+                {"title": f"news {page}-{i}", "titleLink": f"https://udn.com/news/story/{page}/{i}"}
+                for i in range(2)
+            ]
+            if page == 1:
+                lists = fresh_items + lists
+            etag = f'"page-{page}-{len(lists)}"'
+            if request.headers.get("If-None-Match") == etag:
+                return httpx.Response(304, headers={"ETag": etag})
+            return httpx.Response(200, json={"lists": lists}, headers={"ETag": etag})
+        return httpx.Response(200, text=ARTICLE_HTML.format(title=request.url.path))
+
+    return handler, calls
+
+
+def listing_calls(calls):
+    return [c for c in calls if c.url.path == "/api/more"]
+
+
+@pytest.fixture
+def crawl_db(mocker):
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    mocker.patch("main.SessionLocal", TestingSessionLocal)
+    return TestingSessionLocal
+
+
+@pytest.fixture
+def mock_llm(mocker):
+    completion = mocker.Mock()
+    completion.choices = [mocker.Mock()]
+    completion.choices[0].message.content = json.dumps({"影響": "impact", "原因": "reason"})
+    mocker.patch("main.openai_client").return_value.chat.completions.create.return_value = completion
+    return mocker.patch(
+        "main.evaluate_relevance_batch",
+        side_effect=lambda db, titles: ["high" if t.endswith("-0") else "low" for t in titles],
+    )
+
+
+def judged_titles(mock_batch):
+    return [title for call in mock_batch.call_args_list for title in call.args[1]]
+
+
+def crawler_for(handler, **kwargs):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return Crawler(client=client, **kwargs)
+
+
+def test_initial_listing_pages_fetched_concurrently():
+    handler, calls = stand_in_udn()
+
+    async def crawl():
+        async with crawler_for(handler) as crawler:
+            return await main.get_new_info_async("價格", is_initial=True, crawler=crawler)
+
+    started = time.perf_counter()
+    news = run_sync(crawl())
+    elapsed = time.perf_counter() - started
+
+    assert len(calls) == len(INITIAL_PAGES)
+    assert len(news) == 2 * len(INITIAL_PAGES)
+    assert news[0]["title"] == "news 1-0"
+    assert elapsed < DELAY * 3
+
+
+def test_article_pages_fetched_concurrently():
+    handler, calls = stand_in_udn()
+    urls = [f"https://udn.com/news/story/1/{i}" for i in range(8)]
+
+    async def crawl():
+        async with crawler_for(handler) as crawler:
+            return await crawler.fetch_pages(urls)
+
+    started = time.perf_counter()
+    pages = run_sync(crawl())
+    elapsed = time.perf_counter() - started
+
+    assert len(pages) == len(urls)
+    assert "/news/story/1/7" in pages[7]
+    assert elapsed < DELAY * 3
+
+
+def test_concurrency_limit():
+    handler, calls = stand_in_udn(delay=0.1)
+    urls = [f"https://udn.com/news/story/1/{i}" for i in range(6)]
+
+    async def crawl():
+        async with crawler_for(handler, concurrency=2) as crawler:
+            return await crawler.fetch_pages(urls)
+
+    started = time.perf_counter()
+    run_sync(crawl())
+    elapsed = time.perf_counter() - started
+
+    assert elapsed >= 0.1 * 3
+
+
+def test_retry_with_backoff():
+    handler, calls = stand_in_udn(delay=0, fail_first=2)
+
+    async def crawl():
+        async with crawler_for(handler, backoff=0.01) as crawler:
+            return await crawler.fetch_news_list("價格")
+
+    news = run_sync(crawl())
+
+    assert len(calls) == 3
+    assert len(news) == 2
+
+
+def test_retries_exhausted():
+    handler, calls = stand_in_udn(delay=0, fail_first=10)
+
+    async def crawl():
+        async with crawler_for(handler, retries=1, backoff=0.01) as crawler:
+            return await crawler.fetch_pages(["https://udn.com/news/story/1/1"])
+
+    pages = run_sync(crawl())
+
+    assert len(calls) == 2
+    assert isinstance(pages[0], httpx.HTTPStatusError)
+
+
+def test_get_new_stores_relevant_articles(mocker, crawl_db, mock_llm):
+    handler, calls = stand_in_udn()
+    mocker.patch("main.Crawler", side_effect=lambda: crawler_for(handler))
+
+    main.get_new(is_initial=True)
+
+    with crawl_db() as db:
+        articles = db.query(NewsArticle).order_by(NewsArticle.id).all()
+        assert len(articles) == len(INITIAL_PAGES)
+        assert articles[0].url == "https://udn.com/news/story/1/0"
+        assert articles[0].title == "/news/story/1/0"
+        assert articles[0].summary == "impact"
+        assert db.query(CrawledUrl).count() == 2 * len(INITIAL_PAGES)
+        assert db.query(CrawledUrl).filter_by(relevance="low").count() == len(INITIAL_PAGES)
+
+
+def test_add_news_batch_upserts_by_url(crawl_db):
+    article = {
+        "url": "https://udn.com/news/story/1/1",
+        "title": "title",
+        "time": "2024-09-10 10:00",
+        "content": ["paragraph"],
+        "summary": "summary",
+        "reason": "reason",
+    }
+    other = {**article, "url": "https://udn.com/news/story/1/2"}
+
+    with crawl_db() as db:
+        assert main.add_news_batch(db, [article, dict(article), other]) == (2, 0, 1)
+        db.commit()
+        assert main.add_news_batch(db, [article, {**other, "summary": "new"}]) == (0, 1, 1)
+        db.commit()
+
+        assert db.query(NewsArticle).count() == 2
+        assert db.query(NewsArticle).filter_by(url=other["url"]).one().summary == "new"
+
+
+def test_stored_article_is_seen_under_another_url_form(crawl_db):
+    article = {
+        "url": "https://udn.com/news/story/1/1?from=list",
+        "title": "title",
+        "time": "2024-09-10 10:00",
+        "content": ["paragraph"],
+        "summary": "summary",
+        "reason": "reason",
+    }
+
+    with crawl_db() as db:
+        main.add_news_batch(db, [article])
+        db.commit()
+
+        assert db.query(NewsArticle).one().url == "https://udn.com/news/story/1/1"
+        listing = [{"title": "retitled", "titleLink": "https://udn.com/news/story/1/1#comments"}]
+        assert main.filter_unseen_news(db, listing) == []
+
+
+def test_incremental_crawl_skips_known_items(mocker, crawl_db, mock_llm):
+    fresh_items = []
+    handler, calls = stand_in_udn(delay=0, fresh_items=fresh_items)
+    mocker.patch("main.Crawler", side_effect=lambda: crawler_for(handler))
+
+    main.get_new()
+
+    assert len(listing_calls(calls)) == len(INITIAL_PAGES)
+    assert len(judged_titles(mock_llm)) == 2 * len(INITIAL_PAGES)
+
+    # nothing changed: one conditional request answered with 304
+    calls.clear()
+    mock_llm.reset_mock()
+    main.get_new()
+
+    assert len(calls) == 1
+    assert calls[0].headers["If-None-Match"] == '"page-1-2"'
+    assert judged_titles(mock_llm) == []
+
+    # one new item on top of page 1: stop paginating at the known items
+    calls.clear()
+    fresh_items.append({"title": "breaking-0", "titleLink": "https://udn.com/news/story/9/99?from=list"})
+    main.get_new()
+
+    assert len(listing_calls(calls)) == 1
+    assert judged_titles(mock_llm) == ["breaking-0"]
+    with crawl_db() as db:
+        assert db.query(NewsArticle).filter_by(url="https://udn.com/news/story/9/99").count() == 1
+
+    # the same story reappearing under another url is not judged again
+    calls.clear()
+    mock_llm.reset_mock()
+    fresh_items.append({"title": "breaking-0", "titleLink": "https://udn.com/news/story/9/100"})
+    main.get_new()
+
+    assert judged_titles(mock_llm) == []
+
+
+def test_malformed_summary_skips_only_its_article(mocker, crawl_db, mock_llm):
+    handler, calls = stand_in_udn(delay=0)
+    mocker.patch("main.Crawler", side_effect=lambda: crawler_for(handler))
+    create = main.openai_client.return_value.chat.completions.create
+    good = create.return_value
+
+    def complete(model, messages, **options):
+        if "/news/story/2/0" in messages[1]["content"]:
+            bad = mocker.Mock()
+            bad.choices = [mocker.Mock()]
+            bad.choices[0].message.content = "not json"
+            return bad
+        return good
+
+    create.side_effect = complete
+
+    main.get_new(is_initial=True)
+
+    with crawl_db() as db:
+        urls = {article.url for article in db.query(NewsArticle)}
+        assert len(urls) == len(INITIAL_PAGES) - 1
+        assert "https://udn.com/news/story/2/0" not in urls
+        assert db.query(main.LlmCacheEntry).count() == len(INITIAL_PAGES) - 1
+
+
+def test_listing_refetched_after_an_article_failed(mocker, crawl_db, mock_llm):
+    handler, calls = stand_in_udn(delay=0)
+    mocker.patch("main.Crawler", side_effect=lambda: crawler_for(handler))
+    real_parse_article = main.parse_article
+    parse_article = mocker.patch("main.parse_article", return_value=None)
+
+    main.get_new()
+
+    with crawl_db() as db:
+        assert db.query(NewsArticle).count() == 0
+    # the unchanged listing is not answered with 304, which would hide
+    # the articles that were not stored
+    calls.clear()
+    parse_article.side_effect = real_parse_article
+    main.get_new()
+
+    assert "If-None-Match" not in listing_calls(calls)[0].headers
+    with crawl_db() as db:
+        assert db.query(NewsArticle).one().url == "https://udn.com/news/story/1/0"
+
+
+@pytest.fixture
+def stub_llm(mocker):
+    """stub chat client answering batch prompts from the titles themselves"""
+    create = mocker.patch("main.openai_client").return_value.chat.completions.create
+
+    def complete(model, messages, **options):
+        system, user = messages[0]["content"], messages[1]["content"]
+        if system == main.BATCH_RELEVANCE_PROMPT:
+            items = json.loads(user)
+            results = [{"id": item["id"], "relevance": item["title"].split()[-1]} for item in reversed(items)]
+            content = json.dumps({"results": results})
+        else:
+            content = user.split()[-1]
+        completion = mocker.Mock()
+        completion.choices = [mocker.Mock()]
+        completion.choices[0].message.content = content
+        return completion
+
+    create.side_effect = complete
+    return create
+
+
+def test_relevance_batch_single_request(crawl_db, stub_llm):
+    titles = [f"title {i} {['high', 'medium', 'low'][i % 3]}" for i in range(30)]
+
+    with crawl_db() as db:
+        relevances = main.evaluate_relevance_batch(db, titles)
+
+    assert relevances == [["high", "medium", "low"][i % 3] for i in range(30)]
+    assert stub_llm.call_count == 1
+    assert stub_llm.call_args.kwargs["response_format"] == {"type": "json_object"}
+
+
+def test_relevance_batch_chunks_by_token_budget(crawl_db, stub_llm, mocker):
+    mocker.patch("main.RELEVANCE_BATCH_TOKEN_BUDGET", 60)
+    titles = [f"民生物價上漲新聞標題 {i} high" for i in range(10)]
+
+    with crawl_db() as db:
+        relevances = main.evaluate_relevance_batch(db, titles)
+
+    assert relevances == ["high"] * 10
+    assert stub_llm.call_count > 1
+    sent = [item["title"] for call in stub_llm.call_args_list for item in json.loads(call.kwargs["messages"][1]["content"])]
+    assert sent == titles
+
+
+def test_relevance_batch_falls_back_on_parse_failure(crawl_db, stub_llm, mocker):
+    answers = iter(["not json", "high", "low"])
+    completion = mocker.Mock()
+    completion.choices = [mocker.Mock()]
+
+    def complete(model, messages, **options):
+        completion.choices[0].message.content = next(answers)
+        return completion
+
+    stub_llm.side_effect = complete
+
+    with crawl_db() as db:
+        relevances = main.evaluate_relevance_batch(db, ["first", "second"])
+        assert db.query(main.LlmCacheEntry).count() == 2
+
+    assert relevances == ["high", "low"]
+    assert stub_llm.call_count == 3
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from sqlalchemy import text
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+
+from database import async_database_url, create_async_db_engine, create_db_engine, sync_database_url
+
+
+def pragma(engine, name):
+    with engine.connect() as connection:
+        return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_sqlite_file_profile(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'news.db'}", env="production")
+
+    assert engine.echo is False
+    assert isinstance(engine.pool, QueuePool)
+    assert pragma(engine, "journal_mode") == "wal"
+    # NORMAL
+    assert pragma(engine, "synchronous") == 1
+    assert pragma(engine, "busy_timeout") == 5000
+
+
+def test_development_profile_echoes(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'news.db'}", env="development")
+
+    assert engine.echo is True
+
+
+def test_memory_database_shares_one_connection():
+    engine = create_db_engine("sqlite://", env="production")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE t (x INTEGER)"))
+
+    assert isinstance(engine.pool, StaticPool)
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM t")).scalar() == 0
+
+
+def test_async_url_uses_async_driver():
+    assert str(async_database_url("sqlite:///news.db")) == "sqlite+aiosqlite:///news.db"
+    assert async_database_url("postgresql://u@db/news").drivername == "postgresql+asyncpg"
+    assert sync_database_url("postgresql+asyncpg://u@db/news").drivername == "postgresql"
+    assert sync_database_url("sqlite+aiosqlite:///news.db").drivername == "sqlite"
+
+
+def test_async_url_rejects_backend_without_upsert():
+    with pytest.raises(ValueError):
+        async_database_url("mysql://u@db/news")
+
+
+def test_async_engine_shares_profile(tmp_path):
+    engine = create_async_db_engine(f"sqlite:///{tmp_path / 'news.db'}", env="production")
+    assert isinstance(engine.sync_engine.pool, AsyncAdaptedQueuePool)
+
+    async def journal_mode():
+        try:
+            async with engine.connect() as connection:
+                return (await connection.execute(text("PRAGMA journal_mode"))).scalar()
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(journal_mode()) == "wal"
@@ -0,0 +1,147 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, StaticPool
+from sqlalchemy.orm import sessionmaker
+from jose import jwt
+from main import app
+from main import Base, LlmCacheEntry, User, session_opener
+from main import SUMMARY_PROMPT, cached_chat_completion, llm_cache_key, llm_cache_stats
+
+SECRET_KEY = "1892dhianiandowqd0n"
+ALGORITHM = "HS256"
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base.metadata.create_all(bind=engine)
+
+client = TestClient(app)
+
+
+def override_session_opener():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def db():
+    with next(override_session_opener()) as db:
+        yield db
+        db.query(LlmCacheEntry).delete()
+        db.query(User).delete()
+        db.commit()
+
+
+@pytest.fixture
+def mock_openai(mocker):
+    mock_openai_client = mocker.patch("main.openai_client")
+    create = mock_openai_client.return_value.chat.completions.create
+
+    def complete(model, messages):
+        completion = mocker.Mock()
+        completion.choices = [mocker.Mock()]
+        completion.choices[0].message.content = f"answer to {messages[1]['content']}"
+        return completion
+
+    create.side_effect = complete
+    return create
+
+
+def test_cache_hit_and_miss(db, mock_openai):
+    llm_cache_stats.clear()
+
+    assert cached_chat_completion(db, "prompt", "input", "test") == "answer to input"
+    assert cached_chat_completion(db, "prompt", "input", "test") == "answer to input"
+    assert cached_chat_completion(db, "other prompt", "input", "test") == "answer to input"
+
+    assert mock_openai.call_count == 2
+    assert llm_cache_stats["test", "hit"] == 1
+    assert llm_cache_stats["test", "miss"] == 2
+
+
+def test_cache_expires(db, mock_openai):
+    cached_chat_completion(db, "prompt", "input", "test")
+    entry = db.query(LlmCacheEntry).one()
+    entry.created_at = datetime.utcnow() - timedelta(days=30)
+    db.commit()
+
+    cached_chat_completion(db, "prompt", "input", "test")
+
+    assert mock_openai.call_count == 2
+
+
+def test_cache_evicts_least_recently_used(db, mock_openai, mocker):
+    mocker.patch("main.LLM_CACHE_MAX_ENTRIES", 2)
+
+    cached_chat_completion(db, "prompt", "a", "test")
+    cached_chat_completion(db, "prompt", "b", "test")
+    cached_chat_completion(db, "prompt", "a", "test")
+    cached_chat_completion(db, "prompt", "c", "test")
+
+    assert db.query(LlmCacheEntry).count() == 2
+    cached_chat_completion(db, "prompt", "a", "test")
+    assert mock_openai.call_count == 3
+    cached_chat_completion(db, "prompt", "b", "test")
+    assert mock_openai.call_count == 4
+
+
+def test_concurrent_miss_stored_once(db, mock_openai):
+    answer = mock_openai.side_effect
+
+    def complete(model, messages):
+        # another worker misses the same key and stores its answer first
+        with engine.begin() as connection:
+            connection.execute(LlmCacheEntry.__table__.insert().values(
+                key=llm_cache_key(model, "prompt", "input"), model=model, response="other answer",
+                created_at=datetime.utcnow(), last_used_at=datetime.utcnow(),
+            ))
+        return answer(model, messages)
+
+    mock_openai.side_effect = complete
+
+    assert cached_chat_completion(db, "prompt", "input", "test") == "answer to input"
+    assert db.query(LlmCacheEntry).one().response == "answer to input"
+
+
+def test_news_summary_is_cached(db, mock_openai, mocker):
+    mock_openai.side_effect = None
+    completion = mocker.Mock()
+    completion.choices = [mocker.Mock()]
+    completion.choices[0].message.content = json.dumps({"影響": "impact", "原因": "reason"})
+    mock_openai.return_value = completion
+    db.add(User(username="cacheuser", hashed_password="x"))
+    db.commit()
+    headers = {"Authorization": f"Bearer {jwt.encode({'sub': 'cacheuser'}, SECRET_KEY, algorithm=ALGORITHM)}"}
+    mocker.patch.dict(app.dependency_overrides, {session_opener: override_session_opener})
+
+    for _ in range(3):
+        response = client.post("/api/v1/news/news_summary", json={"content": "same article"}, headers=headers)
+        assert response.status_code == 200
+        assert response.json() == {"summary": "impact", "reason": "reason"}
+
+    assert mock_openai.call_count == 1
+    assert cached_chat_completion(db, SUMMARY_PROMPT, "same article", "summary") == completion.choices[0].message.content
+
+
+def test_malformed_summary_is_not_replayed(db, mock_openai, mocker):
+    mock_openai.side_effect = None
+    completion = mocker.Mock()
+    completion.choices = [mocker.Mock()]
+    completion.choices[0].message.content = "not json"
+    mock_openai.return_value = completion
+    db.add(User(username="cacheuser", hashed_password="x"))
+    db.commit()
+    headers = {"Authorization": f"Bearer {jwt.encode({'sub': 'cacheuser'}, SECRET_KEY, algorithm=ALGORITHM)}"}
+    mocker.patch.dict(app.dependency_overrides, {session_opener: override_session_opener})
+
+    for _ in range(2):
+        response = client.post("/api/v1/news/news_summary", json={"content": "bad article"}, headers=headers)
+        assert response.status_code == 200
+        assert response.json() == {}
+
+    assert mock_openai.call_count == 2
+    assert db.query(LlmCacheEntry).count() == 0
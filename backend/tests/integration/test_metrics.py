@@ -0,0 +1,95 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text, StaticPool
+from sqlalchemy.orm import sessionmaker
+
+import metrics
+from main import app, Base, session_opener
+from metrics import Counter, Registry, track_queries
+
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base.metadata.create_all(bind=engine)
+
+client = TestClient(app)
+
+
+def override_session_opener():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "latency", ("route",), buckets=(0.1, 1.0))
+    latency.observe(0.1, route="/a")
+    latency.observe(0.5, route="/a")
+    latency.observe(3, route="/a")
+
+    rendered = registry.render()
+
+    assert "# TYPE latency_seconds histogram" in rendered
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in rendered
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in rendered
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in rendered
+    assert 'latency_seconds_count{route="/a"} 3' in rendered
+    assert 'latency_seconds_sum{route="/a"} 3.6' in rendered
+
+
+def test_snapshot_merged_into_another_registry():
+    worker, pool = Registry(), Registry()
+    for registry in (worker, pool):
+        registry.counter("items", "items", ("stage",))
+        registry.histogram("seconds", "seconds", ("kind",))
+    pool.metrics["items"].inc(3, stage="stored")
+    pool.metrics["seconds"].observe(0.2, kind="latest")
+
+    worker.merge(pool.snapshot())
+    worker.merge(pool.snapshot())
+
+    assert worker.metrics["items"].value(stage="stored") == 6
+    assert worker.metrics["seconds"].count(kind="latest") == 2
+
+
+def test_label_values_escaped():
+    counter = Counter("c", "c", ("term",))
+    counter.inc(term='雞蛋 "價格"')
+    registry = Registry()
+    registry.register(counter)
+
+    assert 'c_total{term="雞蛋 \\"價格\\""} 1' in registry.render()
+
+
+def test_queries_tracked_per_block():
+    with track_queries() as queries:
+        with TestingSessionLocal() as db:
+            db.execute(text("select 1"))
+            db.execute(text("select 2"))
+    with TestingSessionLocal() as db:
+        db.execute(text("select 3"))
+
+    assert queries[0] == 2
+    assert queries[1] > 0
+
+
+def test_request_metrics_by_route_template(mocker):
+    mocker.patch.dict(app.dependency_overrides, {session_opener: override_session_opener})
+    metrics.REGISTRY.reset()
+    client.get("/api/v1/news/news")
+    client.post("/api/v1/news/1/upvote")
+    client.post("/api/v1/news/2/upvote")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/news/news",status="200"} 1' in body
+    assert 'route="/api/v1/news/{id}/upvote",status="401"} 2' in body
+    assert "/api/v1/news/1/upvote" not in body
+    assert metrics.REQUEST_DB_QUERIES.count(route="/api/v1/news/news") == 1
+    assert 'cache_hit_ratio{cache="response"}' in body
+    assert 'password_hash_calls{state="queued"} 0' in body
+    assert 'password_hash_calls{state="rejected"}' in body
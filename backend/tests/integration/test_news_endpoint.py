@@ -1,14 +1,20 @@
+import asyncio
+import time
+
+import httpx
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, StaticPool
+from sqlalchemy import create_engine, NullPool, StaticPool
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 import json
 from jose import jwt
 from main import app
-from main import Base, NewsArticle, User, session_opener, user_news_association_table
-from main import NewsSumaryRequestSchema, PromptRequest
-from main import pwd_context
+from main import Base, NewsArticle, User, async_session_opener, session_opener
+from main import NewsSumaryRequestSchema
+from main import pwd_context, response_cache
 from unittest.mock import Mock
+from crawler import Crawler
 
 
 SECRET_KEY = "1892dhianiandowqd0n"
@@ -16,6 +22,8 @@ ALGORITHM = "HS256"
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 Base.metadata.create_all(bind=engine)
 
 
@@ -27,7 +35,13 @@ def override_session_opener():
         db.close()
 
 
+async def override_async_session_opener():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 app.dependency_overrides[session_opener] = override_session_opener
+app.dependency_overrides[async_session_opener] = override_async_session_opener
 client = TestClient(app)
 
 @pytest.fixture(scope="module")
@@ -77,6 +91,8 @@ def test_articles():
         db.commit()
         db.refresh(article_1)
         db.refresh(article_2)
+        # written without bumping the cache version
+        response_cache.clear()
 
         return [article_1, article_2]
 
@@ -95,6 +111,63 @@ def test_read_news(test_articles):
     assert json_response[1]["title"] == "Test News 1"
 
 
+def test_read_news_pagination(test_articles):
+    response = client.get("/api/v1/news/news", params={"limit": 1})
+    assert response.status_code == 200
+    json_response = response.json()
+    assert len(json_response) == 1
+    assert json_response[0]["title"] == "Test News 2"
+    assert "content" not in json_response[0]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get("/api/v1/news/news", params={"limit": 1, "cursor": cursor, "include_content": True})
+    assert response.status_code == 200
+    json_response = response.json()
+    assert len(json_response) == 1
+    assert json_response[0]["title"] == "Test News 1"
+    assert json_response[0]["content"] == "This is test content 1"
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_read_news_etag(test_user_and_articles, test_token):
+    user, articles = test_user_and_articles
+    response = client.get("/api/v1/news/news")
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/v1/news/news", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+
+    headers = {"Authorization": f"Bearer {test_token}"}
+    client.post(f"/api/v1/news/{articles[1].id}/upvote", headers=headers)
+    client.post(f"/api/v1/news/{articles[1].id}/upvote", headers=headers)
+    response = client.get("/api/v1/news/news", headers={"If-None-Match": etag})
+
+    # same content, so the new body hashes to the same etag
+    assert response.status_code == 304
+    client.post(f"/api/v1/news/{articles[1].id}/upvote", headers=headers)
+    response = client.get("/api/v1/news/news", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.json()[0]["upvotes"] == 1
+    client.post(f"/api/v1/news/{articles[1].id}/upvote", headers=headers)
+
+
+def test_read_news_date_range(test_articles):
+    # Test News 2 is at 2024-01-02 00:00 taiwan time, 2024-01-01 16:00 utc
+    response = client.get("/api/v1/news/news", params={"since": "2024-01-01T16:00:00Z"})
+    assert [n["title"] for n in response.json()] == ["Test News 2"]
+    assert response.json()[0]["published_at"] == "2024-01-01T16:00:00+00:00"
+
+    response = client.get("/api/v1/news/news", params={"until": "2024-01-02T00:00:00+08:00"})
+    assert [n["title"] for n in response.json()] == ["Test News 1"]
+
+
+def test_read_news_invalid_cursor():
+    response = client.get("/api/v1/news/news", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
 def test_read_user_news(test_user, test_token, test_articles):
     headers = {"Authorization": f"Bearer {test_token}"}
     response = client.get("/api/v1/news/user_news", headers=headers)
@@ -109,7 +182,7 @@ def test_read_user_news(test_user, test_token, test_articles):
     assert json_response[1]["is_upvoted"] is False
 
 def mock_openai(mocker, return_content):
-    mock_openai_client = mocker.patch('main.OpenAI')
+    mock_openai_client = mocker.patch('main.openai_client')
 
     mock_message = Mock()
     mock_message.content = return_content
@@ -124,24 +197,37 @@ def mock_openai(mocker, return_content):
 
     return mock_openai_client
 
+ARTICLE_HTML = """
+<html>
+<h1 class="article-content__title">Test Title</h1>
+<time class="article-content__time">2024-09-10</time>
+<section class="article-content__editor">
+    <p>This is a test paragraph.</p>
+</section>
+</html>
+"""
+
+
+def mock_crawler(mocker, delays):
+    """crawler whose article pages answer after delays[url] seconds"""
+    async def handler(request):
+        await asyncio.sleep(delays.get(str(request.url), 0))
+        return httpx.Response(200, text=ARTICLE_HTML)
+
+    return mocker.patch(
+        "main.Crawler",
+        side_effect=lambda: Crawler(client=httpx.AsyncClient(transport=httpx.MockTransport(handler))),
+    )
+
+
 def test_search_news(mocker):
     mock_openai(mocker, "keywords")
 
-    mock_get_new_info = mocker.patch("main.get_new_info", return_value=[
+    mock_get_new_info = mocker.patch("main.get_new_info_async", return_value=[
         {"titleLink": "http://example.com/news1"}
     ])
 
-    mock_get = mocker.patch("main.requests.get", return_value=mocker.Mock(
-        text="""
-        <html>
-        <h1 class="article-content__title">Test Title</h1>
-        <time class="article-content__time">2024-09-10</time>
-        <section class="article-content__editor">
-            <p>This is a test paragraph.</p>
-        </section>
-        </html>
-        """
-    ))
+    mock_crawler(mocker, {})
 
     request_body = {"prompt": "Test search prompt"}
 
@@ -154,6 +240,59 @@ def test_search_news(mocker):
     assert data[0]["title"] == "Test Title"
     assert data[0]["time"] == "2024-09-10"
     assert data[0]["content"] == "This is a test paragraph."
+    assert mock_get_new_info.call_args.args[0] == "keywords"
+
+
+def test_search_news_without_keywords(mocker):
+    mock_openai(mocker, None)
+    mock_get_new_info = mocker.patch("main.get_new_info_async")
+
+    response = client.post("/api/v1/news/search_news", json={"prompt": "no keywords in here"})
+
+    assert response.status_code == 200
+    assert response.json() == []
+    mock_get_new_info.assert_not_called()
+
+    with client.stream("POST", "/api/v1/news/search_news/stream", json={"prompt": "no keywords in here"}) as response:
+        events = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert events == [{"type": "done", "order": []}]
+
+
+def test_search_news_deadline(mocker):
+    mock_openai(mocker, "keywords")
+    mocker.patch("main.SEARCH_NEWS_DEADLINE", 0.5)
+    mocker.patch("main.get_new_info_async", return_value=[
+        {"titleLink": f"http://example.com/news{i}"} for i in range(5)
+    ])
+    mock_crawler(mocker, {"http://example.com/news3": 5, "http://example.com/news4": 5})
+
+    started = time.perf_counter()
+    response = client.post("/api/v1/news/search_news", json={"prompt": "Test search prompt"})
+    elapsed = time.perf_counter() - started
+
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+    assert elapsed < 2
+
+
+def test_search_news_stream(mocker):
+    mock_openai(mocker, "keywords")
+    mocker.patch("main.get_new_info_async", return_value=[
+        {"titleLink": f"http://example.com/news{i}"} for i in range(3)
+    ])
+    mock_crawler(mocker, {"http://example.com/news0": 0.3})
+
+    with client.stream("POST", "/api/v1/news/search_news/stream", json={"prompt": "Test search prompt"}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        events = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert [event["type"] for event in events] == ["article", "article", "article", "done"]
+    articles = [event["article"] for event in events[:-1]]
+    assert articles[-1]["url"] == "http://example.com/news0"
+    assert all(article["title"] == "Test Title" for article in articles)
+    assert sorted(events[-1]["order"]) == sorted(article["id"] for article in articles)
 
 
 def test_news_summary(mocker, test_token):
@@ -0,0 +1,112 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, NullPool, StaticPool, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from main import app
+from main import Base, NewsArticle, add_new, async_session_opener, session_opener
+from news_search import FTS_TABLE, rebuild_news_search_index
+
+client = TestClient(app)
+
+ARTICLES = [
+    ("雞蛋價格再漲 蛋商：年節前供應吃緊", "蛋價上漲，消費者叫苦。", "雞蛋漲價", "禽流感"),
+    ("衛生紙漲價潮再起", "紙漿成本上升，雞蛋也跟著漲。", "衛生紙漲", "成本"),
+    ("CPI 年增率 2.5%", "主計總處公布物價指數。", "物價溫和", "油價"),
+    ("泡麵口味評比", "今年新品眾多。", "無", "無"),
+]
+
+
+@pytest.fixture(scope="module")
+def search_db(tmp_path_factory):
+    """a file, so the async routes see the same data, under pytest's temporary directory"""
+    path = tmp_path_factory.mktemp("search") / "news.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    yield (
+        sessionmaker(autocommit=False, autoflush=False, bind=engine),
+        async_sessionmaker(async_engine, expire_on_commit=False),
+    )
+    engine.dispose()
+
+
+@pytest.fixture
+def stored_news(search_db, mocker):
+    TestingSessionLocal, TestingAsyncSessionLocal = search_db
+
+    def override_session_opener():
+        with TestingSessionLocal() as db:
+            yield db
+
+    async def override_async_session_opener():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    mocker.patch("main.SessionLocal", TestingSessionLocal)
+    mocker.patch.dict(app.dependency_overrides, {
+        session_opener: override_session_opener,
+        async_session_opener: override_async_session_opener,
+    })
+    for i, (title, content, summary, reason) in enumerate(ARTICLES):
+        add_new({
+            "url": f"https://udn.com/news/story/1/{i}",
+            "title": title,
+            "time": f"2024-07-0{i + 1} 10:00",
+            "content": [content],
+            "summary": summary,
+            "reason": reason,
+        })
+    yield TestingSessionLocal
+    with TestingSessionLocal() as db:
+        db.query(NewsArticle).delete()
+        db.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        db.commit()
+
+
+def search(q, **params):
+    response = client.get("/api/v1/news/search_local", params={"q": q, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_search_ranks_title_matches_first(stored_news):
+    results = search("雞蛋")
+
+    assert [r["title"] for r in results] == [ARTICLES[0][0], ARTICLES[1][0]]
+    assert results[0]["score"] < results[1]["score"]
+    assert "content" not in results[0]
+
+
+def test_search_chinese_terms(stored_news):
+    assert [r["title"] for r in search("衛生紙")] == [ARTICLES[1][0]]
+    assert {r["title"] for r in search("漲價 泡麵")} == {ARTICLES[0][0], ARTICLES[1][0], ARTICLES[3][0]}
+    assert {r["title"] for r in search("麵")} == {ARTICLES[3][0]}
+    assert search("牛奶") == []
+
+
+def test_search_latin_terms_and_content(stored_news):
+    results = search("cpi", include_content=True)
+
+    assert [r["title"] for r in results] == [ARTICLES[2][0]]
+    assert results[0]["content"] == ARTICLES[2][1]
+
+
+def test_rebuild_index(stored_news):
+    with stored_news() as db:
+        assert rebuild_news_search_index(db) == len(ARTICLES)
+        db.commit()
+
+    assert len(search("雞蛋")) == 2
+
+
+def test_search_news_answers_from_stored_news(stored_news, mocker):
+    mocker.patch("main.SEARCH_LOCAL_MIN_RESULTS", 2)
+    mocker.patch("main.extract_search_keywords", return_value="雞蛋")
+    crawl = mocker.patch("main.get_new_info_async")
+
+    response = client.post("/api/v1/news/search_news", json={"prompt": "我想知道雞蛋的價格"})
+
+    assert response.status_code == 200
+    assert [r["title"] for r in response.json()] == [ARTICLES[0][0], ARTICLES[1][0]]
+    crawl.assert_not_called()
@@ -0,0 +1,159 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert, StaticPool
+from sqlalchemy.orm import sessionmaker
+from jose import jwt
+from main import app
+from main import Base, NewsArticle, User, session_opener, user_news_association_table
+from main import NEWS_PAGE_MAX_LIMIT, response_cache, toggle_upvote
+
+SECRET_KEY = "1892dhianiandowqd0n"
+ALGORITHM = "HS256"
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base.metadata.create_all(bind=engine)
+
+client = TestClient(app)
+
+
+def override_session_opener():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def isolated_db():
+    previous = app.dependency_overrides.get(session_opener)
+    app.dependency_overrides[session_opener] = override_session_opener
+    # seed() writes without bumping the cache version
+    response_cache.clear()
+    yield
+    if previous is None:
+        app.dependency_overrides.pop(session_opener, None)
+    else:
+        app.dependency_overrides[session_opener] = previous
+    with next(override_session_opener()) as db:
+        db.execute(user_news_association_table.delete())
+        db.query(NewsArticle).delete()
+        db.query(User).delete()
+        db.commit()
+
+
+@pytest.fixture
+def query_counter():
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(engine, "before_cursor_execute", count)
+
+
+def seed(n_articles):
+    with next(override_session_opener()) as db:
+        users = [User(username=f"voter{i}", hashed_password="x") for i in range(3)]
+        db.add_all(users)
+        articles = [
+            NewsArticle(
+                url=f"https://example.com/n/{i}",
+                title=f"News {i}",
+                time=f"2024-01-{i % 28 + 1:02d} {i % 24:02d}:00",
+                content="content",
+                summary="summary",
+                reason="reason",
+                upvote_count=min(i % 4, 3),
+            )
+            for i in range(n_articles)
+        ]
+        db.add_all(articles)
+        db.commit()
+        for i, article in enumerate(articles):
+            for user in users[: i % 4]:
+                db.execute(
+                    insert(user_news_association_table).values(
+                        user_id=user.id, news_articles_id=article.id
+                    )
+                )
+        db.commit()
+        return users[0].username
+
+
+@pytest.mark.parametrize("n_articles", [3, 150])
+def test_read_news_query_count_is_constant(isolated_db, query_counter, n_articles):
+    seed(n_articles)
+    query_counter.clear()
+
+    response = client.get("/api/v1/news/news", params={"limit": NEWS_PAGE_MAX_LIMIT})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == n_articles
+    for item in data:
+        i = int(item["title"].split()[1])
+        assert item["upvotes"] == min(i % 4, 3)
+        assert item["is_upvoted"] is False
+    # cache version and page
+    assert len(query_counter) == 2
+
+
+@pytest.mark.parametrize("n_articles", [3, 150])
+def test_read_user_news_query_count_is_constant(isolated_db, query_counter, n_articles):
+    username = seed(n_articles)
+    token = jwt.encode({"sub": username}, SECRET_KEY, algorithm=ALGORITHM)
+    query_counter.clear()
+
+    response = client.get("/api/v1/news/user_news", params={"limit": NEWS_PAGE_MAX_LIMIT}, headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == n_articles
+    for item in data:
+        i = int(item["title"].split()[1])
+        assert item["upvotes"] == min(i % 4, 3)
+        assert item["is_upvoted"] is (i % 4 >= 1)
+    assert len(query_counter) == 4
+
+
+def test_user_lookup_cached_until_user_changes(isolated_db, query_counter):
+    username = seed(3)
+    token = jwt.encode({"sub": username}, SECRET_KEY, algorithm=ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/api/v1/news/user_news", headers=headers)
+    query_counter.clear()
+
+    response = client.get("/api/v1/news/user_news", headers=headers)
+
+    assert response.status_code == 200
+    # the page itself is answered from the response cache
+    assert len(query_counter) == 1
+    assert not any("FROM users" in statement for statement in query_counter)
+
+    with next(override_session_opener()) as db:
+        db.query(User).filter_by(username=username).one().username = "renamed"
+        db.commit()
+    query_counter.clear()
+
+    response = client.get("/api/v1/news/user_news", headers=headers)
+
+    assert any("FROM users" in statement for statement in query_counter)
+    assert response.status_code == 401
+
+
+def test_toggle_upvote_keeps_upvote_count(isolated_db):
+    seed(1)
+    with next(override_session_opener()) as db:
+        article = db.query(NewsArticle).one()
+        users = db.query(User).all()
+
+        assert toggle_upvote(article.id, users[0].id, db) == "Article upvoted"
+        assert toggle_upvote(article.id, users[1].id, db) == "Article upvoted"
+        assert toggle_upvote(article.id, users[0].id, db) == "Upvote removed"
+
+        db.refresh(article)
+        votes = db.query(user_news_association_table).filter_by(news_articles_id=article.id).count()
+        assert article.upvote_count == votes == 1
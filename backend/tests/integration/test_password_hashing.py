@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from password_hashing import PasswordHasher, PasswordHasherBusy
+
+
+class SlowContext:
+    """stands in for CryptContext, every call takes `delay` and is counted"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _work(self, value):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return value
+
+    def hash(self, password):
+        return self._work("hashed " + password)
+
+    def verify(self, password, hashed_password):
+        return self._work(hashed_password == "hashed " + password)
+
+
+def test_concurrency_capped():
+    context = SlowContext()
+    hasher = PasswordHasher(context, max_workers=2)
+
+    async def burst():
+        return await asyncio.gather(*(hasher.verify("pw", "hashed pw") for _ in range(8)))
+
+    assert asyncio.run(burst()) == [True] * 8
+    assert context.peak == 2
+    stats = hasher.stats()
+    assert stats["completed"] == 8
+    assert stats["queued"] == 0 and stats["running"] == 0
+    assert stats["wait_seconds_max"] > 0
+
+
+def test_event_loop_not_blocked():
+    hasher = PasswordHasher(SlowContext(delay=0.2), max_workers=1)
+
+    async def burst():
+        verifying = asyncio.ensure_future(hasher.verify("pw", "hashed pw"))
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        ticked = time.perf_counter() - started
+        await verifying
+        return ticked
+
+    assert asyncio.run(burst()) < 0.1
+
+
+def test_full_queue_rejects():
+    hasher = PasswordHasher(SlowContext(delay=0.1), max_workers=1, max_queue=2)
+
+    # one call running, two waiting
+    futures = [hasher._submit(hasher.context.hash, "pw") for _ in range(3)]
+    time.sleep(0.02)
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash_blocking("pw")
+    assert [f.result() for f in futures] == ["hashed pw"] * 3
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.hash_blocking("pw") == "hashed pw"
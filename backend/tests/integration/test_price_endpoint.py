@@ -1,10 +1,38 @@
 import pytest
+import requests
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, StaticPool
+from sqlalchemy.orm import sessionmaker
 from unittest.mock import patch
 from main import app
+from main import Base, NecessitiesPrice, refresh_necessities_prices, response_cache, session_opener, summarize_price_trend
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base.metadata.create_all(bind=engine)
+
+
+def override_session_opener():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[session_opener] = override_session_opener
 
 client = TestClient(app)
 
+
+@pytest.fixture(autouse=True)
+def clear_prices():
+    with next(override_session_opener()) as db:
+        db.query(NecessitiesPrice).delete()
+        db.commit()
+    response_cache.clear()
+
 @pytest.fixture
 def mock_necessities_data():
     return [
@@ -29,7 +57,7 @@ def mock_necessities_data():
     ]
 
 
-@patch("main.requests.get")
+@patch("requests.Session.get")
 def test_get_necessities_prices(mock_get, mock_necessities_data):
     mock_response = mock_get.return_value
     mock_response.status_code = 200
@@ -45,7 +73,7 @@ def test_get_necessities_prices(mock_get, mock_necessities_data):
     assert data[1]["產品名稱"] == "味全林鳳營鮮乳"
 
 
-@patch("main.requests.get")
+@patch("requests.Session.get")
 def test_get_necessities_prices_with_query(mock_get, mock_necessities_data):
     mock_response = mock_get.return_value
     mock_response.status_code = 200
@@ -55,12 +83,78 @@ def test_get_necessities_prices_with_query(mock_get, mock_necessities_data):
 
     assert response.status_code == 200
     data = response.json()
-    assert len(data) == 2
+    assert len(data) == 1
     assert data[0]["類別"] == "鮮乳"
     assert data[0]["產品名稱"] == "統一瑞穗高優質鮮乳"
 
+    response = client.get("/api/v1/prices/necessities-price", params={"category": "奶粉"})
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@patch("requests.Session.get")
+def test_get_necessities_prices_served_from_store(mock_get, mock_necessities_data):
+    mock_response = mock_get.return_value
+    mock_response.status_code = 200
+    mock_response.json.return_value = mock_necessities_data
+
+    for _ in range(3):
+        response = client.get("/api/v1/prices/necessities-price")
+        assert response.status_code == 200
+        assert len(response.json()) == 2
+
+    assert mock_get.call_count == 1
+
+
+@patch("requests.Session.get")
+def test_get_necessities_prices_etag(mock_get, mock_necessities_data):
+    mock_get.return_value.json.return_value = mock_necessities_data
+    response = client.get("/api/v1/prices/necessities-price")
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/v1/prices/necessities-price", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+
+    mock_get.return_value.json.return_value = mock_necessities_data[:1]
+    with next(override_session_opener()) as db:
+        refresh_necessities_prices(db)
+    response = client.get("/api/v1/prices/necessities-price", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()) == 1
+
+
+@patch("requests.Session.get")
+def test_get_necessities_prices_upstream_outage(mock_get, mock_necessities_data):
+    mock_response = mock_get.return_value
+    mock_response.status_code = 200
+    mock_response.json.return_value = mock_necessities_data
+    client.get("/api/v1/prices/necessities-price")
+
+    mock_get.side_effect = requests.ConnectionError("opendata is down")
+    with next(override_session_opener()) as db:
+        assert refresh_necessities_prices(db) is None
+
+    response = client.get("/api/v1/prices/necessities-price")
 
-# @patch("main.requests.get")
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+
+@patch("requests.Session.get")
+def test_get_necessities_prices_empty_store_and_outage(mock_get):
+    mock_get.side_effect = requests.ConnectionError("opendata is down")
+
+    response = client.get("/api/v1/prices/necessities-price")
+
+    assert response.status_code == 503
+
+
+# @patch("requests.Session.get")
 # def test_get_necessities_prices_error_handling(mock_get):
 #     mock_response = mock_get.return_value
 #     mock_response.status_code = 400
@@ -69,4 +163,65 @@ def test_get_necessities_prices_with_query(mock_get, mock_necessities_data):
 #     response = client.get("/api/v1/prices/necessities-price")
 
 #     assert response.status_code == 400
-#     assert response.json()["detail"] == "Error fetching data"
\ No newline at end of file
+#     assert response.json()["detail"] == "Error fetching data"
+
+@patch("requests.Session.get")
+def test_get_price_trends(mock_get, mock_necessities_data):
+    mock_response = mock_get.return_value
+    mock_response.status_code = 200
+    mock_response.json.return_value = mock_necessities_data
+
+    response = client.get("/api/v1/prices/trends", params={"category": "鮮乳"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 2
+    assert data[0]["name"] == "統一瑞穗高優質鮮乳"
+    assert data[0]["start"] == "2015-03"
+    assert data[0]["end"] == "2016-01"
+    assert data[0]["latest"] == {"month": "2016-01", "value": 146}
+    assert data[0]["min"] == {"month": "2015-04", "value": 143}
+    assert data[0]["max"] == {"month": "2015-12", "value": 146}
+    assert data[0]["mom_change"] == {"month": "2016-01", "value": 0}
+    assert data[0]["yoy_change"] is None
+    assert data[0]["rolling_mean"] == {"month": "2016-01", "value": 145.6667}
+
+
+@patch("requests.Session.get")
+def test_get_price_trend_series(mock_get, mock_necessities_data):
+    mock_response = mock_get.return_value
+    mock_response.status_code = 200
+    mock_response.json.return_value = mock_necessities_data
+
+    response = client.get("/api/v1/prices/trends/1", params={"window": 2})
+
+    assert response.status_code == 200
+    series = response.json()["series"]
+    assert series["values"] == [144, 143, 143, 143, 143, None, None, 145, 145, 146, 146]
+    assert series["mom_change"][:3] == [None, round(143 / 144 - 1, 4), 0]
+    assert series["mom_change"][5:8] == [None, None, None]
+    assert series["rolling_mean"][5:8] == [143, None, 145]
+    assert series["yoy_change"] == [None] * 11
+
+    response = client.get("/api/v1/prices/trends/999")
+
+    assert response.status_code == 404
+
+
+@patch("requests.Session.get")
+def test_get_price_trends_cached_until_refresh(mock_get, mock_necessities_data):
+    mock_get.return_value.json.return_value = mock_necessities_data
+
+    with patch("main.summarize_price_trend", wraps=summarize_price_trend) as summarize:
+        for _ in range(3):
+            response = client.get("/api/v1/prices/trends")
+            assert len(response.json()) == 2
+        assert summarize.call_count == 2
+
+        mock_get.return_value.json.return_value = mock_necessities_data[:1]
+        with next(override_session_opener()) as db:
+            refresh_necessities_prices(db)
+        response = client.get("/api/v1/prices/trends")
+
+    assert len(response.json()) == 1
+    assert summarize.call_count == 3
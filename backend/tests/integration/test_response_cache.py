@@ -0,0 +1,35 @@
+from response_cache import ResponseCache, etag_matches
+
+
+def test_entry_per_version():
+    cache = ResponseCache()
+    first = cache.put("/news", 1, b"[1]")
+
+    assert cache.get("/news", 1) == first
+    assert cache.get("/news", 2) is None
+    assert cache.put("/news", 2, b"[1, 2]").etag != first.etag
+
+
+def test_same_body_same_etag():
+    cache = ResponseCache()
+
+    assert cache.put("/news", 1, b"[]").etag == cache.put("/news", 2, b"[]").etag
+
+
+def test_least_recently_used_dropped():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", 0, b"a")
+    cache.put("b", 0, b"b")
+    cache.get("a", 0)
+    cache.put("c", 0, b"c")
+
+    assert cache.get("a", 0) is not None
+    assert cache.get("b", 0) is None
+
+
+def test_etag_matches():
+    assert etag_matches('"x"', '"x"')
+    assert etag_matches('"y", W/"x"', '"x"')
+    assert etag_matches("*", '"x"')
+    assert not etag_matches('"y"', '"x"')
+    assert not etag_matches(None, '"x"')
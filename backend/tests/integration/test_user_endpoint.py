@@ -1,9 +1,10 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, StaticPool
+from sqlalchemy import create_engine, NullPool, StaticPool
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from main import app
-from main import Base, User, session_opener
+from main import Base, User, async_session_opener, session_opener
 from jose import jwt
 from main import pwd_context
 
@@ -14,6 +15,8 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 Base.metadata.create_all(bind=engine)
 
@@ -26,7 +29,13 @@ def override_session_opener():
         db.close()
 
 
+async def override_async_session_opener():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 app.dependency_overrides[session_opener] = override_session_opener
+app.dependency_overrides[async_session_opener] = override_async_session_opener
 
 client = TestClient(app)
 
@@ -83,4 +92,28 @@ def test_read_users_me(test_token):
 
     assert response.status_code == 200
     data = response.json()
-    assert data["username"] == "testuser"
\ No newline at end of file
+    assert data["username"] == "testuser"
+
+def test_login_wrong_password(test_user):
+    response = client.post("/api/v1/users/login", data={
+        "username": "testuser",
+        "password": "wrongpassword"
+    })
+
+    assert response.status_code == 401
+
+
+def test_login_unknown_user():
+    response = client.post("/api/v1/users/login", data={
+        "username": "nobody",
+        "password": "testpassword"
+    })
+
+    assert response.status_code == 401
+
+
+def test_read_users_me_invalid_token():
+    response = client.get("/api/v1/users/me", headers={"Authorization": "Bearer not-a-token"})
+
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
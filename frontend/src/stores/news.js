@@ -5,11 +5,13 @@ import { useAuthStore } from './auth';
 export const useNewsStore = defineStore('news', {
     state: () => ({
         newsList: [],
+        nextCursor: null,
         isLoading: false,
+        isStreaming: false,
         errorMessage: '',
     }),
     actions: {
-        async fetchNews() {
+        async fetchNews(cursor = null) {
             this.isLoading = true;
             this.errorMessage = '';
             const authStore = useAuthStore();
@@ -18,28 +20,66 @@ export const useNewsStore = defineStore('news', {
                 : 'http://localhost:8000/api/v1/news/news';
             try {
                 const response = await axios.get(apiUrl,
-                    { headers: authStore.isLoggedIn ? { Authorization: `Bearer ${authStore.accessToken}` } : {}
+                    { headers: authStore.isLoggedIn ? { Authorization: `Bearer ${authStore.accessToken}` } : {},
+                      params: cursor ? { cursor: cursor, include_content: true } : { include_content: true }
                 });
-                this.newsList = response.data.map(news => ({ ...news, isSummaryLoading: false }));
+                const page = response.data.map(news => ({ ...news, isSummaryLoading: false }));
+                this.newsList = cursor ? this.newsList.concat(page) : page;
+                this.nextCursor = response.headers['x-next-cursor'] || null;
             } catch (error) {
                 this.errorMessage = 'Error fetching news: ' + error.message;
             } finally {
                 this.isLoading = false;
             }
         },
+        async fetchMoreNews() {
+            if(this.isLoading || !this.nextCursor) return;
+            await this.fetchNews(this.nextCursor);
+        },
         async promptSearchNews(prompt) {
-            if(this.isLoading) return;
+            if(this.isLoading || this.isStreaming) return;
             this.isLoading = true;
+            this.isStreaming = true;
             this.errorMessage = '';
+            this.newsList = [];
+            this.nextCursor = null;
             try {
-                const response = await axios.post('http://localhost:8000/api/v1/news/search_news', {prompt: prompt});
-                this.newsList = response.data.map(news => ({ ...news, isSummaryLoading: false }));
+                // results arrive as newline delimited json, render each one as it comes
+                const response = await fetch('http://localhost:8000/api/v1/news/search_news/stream', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({prompt: prompt}),
+                });
+                if (!response.ok) {
+                    throw new Error(`Request failed with status code ${response.status}`);
+                }
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                for (;;) {
+                    const { done, value } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    const lines = buffer.split('\n');
+                    buffer = lines.pop();
+                    lines.filter(line => line.trim()).forEach(line => this.handleSearchEvent(JSON.parse(line)));
+                }
             } catch (error) {
                 this.errorMessage = 'Error fetching news: ' + error.message;
             } finally {
                 this.isLoading = false;
+                this.isStreaming = false;
             }            
         },
+        handleSearchEvent(event) {
+            if (event.type === 'article') {
+                this.newsList.push({ ...event.article, isSummaryLoading: false });
+                this.isLoading = false;
+            } else if (event.type === 'done') {
+                const position = new Map(event.order.map((id, index) => [id, index]));
+                this.newsList.sort((a, b) => position.get(a.id) - position.get(b.id));
+            }
+        },
         async fetchNewsSummary(content, index) {
             if(this.newsList[index].isSummaryLoading) return;
             this.newsList[index].isSummaryLoading = true;